@@ -0,0 +1,91 @@
+import logging
+import threading
+
+from django.core.cache import cache
+from .models import Role
+from .permissions import PermissionManager
+
+logger = logging.getLogger(__name__)
+
+ROLE_MAP_CACHE_KEY = 'access_control_role_map_{version}'
+
+_role_map = None
+_role_map_version = None
+_role_map_lock = threading.Lock()
+
+
+def get_role_map():
+    """
+    Return {role_id: (name, display_name, template_folder, description)} for
+    every role. Cached alongside the permission matrix, so it is rebuilt
+    whenever a Role, Module or ModulePermission changes.
+    """
+    global _role_map, _role_map_version
+    version = PermissionManager.get_matrix_version()
+    if _role_map is not None and version is not None and version == _role_map_version:
+        return _role_map
+
+    with _role_map_lock:
+        role_map = None
+        if version is not None:
+            try:
+                role_map = cache.get(ROLE_MAP_CACHE_KEY.format(version=version))
+            except Exception as e:
+                logger.warning(f"Role map cache unavailable: {str(e)}")
+
+        if role_map is None:
+            role_map = {
+                role_id: (name, display_name, template_folder, description)
+                for role_id, name, display_name, template_folder, description in Role.objects.values_list(
+                    'id', 'name', 'display_name', 'template_folder', 'description'
+                )
+            }
+            if version is not None:
+                try:
+                    cache.set(ROLE_MAP_CACHE_KEY.format(version=version), role_map, timeout=None)
+                except Exception as e:
+                    logger.warning(f"Error caching role map: {str(e)}")
+
+        _role_map = role_map
+        _role_map_version = version
+        return role_map
+
+
+def get_cached_role(role_id):
+    """Return a Role instance built from the cached role map"""
+    values = get_role_map().get(role_id)
+    if values is None:
+        return None
+    return Role.from_db(
+        'default',
+        ['id', 'name', 'display_name', 'template_folder', 'description'],
+        (role_id, *values)
+    )
+
+
+def get_role_template_folder(role):
+    """
+    Return the template folder for a Role instance or role name without
+    hitting the database
+    """
+    if isinstance(role, Role):
+        return role.template_folder
+    for name, display_name, template_folder, description in get_role_map().values():
+        if name == role:
+            return template_folder
+    raise Role.DoesNotExist(f"Role '{role}' does not exist")
+
+
+def attach_cached_role(user):
+    """
+    Populate user.role from the cached role map so that later user.role
+    lookups do not issue a query
+    """
+    role_id = getattr(user, 'role_id', None)
+    if role_id is None or user._meta.model.role.is_cached(user):
+        return user
+    role = get_cached_role(role_id)
+    if role is not None:
+        user.role = role
+    return user
+
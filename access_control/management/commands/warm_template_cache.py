@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from access_control.template_cache import warm_template_cache
+
+class Command(BaseCommand):
+    help = 'Pre-compile every role-specific template so the cached loader is warm'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--role-folder',
+            action='append',
+            dest='role_folders',
+            help='Only warm templates under this role folder (can be repeated)'
+        )
+        parser.add_argument(
+            '--verbose-failures',
+            action='store_true',
+            help='Print every template that failed to compile'
+        )
+
+    def handle(self, *args, **options):
+        compiled, failures, elapsed = warm_template_cache(options['role_folders'])
+
+        self.stdout.write(f"Compiled {compiled} templates in {elapsed:.2f}s")
+        if failures:
+            self.stdout.write(self.style.WARNING(f"{len(failures)} templates failed to compile"))
+            if options['verbose_failures']:
+                for name, error in failures:
+                    self.stdout.write(f"  {name}: {error}")
+        else:
+            self.stdout.write(self.style.SUCCESS("Template cache warmed successfully."))
@@ -0,0 +1,22 @@
+from django.contrib.auth.middleware import get_user
+from django.utils.functional import SimpleLazyObject
+from .identity import attach_cached_role
+
+
+def get_user_with_role(request):
+    return attach_cached_role(get_user(request))
+
+
+class RequestIdentityMiddleware:
+    """
+    Attach the user's role from the cached role map, so request.user.role
+    (and the role template folder) costs no query. Must be placed after
+    AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.user = SimpleLazyObject(lambda: get_user_with_role(request))
+        return self.get_response(request)
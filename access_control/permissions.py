@@ -1,22 +1,136 @@
+import logging
+import threading
+import time
+import uuid
+
 from django.core.cache import cache
 from .models import ModulePermission, Role
 
+logger = logging.getLogger(__name__)
+
+# Cache keys for the role -> module -> (access, modify, delete) matrix.
+# The version token is bumped on every change; the matrix itself is
+# stored under a versioned key so stale copies are never read back.
+PERMISSION_MATRIX_VERSION_KEY = 'access_control_permission_matrix_version'
+PERMISSION_MATRIX_CACHE_KEY = 'access_control_permission_matrix_{version}'
+
+# How long a worker trusts its in-process copy before re-checking the
+# version token in Redis (seconds)
+LOCAL_MATRIX_TTL = 5
+
+NO_PERMISSION = (False, False, False)
+
+
 class PermissionManager:
+    _lock = threading.Lock()
+    _local_version = None
+    _local_matrix = None
+    _local_checked_at = 0.0
+
+    @classmethod
+    def build_permission_matrix(cls):
+        """
+        Build the full permission matrix from the database in a single query.
+        Returns {role_id: {module_name: (can_access, can_modify, can_delete)}}
+        """
+        matrix = {}
+        rows = ModulePermission.objects.filter(
+            module__is_active=True
+        ).values_list('role_id', 'module__name', 'can_access', 'can_modify', 'can_delete')
+
+        for role_id, module_name, can_access, can_modify, can_delete in rows:
+            matrix.setdefault(role_id, {})[module_name] = (can_access, can_modify, can_delete)
+        return matrix
+
+    @classmethod
+    def get_permission_matrix(cls):
+        """
+        Return the permission matrix, served from the in-process copy when it
+        is fresh, otherwise from Redis, otherwise rebuilt from the database
+        """
+        now = time.monotonic()
+        local_matrix = cls._local_matrix
+        if local_matrix is not None and now - cls._local_checked_at < LOCAL_MATRIX_TTL:
+            return local_matrix
+
+        with cls._lock:
+            try:
+                version = cache.get(PERMISSION_MATRIX_VERSION_KEY)
+                if version is not None and version == cls._local_version:
+                    cls._local_checked_at = now
+                    return cls._local_matrix
+
+                if version is None:
+                    # Only the first worker's token is kept; the others adopt it,
+                    # so concurrent first requests agree on one version
+                    token = uuid.uuid4().hex
+                    cache.add(PERMISSION_MATRIX_VERSION_KEY, token, timeout=None)
+                    version = cache.get(PERMISSION_MATRIX_VERSION_KEY, token)
+
+                # The matrix is built after the version is known: a change made
+                # meanwhile bumps the version, so this copy is never served for it
+                matrix = cache.get(PERMISSION_MATRIX_CACHE_KEY.format(version=version))
+                if matrix is None:
+                    matrix = cls.build_permission_matrix()
+                    cache.set(PERMISSION_MATRIX_CACHE_KEY.format(version=version), matrix, timeout=None)
+            except Exception as e:
+                # Redis unavailable - fall back to a process-local matrix
+                logger.warning(f"Permission matrix cache unavailable: {str(e)}")
+                version = None
+                matrix = cls.build_permission_matrix()
+
+            cls._local_version = version
+            cls._local_matrix = matrix
+            cls._local_checked_at = now
+            return matrix
+
+    @classmethod
+    def get_matrix_version(cls):
+        """
+        Return the version token of the current permission matrix, or None
+        when the matrix is only held locally (Redis unavailable)
+        """
+        cls.get_permission_matrix()
+        return cls._local_version
+
+    @classmethod
+    def invalidate(cls):
+        """
+        Drop the cached permission matrix in this process and in Redis.
+        Other workers pick up the change within LOCAL_MATRIX_TTL seconds.
+        """
+        with cls._lock:
+            cls._local_version = None
+            cls._local_matrix = None
+            cls._local_checked_at = 0.0
+        try:
+            cache.set(PERMISSION_MATRIX_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        except Exception as e:
+            logger.warning(f"Error invalidating permission matrix cache: {str(e)}")
+
+    @classmethod
+    def get_role_permissions(cls, role):
+        """
+        Return {module_name: (can_access, can_modify, can_delete)} for a role
+        or role id
+        """
+        role_id = role.pk if isinstance(role, Role) else role
+        return cls.get_permission_matrix().get(role_id, {})
+
+    @classmethod
+    def _get_user_permission(cls, user, module_name):
+        role_id = getattr(user, 'role_id', None)
+        if role_id is None:
+            return NO_PERMISSION
+        return cls.get_role_permissions(role_id).get(module_name, NO_PERMISSION)
+
     @classmethod
     def check_module_access(cls, user, module_name):
         """
         Check if user has access to a specific module
         Returns True if user has access, False otherwise
         """
-        try:
-            permission = ModulePermission.objects.get(
-                role=user.role,
-                module__name=module_name,
-                module__is_active=True
-            )
-            return permission.can_access
-        except ModulePermission.DoesNotExist:
-            return False
+        return cls._get_user_permission(user, module_name)[0]
 
     @classmethod
     def check_module_modify(cls, user, module_name):
@@ -24,15 +138,7 @@ class PermissionManager:
         Check if user has modify permission for a specific module
         Returns True if user can modify, False otherwise
         """
-        try:
-            permission = ModulePermission.objects.get(
-                role=user.role,
-                module__name=module_name,
-                module__is_active=True
-            )
-            return permission.can_modify
-        except ModulePermission.DoesNotExist:
-            return False
+        return cls._get_user_permission(user, module_name)[1]
 
     @classmethod
     def check_module_delete(cls, user, module_name):
@@ -40,12 +146,4 @@ class PermissionManager:
         Check if user has delete permission for a specific module
         Returns True if user can delete, False otherwise
         """
-        try:
-            permission = ModulePermission.objects.get(
-                role=user.role,
-                module__name=module_name,
-                module__is_active=True
-            )
-            return permission.can_delete
-        except ModulePermission.DoesNotExist:
-            return False
\ No newline at end of file
+        return cls._get_user_permission(user, module_name)[2]
@@ -0,0 +1,66 @@
+import logging
+import threading
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from .permissions import PermissionManager
+
+logger = logging.getLogger(__name__)
+
+# Rendered sidebars are keyed by the permission matrix version, so any change
+# to modules, roles or permissions makes every cached fragment unreachable.
+SIDEBAR_CACHE_KEY = 'access_control_sidebar_{version}_{role_id}_{template_name}'
+SIDEBAR_CACHE_TIMEOUT = 60 * 60 * 24
+
+_fragments = {}
+_fragments_version = None
+_fragments_lock = threading.Lock()
+
+
+def _get_local_fragment(version, key):
+    global _fragments_version
+    with _fragments_lock:
+        if _fragments_version != version:
+            _fragments.clear()
+            _fragments_version = version
+        return _fragments.get(key)
+
+
+def _set_local_fragment(version, key, html):
+    with _fragments_lock:
+        if _fragments_version == version:
+            _fragments[key] = html
+
+
+def render_sidebar(request, template_name):
+    """
+    Return the sidebar HTML for the requesting user's role.
+
+    The sidebar only depends on the role's module permissions, so each role's
+    fragment is rendered once per permission matrix version and then served
+    from the process cache (or Redis) without running any permission checks.
+    """
+    role_id = getattr(request.user, 'role_id', None)
+    version = PermissionManager.get_matrix_version()
+    if role_id is None or version is None:
+        return render_to_string(template_name, request=request)
+
+    key = SIDEBAR_CACHE_KEY.format(version=version, role_id=role_id, template_name=template_name)
+    html = _get_local_fragment(version, key)
+    if html is not None:
+        return html
+
+    try:
+        html = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Sidebar cache unavailable: {str(e)}")
+
+    if html is None:
+        html = render_to_string(template_name, request=request)
+        try:
+            cache.set(key, html, timeout=SIDEBAR_CACHE_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Error caching sidebar for role {role_id}: {str(e)}")
+
+    _set_local_fragment(version, key, html)
+    return html
@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Module, Role, ModulePermission
+from .permissions import PermissionManager
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=ModulePermission)
+@receiver(post_delete, sender=ModulePermission)
+def invalidate_permission_matrix(sender, instance, **kwargs):
+    """Invalidate the cached permission matrix once the change is committed"""
+    transaction.on_commit(PermissionManager.invalidate)
+
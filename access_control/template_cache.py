@@ -0,0 +1,58 @@
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template.loader import get_template
+from .identity import get_role_map
+
+logger = logging.getLogger(__name__)
+
+
+def get_template_root():
+    return os.path.join(settings.BASE_DIR, 'templates')
+
+
+def iter_role_template_names(role_folders=None):
+    """
+    Yield template names (relative to the project template directory) for
+    every HTML template under the given role folders. Defaults to the
+    template folders of all roles.
+    """
+    template_root = get_template_root()
+    if role_folders is None:
+        role_folders = sorted({values[2] for values in get_role_map().values()})
+
+    for role_folder in role_folders:
+        folder_path = os.path.join(template_root, role_folder)
+        for dirpath, dirnames, filenames in os.walk(folder_path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if not filename.endswith('.html'):
+                    continue
+                full_path = os.path.join(dirpath, filename)
+                yield os.path.relpath(full_path, template_root).replace(os.sep, '/')
+
+
+def warm_template_cache(role_folders=None):
+    """
+    Compile every role template so the cached loader holds them before the
+    first request. Returns (compiled_count, failures, elapsed_seconds).
+    """
+    start = time.monotonic()
+    compiled = 0
+    failures = []
+
+    for name in iter_role_template_names(role_folders):
+        try:
+            get_template(name)
+            compiled += 1
+        except (TemplateDoesNotExist, TemplateSyntaxError) as e:
+            failures.append((name, str(e)))
+        except Exception as e:
+            failures.append((name, f'{type(e).__name__}: {str(e)}'))
+
+    elapsed = time.monotonic() - start
+    logger.info(f"Template cache warmed: {compiled} compiled, {len(failures)} failed in {elapsed:.2f}s")
+    return compiled, failures, elapsed
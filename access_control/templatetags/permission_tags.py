@@ -1,8 +1,18 @@
 from django import template
+from django.utils.safestring import mark_safe
 from access_control.permissions import PermissionManager
+from access_control.sidebar import render_sidebar
 
 register = template.Library()
 
 @register.filter(name='has_module_access')
 def has_module_access(user, module_name):
     return PermissionManager.check_module_access(user, module_name)
+
+@register.simple_tag(takes_context=True)
+def role_sidebar(context, template_name):
+    """Emit the cached sidebar fragment for the current user's role"""
+    request = context.get('request')
+    if request is None:
+        return ''
+    return mark_safe(render_sidebar(request, template_name))
@@ -16,6 +16,7 @@ from django.views import View
 
 # Local application imports
 from .models import Role, Module, ModulePermission
+from .identity import get_role_template_folder
 from .utils import generate_csv, generate_pdf
 
 def get_template_path(base_template, role, module=''):
@@ -27,8 +28,7 @@ def get_template_path(base_template, role, module=''):
         role_folder = role.template_folder
     else:
         # Fallback for any legacy code
-        role = Role.objects.get(name=role)
-        role_folder = role.template_folder
+        role_folder = get_role_template_folder(role)
     
     if module:
         return f'{role_folder}/{module}/{base_template}'
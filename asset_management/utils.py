@@ -1,12 +1,12 @@
 from access_control.models import Role
+from access_control.identity import get_role_template_folder
 
 def get_template_path(base_template, role, module=''):
     """Resolves template path based on user role"""
     if isinstance(role, Role):
         role_folder = role.template_folder
     else:
-        role = Role.objects.get(name=role)
-        role_folder = role.template_folder
+        role_folder = get_role_template_folder(role)
     
     if module:
         return f'{role_folder}/{module}/{base_template}'
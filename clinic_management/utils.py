@@ -1,4 +1,5 @@
 from access_control.models import Role
+from access_control.identity import get_role_template_folder
 
 def get_template_path(base_template, role, module=''):
     """
@@ -9,8 +10,7 @@ def get_template_path(base_template, role, module=''):
         role_folder = role.template_folder
     else:
         # Fallback for any legacy code
-        role = Role.objects.get(name=role)
-        role_folder = role.template_folder
+        role_folder = get_role_template_folder(role)
     
     if module:
         return f'{role_folder}/{module}/{base_template}'
@@ -1,5 +1,11 @@
+import functools
+import hashlib
 import logging
+import threading
+import time
 from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import close_old_connections
 from django.db.models import Count, Sum, Avg, Q
 from django.utils import timezone
 from django.core.cache import cache
@@ -8,6 +14,10 @@ from .exceptions import InvalidDateRangeError
 
 logger = logging.getLogger(__name__)
 
+# Seconds a cache computation may hold the lock, and how long others wait for it
+DASHBOARD_LOCK_TIMEOUT = 30
+DASHBOARD_LOCK_WAIT = 5
+
 def get_safe_division(numerator, denominator, default=0):
     """Safely divide numbers, handling zero division"""
     try:
@@ -43,21 +53,83 @@ def get_date_range_filter(range_type):
         logger.error(f"Date range filter error: {str(e)}")
         raise InvalidDateRangeError(f"Invalid date range: {range_type}")
 
-def cache_dashboard_data(func):
-    """Decorator to cache dashboard data"""
-    def wrapper(*args, **kwargs):
-        cache_key = f"dashboard_{func.__name__}_{args}_{kwargs}"
-        cached_data = cache.get(cache_key)
-        
-        if cached_data is not None:
-            return cached_data
-            
+def get_dashboard_cache_key(func, args, kwargs):
+    """Stable cache key built from the function path and its arguments"""
+    key = f"dashboard:{func.__module__}.{func.__qualname__}"
+    if args or kwargs:
+        digest = hashlib.md5(repr((args, sorted(kwargs.items()))).encode('utf-8')).hexdigest()
+        key = f"{key}:{digest}"
+    return key
+
+def _compute_and_store(func, args, kwargs, cache_key, lock_key, timeout, stale_timeout):
+    try:
         data = func(*args, **kwargs)
-        cache.set(cache_key, data, timeout=300)  # Cache for 5 minutes
+        cache.set(
+            cache_key,
+            {'data': data, 'fresh_until': time.time() + timeout},
+            timeout=timeout + stale_timeout
+        )
         return data
+    finally:
+        cache.delete(lock_key)
+
+def _refresh_in_background(*args):
+    close_old_connections()
+    try:
+        _compute_and_store(*args)
+    except Exception as e:
+        logger.error(f"Background dashboard refresh failed: {str(e)}")
+    finally:
+        close_old_connections()
+
+def cache_dashboard_data(func=None, *, timeout=None, stale_timeout=None):
+    """
+    Decorator to cache dashboard data under a stable key. Use it on plain
+    functions, not methods: arguments are part of the key.
+
+    Fresh data is served for `timeout` seconds. After that the stale value is
+    still returned for up to `stale_timeout` seconds while one background
+    thread recomputes it. A cache lock makes concurrent misses share a single
+    computation instead of all hitting the database.
+    """
+    if func is None:
+        return lambda f: cache_dashboard_data(f, timeout=timeout, stale_timeout=stale_timeout)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        fresh_timeout = timeout or getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+        stale = stale_timeout or getattr(settings, 'DASHBOARD_CACHE_STALE_TIMEOUT', 600)
+        cache_key = get_dashboard_cache_key(func, args, kwargs)
+        lock_key = f"{cache_key}:lock"
+        job = (func, args, kwargs, cache_key, lock_key, fresh_timeout, stale)
+
+        entry = cache.get(cache_key)
+        if entry is not None:
+            if entry['fresh_until'] < time.time() and cache.add(lock_key, 1, DASHBOARD_LOCK_TIMEOUT):
+                threading.Thread(
+                    target=_refresh_in_background,
+                    args=job,
+                    name='dashboard-cache-refresh',
+                    daemon=True
+                ).start()
+            return entry['data']
+
+        if cache.add(lock_key, 1, DASHBOARD_LOCK_TIMEOUT):
+            return _compute_and_store(*job)
+
+        # Another worker is computing the value: wait for it rather than
+        # running the same queries in parallel
+        deadline = time.monotonic() + DASHBOARD_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(cache_key)
+            if entry is not None:
+                return entry['data']
+        return func(*args, **kwargs)
     return wrapper
 
 from access_control.models import Role
+from access_control.identity import get_role_template_folder
 
 def get_template_path(base_template, role, module=''):
     """
@@ -68,8 +140,7 @@ def get_template_path(base_template, role, module=''):
         role_folder = role.template_folder
     else:
         # Fallback for any legacy code
-        role = Role.objects.get(name=role)
-        role_folder = role.template_folder
+        role_folder = get_role_template_folder(role)
     
     if module:
         return f'{role_folder}/{module}/{base_template}'
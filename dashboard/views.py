@@ -21,6 +21,7 @@ from error_handling.views import handler403, handler404, handler500
 from access_control.permissions import PermissionManager
 from .utils import get_template_path, get_safe_division, get_percentage_change, get_date_range_filter, cache_dashboard_data
 from .exceptions import DataFetchError, StatsComputationError
+from .metrics import get_dashboard_snapshot
 from appointment_management.models import Appointment
 from phototherapy_management.models import PhototherapySession
 from query_management.models import Query
@@ -51,108 +52,8 @@ class DashboardView(LoginRequiredMixin, View):
             return "Good Evening"
 
     def get_dashboard_metrics(self):
-        today = timezone.now().date()
-        yesterday = today - timedelta(days=1)
-
-        try:
-            # Get base metrics
-            today_appointments = Appointment.objects.filter(date=today)
-            yesterday_appointments = Appointment.objects.filter(date=yesterday)
-            
-            # Calculate percentage change in appointments
-            today_count = today_appointments.count()
-            yesterday_count = yesterday_appointments.count()
-            appointment_change = get_percentage_change(today_count, yesterday_count)
-
-            # Get active treatments
-            active_treatments = (
-                PhototherapySession.objects.filter(status='IN_PROGRESS').count() +
-                Procedure.objects.filter(status='IN_PROGRESS').count()
-            )
-
-            # Calculate treatment completion rate
-            completed_treatments = (
-                PhototherapySession.objects.filter(status='COMPLETED').count() +
-                Procedure.objects.filter(status='COMPLETED').count()
-            )
-            total_treatments = (
-                PhototherapySession.objects.count() +
-                Procedure.objects.count()
-            )
-            completion_rate = get_safe_division(completed_treatments, total_treatments) * 100
-
-            # Get urgent matters
-            urgent_matters = (
-                Query.objects.filter(priority='A', status__in=['NEW', 'IN_PROGRESS']).count() +
-                Appointment.objects.filter(priority='A', status='PENDING').count()
-            )
-
-            # Get recent activities
-            recent_activities = self.get_recent_activities()
-
-            metrics = {
-                'appointments': {
-                    'today': today_count,
-                    'completed': today_appointments.filter(status='COMPLETED').count(),
-                    'change': appointment_change,
-                },
-                'checkins': {
-                    'today': today_appointments.filter(status='CONFIRMED').count(),
-                    'pending': today_appointments.filter(status__in=['SCHEDULED', 'PENDING']).count(),
-                },
-                'active_treatments': active_treatments,
-                'treatment_completion_rate': round(completion_rate, 1),
-                'treatment_success_rate': 85,  # You might want to calculate this based on your criteria
-                'urgent_matters': urgent_matters,
-                'queries': {
-                    'total': Query.objects.filter(created_at__date=today).count(),
-                    'resolved': Query.objects.filter(
-                        created_at__date=today,
-                        status='RESOLVED'
-                    ).count(),
-                },
-                'recent_activities': recent_activities,
-                'last_updated': timezone.now(),
-            }
-        except Exception as e:
-            logger.error(f"Error fetching dashboard metrics: {str(e)}")
-            raise DataFetchError("Failed to fetch dashboard metrics.")
-        metrics = {
-                # ... default values for metrics ...
-            }
-            
-        return metrics
-
-    def get_recent_activities(self):
-        """Get recent system activities with icons"""
-        activities = []
-        try:
-            # Get recent appointments
-            recent_appointments = Appointment.objects.select_related('patient').order_by('-created_at')[:5]
-            for appointment in recent_appointments:
-                activities.append({
-                    'type': 'APPOINTMENT',
-                    'icon': 'calendar-check',
-                    'description': f"New appointment scheduled for {appointment.patient.get_full_name()}",
-                    'time': appointment.created_at
-                })
-
-            # Get recent queries
-            recent_queries = Query.objects.select_related('user').order_by('-created_at')[:5]
-            for query in recent_queries:
-                activities.append({
-                    'type': 'QUERY',
-                    'icon': 'question-circle',
-                    'description': f"New query: {query.subject}",
-                    'time': query.created_at
-                })
-
-            # Sort by time
-            activities.sort(key=lambda x: x['time'], reverse=True)
-            return activities[:10]
-        except Exception as e:
-            logger.error(f"Error fetching recent activities: {str(e)}")
-            return []  # Return an empty list on error
+        """Shared, cached metrics snapshot (see dashboard.metrics)"""
+        return get_dashboard_snapshot()
 
     def get_dashboard_context(self, request):
         try:
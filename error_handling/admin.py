@@ -1,18 +1,38 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import ErrorLog
+from .models import ErrorGroup, ErrorLog
+
+
+@admin.register(ErrorGroup)
+class ErrorGroupAdmin(admin.ModelAdmin):
+    list_display = ('last_seen', 'level', 'status_code', 'route', 'exception_type', 'top_frame', 'count', 'first_seen')
+    list_filter = ('level', 'status_code')
+    search_fields = ('route', 'exception_type', 'top_frame', 'fingerprint')
+    readonly_fields = (
+        'fingerprint', 'level', 'status_code', 'route', 'exception_type', 'top_frame',
+        'message', 'first_seen', 'last_seen', 'count', 'sample_count'
+    )
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(ErrorLog)
 class ErrorLogAdmin(admin.ModelAdmin):
     list_display = ('timestamp', 'level', 'short_message', 'user', 'url', 'method')
     list_filter = ('level', 'timestamp', 'method')
+    list_select_related = ('user',)
     search_fields = ('message', 'user__username', 'url')
-    readonly_fields = ('timestamp', 'level', 'message', 'traceback', 'user', 'url', 'method', 'data')
+    readonly_fields = ('timestamp', 'level', 'message', 'traceback', 'user', 'url', 'method', 'data', 'group')
+    show_full_result_count = False
 
     fieldsets = (
         (None, {
-            'fields': ('timestamp', 'level', 'message', 'traceback')
+            'fields': ('timestamp', 'level', 'message', 'traceback', 'group')
         }),
         ('Request Information', {
             'fields': ('user', 'url', 'method', 'data'),
@@ -0,0 +1,63 @@
+import hashlib
+import re
+import sys
+from urllib.parse import urlsplit
+
+# Path segments that identify a single object (numeric ids, UUIDs, hashes)
+ID_SEGMENT = re.compile(
+    r'/(?:\d+|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|[0-9a-f]{24,})(?=/|$)',
+    re.IGNORECASE
+)
+TRACEBACK_FRAME = re.compile(r'File "([^"]+)", line \d+, in (\S+)')
+PATH_SEPARATOR = re.compile(r'[\\/]')
+
+
+def normalize_path(path):
+    """Collapse object identifiers in a URL path, e.g. /patients/12/ -> /patients/<id>/"""
+    return ID_SEGMENT.sub('/<id>', path or '')
+
+
+def get_route(request):
+    """Return the URL pattern that matched the request, or its normalized path"""
+    match = getattr(request, 'resolver_match', None)
+    if match is not None and match.route:
+        return '/' + match.route.lstrip('^').rstrip('$')
+    return normalize_path(request.path)
+
+
+def get_route_from_url(url):
+    return normalize_path(urlsplit(url or '').path)
+
+
+def get_exception_type(exception=None):
+    """
+    Return the exception class name. Views often pass str(e), so fall back to
+    the exception currently being handled.
+    """
+    if isinstance(exception, BaseException):
+        return type(exception).__name__
+    current = sys.exc_info()[1]
+    if current is not None:
+        return type(current).__name__
+    return ''
+
+
+def get_top_frame(traceback_text):
+    """
+    Return 'file.py:function' for the innermost traceback frame. Line numbers
+    are left out so the fingerprint survives unrelated edits to the file.
+    """
+    frames = TRACEBACK_FRAME.findall(traceback_text or '')
+    if not frames:
+        return ''
+    filename, function = frames[-1]
+    filename = PATH_SEPARATOR.split(filename)[-1]
+    return f"{filename}:{function}"
+
+
+def compute_fingerprint(level, route, exception_type, top_frame, status_code=None):
+    """Stable hash identifying a group of equivalent errors"""
+    key = '|'.join([
+        level or '', str(status_code or ''), route or '', exception_type or '', top_frame or ''
+    ])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from error_handling.tasks import prune_error_logs, rollup_error_logs
+
+class Command(BaseCommand):
+    help = 'Roll up ungrouped error logs into error groups and apply retention'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--skip-rollup',
+            action='store_true',
+            help='Only apply retention, do not fold ungrouped rows into groups'
+        )
+
+    def handle(self, *args, **options):
+        if not options['skip_rollup']:
+            processed = rollup_error_logs()
+            self.stdout.write(f"Rolled up {processed} error log rows")
+
+        result = prune_error_logs()
+        self.stdout.write(self.style.SUCCESS(
+            f"Pruned {result['samples']} error log samples and {result['groups']} error groups"
+        ))
@@ -0,0 +1,58 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('error_handling', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ErrorGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=64, unique=True)),
+                ('level', models.CharField(max_length=10)),
+                ('route', models.CharField(blank=True, max_length=255)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('exception_type', models.CharField(blank=True, max_length=255)),
+                ('top_frame', models.CharField(blank=True, max_length=255)),
+                ('message', models.TextField(blank=True)),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField()),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-last_seen'],
+                'indexes': [
+                    models.Index(fields=['-last_seen'], name='errorgroup_last_seen_idx'),
+                    models.Index(fields=['level', '-last_seen'], name='errorgroup_level_seen_idx'),
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name='errorlog',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='errorlog',
+            name='group',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='samples', to='error_handling.errorgroup'),
+        ),
+        migrations.AddIndex(
+            model_name='errorlog',
+            index=models.Index(fields=['-timestamp'], name='errorlog_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='errorlog',
+            index=models.Index(fields=['level', '-timestamp'], name='errorlog_level_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='errorlog',
+            index=models.Index(fields=['fingerprint'], name='errorlog_fingerprint_idx'),
+        ),
+    ]
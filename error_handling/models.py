@@ -4,6 +4,33 @@ from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+class ErrorGroup(models.Model):
+    """
+    Aggregate of every occurrence sharing a fingerprint of
+    (level, normalized route, exception type, top traceback frame)
+    """
+    fingerprint = models.CharField(max_length=64, unique=True)
+    level = models.CharField(max_length=10)
+    route = models.CharField(max_length=255, blank=True)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    exception_type = models.CharField(max_length=255, blank=True)
+    top_frame = models.CharField(max_length=255, blank=True)
+    message = models.TextField(blank=True)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+    count = models.PositiveBigIntegerField(default=0)
+    sample_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.level} {self.route} ({self.count})"
+
+    class Meta:
+        ordering = ['-last_seen']
+        indexes = [
+            models.Index(fields=['-last_seen'], name='errorgroup_last_seen_idx'),
+            models.Index(fields=['level', '-last_seen'], name='errorgroup_level_seen_idx'),
+        ]
+
 class ErrorLog(models.Model):
     ERROR_LEVELS = [
         ('INFO', 'Information'),
@@ -25,9 +52,22 @@ class ErrorLog(models.Model):
     url = models.URLField(max_length=255, blank=True, null=True)
     method = models.CharField(max_length=10, blank=True, null=True)
     data = models.JSONField(default=dict, blank=True)
+    fingerprint = models.CharField(max_length=64, blank=True, default='')
+    group = models.ForeignKey(
+        ErrorGroup,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='samples'
+    )
 
     def __str__(self):
         return f"{self.level} at {self.timestamp}: {self.message[:50]}..."
 
     class Meta:
-        ordering = ['-timestamp']
\ No newline at end of file
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['-timestamp'], name='errorlog_timestamp_idx'),
+            models.Index(fields=['level', '-timestamp'], name='errorlog_level_ts_idx'),
+            models.Index(fields=['fingerprint'], name='errorlog_fingerprint_idx'),
+        ]
@@ -0,0 +1,196 @@
+import atexit
+import logging
+import queue
+import random
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import ErrorGroup, ErrorLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADER_WHITELIST = [
+    'User-Agent',
+    'Referer',
+    'Accept',
+    'Accept-Language',
+    'Content-Type',
+    'Content-Length',
+    'X-Forwarded-For',
+    'X-Request-Id',
+]
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def truncate(value, limit):
+    if value is None or len(value) <= limit:
+        return value
+    return value[:limit - 3] + '...'
+
+
+def sample_rate(status_code):
+    """Fraction of errors with this status code that are logged (ERROR_LOG_SAMPLE_RATES)"""
+    return min(get_setting('ERROR_LOG_SAMPLE_RATES', {}).get(status_code, 1.0), 1.0)
+
+
+def should_log(status_code):
+    """Apply the configured sampling rate for noisy status codes (403/404)"""
+    rate = sample_rate(status_code)
+    if rate >= 1.0:
+        return True
+    return random.random() < rate
+
+
+def occurrences(entries):
+    """
+    Number of errors a list of logged entries stands for: an entry kept at
+    a sample rate of 0.1 counts as 10
+    """
+    return round(sum(1.0 / (entry.data or {}).get('sample_rate', 1.0) for entry in entries))
+
+
+def filter_headers(headers):
+    whitelist = {h.lower() for h in get_setting('ERROR_LOG_HEADER_WHITELIST', DEFAULT_HEADER_WHITELIST)}
+    max_size = get_setting('ERROR_LOG_MAX_FIELD_SIZE', 4096)
+    return {
+        name: truncate(str(value), max_size)
+        for name, value in headers.items()
+        if name.lower() in whitelist
+    }
+
+
+def store_error_batch(entries):
+    """
+    Fold a batch of unsaved ErrorLog entries into their ErrorGroup aggregates
+    and keep at most ERROR_GROUP_SAMPLE_SIZE raw occurrences per group
+    """
+    sample_size = get_setting('ERROR_GROUP_SAMPLE_SIZE', 20)
+    now = timezone.now()
+
+    by_fingerprint = {}
+    for entry in entries:
+        by_fingerprint.setdefault(entry.fingerprint, []).append(entry)
+
+    with transaction.atomic():
+        ErrorGroup.objects.bulk_create([
+            ErrorGroup(
+                fingerprint=fingerprint,
+                level=items[0].level,
+                route=items[0].data.get('route', ''),
+                status_code=items[0].data.get('status_code'),
+                exception_type=items[0].data.get('exception_type', ''),
+                top_frame=items[0].data.get('top_frame', ''),
+                message=items[0].message,
+                first_seen=now,
+                last_seen=now,
+            )
+            for fingerprint, items in by_fingerprint.items()
+        ], ignore_conflicts=True)
+
+        groups = list(ErrorGroup.objects.select_for_update().filter(fingerprint__in=list(by_fingerprint)))
+        samples = []
+        for group in groups:
+            items = by_fingerprint[group.fingerprint]
+            kept = items[:max(0, sample_size - group.sample_count)]
+            for entry in kept:
+                entry.group = group
+            samples.extend(kept)
+
+            group.count += occurrences(items)
+            group.sample_count += len(kept)
+            group.last_seen = now
+            group.message = items[-1].message
+
+        ErrorGroup.objects.bulk_update(groups, ['count', 'sample_count', 'last_seen', 'message'])
+        ErrorLog.objects.bulk_create(samples)
+
+
+class ErrorLogQueue:
+    """
+    In-process queue of unsaved ErrorLog rows, drained by a background
+    thread that bulk-inserts them in batches. Enqueueing never blocks: when
+    the queue is full the entry is dropped and counted.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=get_setting('ERROR_LOG_QUEUE_SIZE', 10000))
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def put(self, entry):
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='error-log-writer',
+                    daemon=True
+                )
+                self._thread.start()
+
+    def _collect_batch(self, timeout):
+        batch_size = get_setting('ERROR_LOG_BATCH_SIZE', 50)
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        flush_interval = get_setting('ERROR_LOG_FLUSH_INTERVAL', 2)
+        while True:
+            batch = self._collect_batch(timeout=flush_interval)
+            if batch:
+                self.write(batch)
+
+    def write(self, batch):
+        close_old_connections()
+        try:
+            store_error_batch(batch)
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} error log entries: {str(e)}")
+        finally:
+            close_old_connections()
+
+    def flush(self):
+        """Write everything currently queued from the calling thread"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.write(batch)
+
+
+error_log_queue = ErrorLogQueue()
+atexit.register(error_log_queue.flush)
+
+
+def submit_error(entry):
+    """Queue an unsaved ErrorLog, or save it immediately when async is off"""
+    if get_setting('ERROR_LOG_ASYNC', True):
+        error_log_queue.put(entry)
+    else:
+        error_log_queue.write([entry])
@@ -0,0 +1,122 @@
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .fingerprints import compute_fingerprint, get_route_from_url, get_top_frame
+from .models import ErrorGroup, ErrorLog
+from .pipeline import occurrences
+
+logger = logging.getLogger(__name__)
+
+DELETE_CHUNK_SIZE = 5000
+
+
+@shared_task
+def rollup_error_logs(batch_size=1000):
+    """
+    Fold ErrorLog rows that have no ErrorGroup (written before fingerprinting)
+    into aggregates. Rows beyond the per-group sample size are deleted once
+    they have been counted.
+    """
+    sample_size = getattr(settings, 'ERROR_GROUP_SAMPLE_SIZE', 20)
+    processed = 0
+
+    while True:
+        rows = list(ErrorLog.objects.filter(group__isnull=True).order_by('-timestamp')[:batch_size])
+        if not rows:
+            break
+
+        by_fingerprint = {}
+        for row in rows:
+            data = dict(row.data or {})
+            data.setdefault('route', get_route_from_url(row.url))
+            data.setdefault('exception_type', '')
+            data.setdefault('top_frame', get_top_frame(row.traceback))
+            row.data = data
+            if not row.fingerprint:
+                row.fingerprint = compute_fingerprint(
+                    row.level, data['route'], data['exception_type'], data['top_frame'], data.get('status_code')
+                )
+            by_fingerprint.setdefault(row.fingerprint, []).append(row)
+
+        with transaction.atomic():
+            ErrorGroup.objects.bulk_create([
+                ErrorGroup(
+                    fingerprint=fingerprint,
+                    level=items[0].level,
+                    route=items[0].data['route'][:255],
+                    status_code=items[0].data.get('status_code'),
+                    exception_type=items[0].data['exception_type'][:255],
+                    top_frame=items[0].data['top_frame'][:255],
+                    message=items[0].message,
+                    first_seen=min(row.timestamp for row in items),
+                    last_seen=max(row.timestamp for row in items),
+                )
+                for fingerprint, items in by_fingerprint.items()
+            ], ignore_conflicts=True)
+
+            groups = list(ErrorGroup.objects.select_for_update().filter(fingerprint__in=list(by_fingerprint)))
+            kept, dropped_ids = [], []
+            for group in groups:
+                items = by_fingerprint[group.fingerprint]
+                keep_count = max(0, sample_size - group.sample_count)
+                for row in items[:keep_count]:
+                    row.group = group
+                    kept.append(row)
+                dropped_ids.extend(row.id for row in items[keep_count:])
+
+                group.count += occurrences(items)
+                group.sample_count += min(keep_count, len(items))
+                group.first_seen = min(group.first_seen, min(row.timestamp for row in items))
+                group.last_seen = max(group.last_seen, max(row.timestamp for row in items))
+
+            ErrorGroup.objects.bulk_update(groups, ['count', 'sample_count', 'first_seen', 'last_seen'])
+            ErrorLog.objects.bulk_update(kept, ['group', 'fingerprint', 'data'])
+            ErrorLog.objects.filter(id__in=dropped_ids).delete()
+
+        processed += len(rows)
+
+    logger.info(f"Rolled up {processed} error log rows")
+    return processed
+
+
+@shared_task
+def prune_error_logs():
+    """
+    Apply retention: delete raw occurrences older than ERROR_LOG_RETENTION_DAYS
+    and groups not seen for ERROR_GROUP_RETENTION_DAYS
+    """
+    now = timezone.now()
+    sample_cutoff = now - timedelta(days=getattr(settings, 'ERROR_LOG_RETENTION_DAYS', 30))
+    group_cutoff = now - timedelta(days=getattr(settings, 'ERROR_GROUP_RETENTION_DAYS', 180))
+
+    _, deleted_per_model = ErrorGroup.objects.filter(last_seen__lt=group_cutoff).delete()
+    deleted_groups = deleted_per_model.get(ErrorGroup._meta.label, 0)
+
+    expired = ErrorLog.objects.filter(timestamp__lt=sample_cutoff)
+    group_ids = set(expired.exclude(group__isnull=True).values_list('group_id', flat=True).distinct())
+
+    deleted_samples = 0
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:DELETE_CHUNK_SIZE])
+        if not ids:
+            break
+        deleted, _ = ErrorLog.objects.filter(id__in=ids).delete()
+        deleted_samples += deleted
+
+    if group_ids:
+        sample_counts = ErrorLog.objects.filter(
+            group=OuterRef('pk')
+        ).order_by().values('group').annotate(total=Count('id')).values('total')
+        ErrorGroup.objects.filter(id__in=group_ids).update(
+            sample_count=Coalesce(Subquery(sample_counts), 0)
+        )
+
+    logger.info(f"Pruned {deleted_samples} error log samples and {deleted_groups} error groups")
+    return {'samples': deleted_samples, 'groups': deleted_groups}
@@ -3,36 +3,52 @@ import json
 import traceback
 
 # Django imports
+from django.conf import settings
 from django.http import HttpRequest
 from django.shortcuts import render
 
 # Local imports
 from .models import ErrorLog
+from .fingerprints import compute_fingerprint, get_exception_type, get_route, get_top_frame
+from .pipeline import filter_headers, sample_rate, should_log, submit_error, truncate
 
 def log_error(request: HttpRequest, status_code: int, exception: Exception = None):
-    """Helper function to log errors to database"""
+    """Helper function to queue an error log entry without blocking the response"""
+    if not should_log(status_code):
+        return
+
     error_level = 'ERROR' if status_code >= 500 else 'WARNING'
+    max_size = getattr(settings, 'ERROR_LOG_MAX_FIELD_SIZE', 4096)
+    traceback_text = traceback.format_exc() if exception else None
+    route = get_route(request)
+    exception_type = get_exception_type(exception)
+    top_frame = get_top_frame(traceback_text)
     
     error_data = {
-        'headers': dict(request.headers),
+        'headers': filter_headers(request.headers),
         'method': request.method,
-        'path': request.path,
+        'path': truncate(request.path, max_size),
+        'status_code': status_code,
+        'route': truncate(route, 255),
+        'exception_type': truncate(exception_type, 255),
+        'top_frame': truncate(top_frame, 255),
+        # Lets the group count scale sampled errors back up
+        'sample_rate': sample_rate(status_code),
     }
     
-    if hasattr(request, 'user'):
-        user = request.user if request.user.is_authenticated else None
-    else:
-        user = None
+    user = getattr(request, 'user', None)
+    user_id = user.pk if user is not None and user.is_authenticated else None
 
-    ErrorLog.objects.create(
+    submit_error(ErrorLog(
         level=error_level,
-        message=str(exception) if exception else f"HTTP {status_code}",
-        traceback=traceback.format_exc() if exception else None,
-        user=user,
-        url=request.build_absolute_uri(),
+        message=truncate(str(exception) if exception else f"HTTP {status_code}", max_size),
+        traceback=truncate(traceback_text, max_size * 4),
+        user_id=user_id,
+        url=truncate(request.build_absolute_uri(), 255),
         method=request.method,
-        data=error_data
-    )
+        data=error_data,
+        fingerprint=compute_fingerprint(error_level, route, exception_type, top_frame, status_code)
+    ))
 
 def handler400(request: HttpRequest, exception=None):
     log_error(request, 400, exception)
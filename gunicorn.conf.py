@@ -0,0 +1,16 @@
+# Gunicorn configuration - loaded automatically from the working directory
+
+
+def post_worker_init(worker):
+    """Compile role templates in each worker before it accepts requests"""
+    from django.conf import settings
+
+    if getattr(settings, 'TEMPLATE_WARMUP', False):
+        from access_control.template_cache import warm_template_cache
+        try:
+            compiled, failures, elapsed = warm_template_cache()
+            worker.log.info(
+                f"Warmed {compiled} templates in {elapsed:.2f}s ({len(failures)} failed)"
+            )
+        except Exception as e:
+            worker.log.warning(f"Template warm-up skipped: {str(e)}")
@@ -30,6 +30,7 @@ from django.db import transaction
 
 # Local application imports
 from access_control.models import Role
+from access_control.identity import get_role_template_folder
 from access_control.permissions import PermissionManager
 from error_handling.views import handler403
 from .forms import PatientImageUploadForm, AnnotationForm
@@ -48,8 +49,7 @@ def get_template_path(base_template, role, module='image_management'):
     if isinstance(role, Role):
         role_folder = role.template_folder
     else:
-        role = Role.objects.get(name=role)
-        role_folder = role.template_folder
+        role_folder = get_role_template_folder(role)
     
     return f'{role_folder}/{module}/{base_template}'
 
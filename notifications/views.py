@@ -13,6 +13,7 @@ from django.contrib import messages
 
 # Local application imports
 from access_control.models import Role
+from access_control.identity import get_role_template_folder
 from access_control.permissions import PermissionManager
 from error_handling.views import handler403, handler404, handler500
 from .models import (
@@ -36,8 +37,7 @@ def get_template_path(base_template, role, module='notification_management'):
         role_folder = role.template_folder
     else:
         # Fallback for any legacy code
-        role = Role.objects.get(name=role)
-        role_folder = role.template_folder
+        role_folder = get_role_template_folder(role)
     
     if module:
         return f'{role_folder}/{module}/{base_template}'
@@ -0,0 +1,136 @@
+import json
+import os
+import platform
+import statistics
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+BenchmarkView = namedtuple('BenchmarkView', ['name', 'url_name', 'module'])
+
+# Heavy views driven by the regression suite, with the access_control module
+# each one checks
+BENCHMARK_VIEWS = [
+    BenchmarkView('dashboard', 'dashboard', 'dashboard'),
+    BenchmarkView('phototherapy_management', 'phototherapy_management', 'phototherapy_management'),
+    BenchmarkView('query_management', 'query_management', 'query_management'),
+    BenchmarkView('consultation_dashboard', 'consultation_dashboard', 'consultation_management'),
+    BenchmarkView('clinic_dashboard', 'clinic_management:clinic_dashboard', 'clinic_management'),
+    BenchmarkView('patient_list', 'patient_list', 'patient_management'),
+    BenchmarkView('image_management', 'image_management', 'image_management'),
+]
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'benchmark_baselines.json')
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def measure_view(client, url, repeat=5):
+    """
+    Request a URL once to warm caches and templates, then `repeat` more times.
+    Query counts come from the warm runs; the cold count is kept for context.
+    """
+    with CaptureQueriesContext(connection) as cold:
+        response = client.get(url)
+    status = response.status_code
+
+    timings, query_counts = [], []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        query_counts.append(len(captured))
+        status = response.status_code
+
+    return {
+        'url': url,
+        'status': status,
+        'cold_queries': len(cold),
+        'queries': max(query_counts),
+        'median_ms': round(statistics.median(timings), 2),
+        'max_ms': round(max(timings), 2),
+    }
+
+
+def run_benchmarks(client, views=None, repeat=5):
+    results = {}
+    for view in views or BENCHMARK_VIEWS:
+        results[view.name] = measure_view(client, reverse(view.url_name), repeat)
+    return results
+
+
+def load_baselines(path=BASELINES_PATH):
+    if not os.path.exists(path):
+        return {'scale': None, 'views': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(results, scale, path=BASELINES_PATH):
+    views = {
+        name: {'queries': result['queries'], 'median_ms': result['median_ms']}
+        for name, result in sorted(results.items())
+    }
+    with open(path, 'w') as f:
+        json.dump({'scale': scale, 'views': views}, f, indent=2)
+        f.write('\n')
+
+
+def find_regression(result, baseline):
+    """
+    Compare one view against its baseline. Query counts must not grow; wall
+    time may exceed the baseline by PERFORMANCE_BENCHMARK_TIME_TOLERANCE
+    (a ratio) plus PERFORMANCE_BENCHMARK_TIME_SLACK_MS to absorb noise.
+    Returns a description of the regression, or None.
+    """
+    if result['status'] != 200:
+        return f"returned HTTP {result['status']}"
+    if baseline is None:
+        return None
+
+    problems = []
+    if result['queries'] > baseline['queries']:
+        problems.append(f"{result['queries']} queries (baseline {baseline['queries']})")
+
+    tolerance = get_setting('PERFORMANCE_BENCHMARK_TIME_TOLERANCE', 1.5)
+    slack_ms = get_setting('PERFORMANCE_BENCHMARK_TIME_SLACK_MS', 50)
+    limit_ms = baseline['median_ms'] * tolerance + slack_ms
+    if result['median_ms'] > limit_ms:
+        problems.append(f"{result['median_ms']}ms median (limit {limit_ms:.1f}ms)")
+
+    return '; '.join(problems) or None
+
+
+def write_report(path, results, baselines, scale):
+    """
+    Write a JSON report with the measurements, the baseline they were
+    checked against and any regression, sorted so reports diff cleanly
+    """
+    report = {
+        'generated_at': timezone.now().isoformat(),
+        'scale': scale,
+        'baseline_scale': baselines.get('scale'),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'views': {},
+    }
+    for name, result in sorted(results.items()):
+        baseline = baselines['views'].get(name)
+        report['views'][name] = {
+            **result,
+            'baseline': baseline,
+            'regression': find_regression(result, baseline),
+        }
+
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+    return report
@@ -0,0 +1,21 @@
+from django_redis.cache import RedisCache
+
+from .metrics import record_cache_lookup
+
+
+class InstrumentedRedisCache(RedisCache):
+    """RedisCache that reports hits and misses to the performance middleware"""
+
+    def get(self, key, default=None, version=None, client=None):
+        value = super().get(key, default=default, version=version, client=client)
+        if value is default:
+            record_cache_lookup(misses=1)
+        else:
+            record_cache_lookup(hits=1)
+        return value
+
+    def get_many(self, keys, *args, **kwargs):
+        keys = list(keys)
+        values = super().get_many(keys, *args, **kwargs)
+        record_cache_lookup(hits=len(values), misses=len(keys) - len(values))
+        return values
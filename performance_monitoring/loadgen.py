@@ -0,0 +1,549 @@
+import logging
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from faker import Faker
+
+from access_control.models import Role
+from appointment_management.models import Appointment, Center
+from consultation_management.models import Consultation
+from patient_management.models import Patient
+from phototherapy_management.models import (
+    PhototherapyCenter, PhototherapyDevice, PhototherapyPlan,
+    PhototherapyProtocol, PhototherapySession, PhototherapyType
+)
+from query_management import assignment, rollups, search
+from query_management.models import Query, QueryTag, QueryUpdate
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# Rows generated per unit of --scale. Scale 100 gives 100k patients and
+# 1M phototherapy sessions.
+SCALE_UNIT = {
+    'doctors': 10,
+    'nurses': 10,
+    'patients': 1000,
+    'appointments': 3000,
+    'consultations': 1000,
+    'phototherapy_plans': 500,
+    'queries': 1000,
+}
+SESSIONS_PER_PLAN = 20
+UPDATES_PER_QUERY = 2
+HISTORY_DAYS = 730
+DEFAULT_PASSWORD = 'loadtest123'
+
+CHIEF_COMPLAINTS = [
+    'New depigmented patches on hands', 'Spreading patches on face',
+    'Follow-up of existing vitiligo', 'Itching over lesions',
+    'Repigmentation review', 'Patches around the eyes and lips',
+]
+DIAGNOSES = [
+    'Non-segmental vitiligo, active', 'Non-segmental vitiligo, stable',
+    'Segmental vitiligo', 'Focal vitiligo', 'Acrofacial vitiligo',
+]
+QUERY_SUBJECTS = [
+    'Appointment rescheduling', 'Treatment cost enquiry', 'Phototherapy timings',
+    'Side effects after session', 'Billing discrepancy', 'Report request',
+    'Diet advice', 'Feedback on consultation',
+]
+QUERY_TAGS = ['appointment', 'billing', 'phototherapy', 'urgent', 'feedback', 'follow-up']
+PHOTOTHERAPY_TYPES = [
+    ('NB-UVB Full Body', 'WB_NB'),
+    ('Excimer Targeted', 'EXCIMER'),
+    ('Home NB-UVB', 'HOME_NB'),
+]
+
+
+def get_counts(scale):
+    return {name: count * scale for name, count in SCALE_UNIT.items()}
+
+
+def get_rng(seed, name):
+    """Independent, reproducible random stream per generator"""
+    return random.Random(f'{seed}:{name}')
+
+
+def historical_datetime(rng, now, max_days=HISTORY_DAYS, min_days=0):
+    return now - timedelta(days=rng.randint(min_days, max_days), minutes=rng.randint(0, 1439))
+
+
+@contextmanager
+def explicit_created_at(*models):
+    """
+    Let bulk_create keep the created_at values we generate instead of
+    overwriting them with now(), so the dataset has a realistic history
+    """
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def insert_chunks(model, objects, batch_size, keep=False):
+    """
+    bulk_create an iterable of unsaved objects in chunks of batch_size.
+    Returns the primary keys in insertion order when keep is set.
+    """
+    pks = []
+    total = 0
+    chunk = []
+
+    def flush():
+        with transaction.atomic():
+            model.objects.bulk_create(chunk)
+            if keep and chunk[0].pk is None:
+                # Backends without RETURNING support: this chunk holds the
+                # highest ids of the table inside the current transaction
+                ids = model.objects.order_by('-pk').values_list('pk', flat=True)[:len(chunk)]
+                for obj, pk in zip(chunk, reversed(list(ids))):
+                    obj.pk = pk
+        if keep:
+            pks.extend(obj.pk for obj in chunk)
+
+    for obj in objects:
+        chunk.append(obj)
+        if len(chunk) >= batch_size:
+            flush()
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        flush()
+        total += len(chunk)
+
+    return pks if keep else total
+
+
+class NamePool:
+    """Faker output is slow per row, so draw from a seeded pool instead"""
+
+    def __init__(self, seed, size=500):
+        fake = Faker()
+        fake.seed_instance(seed)
+        self.first_names = [fake.first_name() for _ in range(size)]
+        self.last_names = [fake.last_name() for _ in range(size)]
+        self.cities = [fake.city() for _ in range(size // 10)]
+        self.streets = [fake.street_name() for _ in range(size // 10)]
+
+    def name(self, rng):
+        return rng.choice(self.first_names), rng.choice(self.last_names)
+
+    def address(self, rng):
+        return f'{rng.randint(1, 999)} {rng.choice(self.streets)}, {rng.choice(self.cities)}'
+
+
+def phone_number(rng):
+    return f'+91{rng.randint(7000000000, 9999999999)}'
+
+
+def get_roles():
+    roles = {}
+    for name, display_name, folder in [
+        ('DOCTOR', 'Doctor', 'doctor'),
+        ('NURSE', 'Nurse', 'nurse'),
+        ('PATIENT', 'Patient', 'patient'),
+    ]:
+        roles[name], _ = Role.objects.get_or_create(
+            name=name, defaults={'display_name': display_name, 'template_folder': folder}
+        )
+    return roles
+
+
+def create_people(seed, counts, batch_size, now):
+    """Create doctors, nurses and patients with their Patient profiles"""
+    rng = get_rng(seed, 'people')
+    names = NamePool(seed)
+    roles = get_roles()
+    password = make_password(DEFAULT_PASSWORD)
+
+    def users(kind, role, count):
+        for i in range(count):
+            first_name, last_name = names.name(rng)
+            yield User(
+                email=f'load{seed}.{kind}{i}@example.com',
+                first_name=first_name,
+                last_name=last_name,
+                gender=rng.choice('MF'),
+                phone_number=phone_number(rng),
+                role_id=role.id,
+                password=password,
+                is_active=True,
+                date_joined=historical_datetime(rng, now),
+            )
+
+    refs = {
+        'doctor_ids': insert_chunks(User, users('doctor', roles['DOCTOR'], counts['doctors']), batch_size, keep=True),
+        'nurse_ids': insert_chunks(User, users('nurse', roles['NURSE'], counts['nurses']), batch_size, keep=True),
+        'patient_ids': insert_chunks(User, users('patient', roles['PATIENT'], counts['patients']), batch_size, keep=True),
+    }
+
+    def profiles():
+        for user_id in refs['patient_ids']:
+            onset = now.date() - timedelta(days=rng.randint(30, 3650))
+            yield Patient(
+                user_id=user_id,
+                date_of_birth=now.date() - timedelta(days=rng.randint(5 * 365, 80 * 365)),
+                gender=rng.choice('MF'),
+                blood_group=rng.choice(Patient.BLOOD_GROUP_CHOICES)[0],
+                address=names.address(rng),
+                phone_number=phone_number(rng),
+                emergency_contact_name=' '.join(names.name(rng)),
+                emergency_contact_number=phone_number(rng),
+                vitiligo_onset_date=onset,
+                vitiligo_type=rng.choice(['Non-segmental', 'Segmental', 'Focal']),
+                created_at=historical_datetime(rng, now),
+            )
+
+    with explicit_created_at(Patient):
+        insert_chunks(Patient, profiles(), batch_size)
+
+    return refs
+
+
+def create_reference_data(seed, refs, now):
+    """Small lookup tables the per-app generators point at"""
+    rng = get_rng(seed, 'reference')
+
+    centers = [
+        Center.objects.create(
+            name=f'Load Center {seed}-{i}', address=f'{i} Clinic Road', contact_number=phone_number(rng)
+        )
+        for i in range(1, 6)
+    ]
+    photo_centers = [
+        PhototherapyCenter.objects.create(
+            name=f'Load Phototherapy Center {seed}-{i}', address=f'{i} Clinic Road',
+            contact_number=phone_number(rng), operating_hours='Mon-Sat 08:00-18:00'
+        )
+        for i in range(1, 4)
+    ]
+
+    protocols, devices = [], []
+    for name, therapy_type in PHOTOTHERAPY_TYPES:
+        photo_type = PhototherapyType.objects.create(
+            name=f'{name} ({seed})', therapy_type=therapy_type, description=name
+        )
+        protocols.append(PhototherapyProtocol.objects.create(
+            phototherapy_type=photo_type,
+            name=f'{name} standard',
+            description=f'Standard {name} protocol',
+            initial_dose=200.0,
+            max_dose=1500.0,
+            increment_percentage=10.0,
+            frequency_per_week=3,
+            duration_weeks=12,
+            safety_guidelines='Use eye protection',
+            created_by_id=refs['doctor_ids'][0],
+        ))
+        for i in range(3):
+            devices.append(PhototherapyDevice.objects.create(
+                name=f'{name} unit {i + 1}',
+                model_number=f'PT-{therapy_type}',
+                serial_number=f'LOAD-{seed}-{therapy_type}-{i + 1}',
+                phototherapy_type=photo_type,
+                location=rng.choice(photo_centers).name,
+                installation_date=now.date() - timedelta(days=HISTORY_DAYS + 30),
+            ))
+
+    for name in QUERY_TAGS:
+        QueryTag.objects.get_or_create(name=name)
+
+    refs.update({
+        'center_ids': [center.id for center in centers],
+        'photo_center_ids': [center.id for center in photo_centers],
+        'protocols': [(p.id, p.initial_dose, p.max_dose) for p in protocols],
+        'device_ids': [device.id for device in devices],
+        'tag_ids': list(QueryTag.objects.filter(name__in=QUERY_TAGS).values_list('id', flat=True)),
+    })
+    return refs
+
+
+def generate_appointments(seed, counts, refs, batch_size, now):
+    rng = get_rng(seed, 'appointments')
+    types = [choice for choice, _ in Appointment.APPOINTMENT_TYPES]
+
+    def rows():
+        for _ in range(counts['appointments']):
+            day = now.date() + timedelta(days=rng.randint(-365, 60))
+            if day < now.date():
+                status = rng.choices(['COMPLETED', 'CANCELLED', 'NO_SHOW'], weights=[80, 12, 8])[0]
+            else:
+                status = rng.choice(['PENDING', 'SCHEDULED', 'CONFIRMED'])
+            yield Appointment(
+                patient_id=rng.choice(refs['patient_ids']),
+                doctor_id=rng.choice(refs['doctor_ids']),
+                center_id=rng.choice(refs['center_ids']),
+                appointment_type=rng.choice(types),
+                date=day,
+                status=status,
+                priority=rng.choice('ABC'),
+                created_at=timezone.make_aware(datetime.combine(day, dt_time(9))) - timedelta(days=rng.randint(1, 30)),
+            )
+
+    with explicit_created_at(Appointment):
+        return {'appointments': insert_chunks(Appointment, rows(), batch_size)}
+
+
+def generate_consultations(seed, counts, refs, batch_size, now):
+    rng = get_rng(seed, 'consultations')
+
+    def rows():
+        for _ in range(counts['consultations']):
+            scheduled = historical_datetime(rng, now, max_days=365, min_days=-30)
+            doctor_id = rng.choice(refs['doctor_ids'])
+            yield Consultation(
+                patient_id=rng.choice(refs['patient_ids']),
+                doctor_id=doctor_id,
+                center_id=rng.choice(refs['center_ids']),
+                scheduled_datetime=scheduled,
+                chief_complaint=rng.choice(CHIEF_COMPLAINTS),
+                diagnosis=rng.choice(DIAGNOSES),
+                status='COMPLETED' if scheduled < now else 'SCHEDULED',
+                created_by_id=doctor_id,
+                duration_minutes=rng.choice([15, 30, 45]),
+                created_at=scheduled - timedelta(days=rng.randint(1, 14)),
+            )
+
+    with explicit_created_at(Consultation):
+        return {'consultations': insert_chunks(Consultation, rows(), batch_size)}
+
+
+def generate_phototherapy(seed, counts, refs, batch_size, now):
+    rng = get_rng(seed, 'phototherapy')
+    today = now.date()
+    plan_count = min(counts['phototherapy_plans'], len(refs['patient_ids']))
+    patient_ids = rng.sample(refs['patient_ids'], plan_count)
+    plan_starts = []
+
+    def plans():
+        for patient_id in patient_ids:
+            protocol_id, initial_dose, _ = rng.choice(refs['protocols'])
+            start = today - timedelta(days=rng.randint(0, HISTORY_DAYS))
+            total_cost = Decimal(rng.randrange(10000, 50000, 500))
+            plan_starts.append((start, protocol_id))
+            yield PhototherapyPlan(
+                patient_id=patient_id,
+                protocol_id=protocol_id,
+                start_date=start,
+                current_dose=initial_dose,
+                total_sessions_planned=SESSIONS_PER_PLAN,
+                total_cost=total_cost,
+                amount_paid=total_cost * Decimal(rng.choice([0, 0.5, 1])),
+                billing_status=rng.choice(['PENDING', 'PARTIAL', 'PAID']),
+                created_by_id=rng.choice(refs['doctor_ids']),
+                center_id=rng.choice(refs['photo_center_ids']),
+                is_active=start + timedelta(days=SESSIONS_PER_PLAN * 3) >= today,
+                created_at=timezone.make_aware(datetime.combine(start, dt_time(9))),
+            )
+
+    with explicit_created_at(PhototherapyPlan):
+        plan_ids = insert_chunks(PhototherapyPlan, plans(), batch_size, keep=True)
+
+    doses = {protocol_id: (initial, maximum) for protocol_id, initial, maximum in refs['protocols']}
+
+    def sessions():
+        for plan_id, (start, protocol_id) in zip(plan_ids, plan_starts):
+            initial_dose, max_dose = doses[protocol_id]
+            dose = initial_dose
+            day = start
+            for number in range(1, SESSIONS_PER_PLAN + 1):
+                if day < today:
+                    status = rng.choices(['COMPLETED', 'MISSED', 'CANCELLED'], weights=[85, 10, 5])[0]
+                else:
+                    status = 'SCHEDULED'
+                completed = status == 'COMPLETED'
+                yield PhototherapySession(
+                    plan_id=plan_id,
+                    session_number=number,
+                    scheduled_date=day,
+                    scheduled_time=dt_time(rng.randint(8, 17), rng.choice([0, 30])),
+                    actual_date=day if completed else None,
+                    device_id=rng.choice(refs['device_ids']),
+                    planned_dose=dose,
+                    actual_dose=dose if completed else None,
+                    duration_seconds=rng.randint(60, 600) if completed else None,
+                    status=status,
+                    problem_severity=rng.choices(['NONE', 'MILD', 'MODERATE'], weights=[90, 8, 2])[0],
+                    administered_by_id=rng.choice(refs['nurse_ids']) if completed else None,
+                    created_at=timezone.make_aware(datetime.combine(start, dt_time(9))),
+                )
+                if completed:
+                    dose = min(dose * 1.1, max_dose)
+                day += timedelta(days=rng.choice([2, 2, 3]))
+
+    with explicit_created_at(PhototherapySession):
+        session_count = insert_chunks(PhototherapySession, sessions(), batch_size)
+
+    completed = PhototherapySession.objects.filter(
+        plan=OuterRef('pk'), status='COMPLETED'
+    ).order_by().values('plan').annotate(total=Count('id')).values('total')
+    for start in range(0, len(plan_ids), batch_size):
+        PhototherapyPlan.objects.filter(id__in=plan_ids[start:start + batch_size]).update(
+            sessions_completed=Coalesce(Subquery(completed, output_field=IntegerField()), Value(0))
+        )
+
+    return {'phototherapy_plans': len(plan_ids), 'phototherapy_sessions': session_count}
+
+
+def generate_queries(seed, counts, refs, batch_size, now):
+    rng = get_rng(seed, 'queries')
+    sources = [choice for choice, _ in Query.SOURCE_CHOICES]
+    query_types = [choice for choice, _ in Query.QUERY_TYPE_CHOICES]
+    staff_ids = refs['doctor_ids'] + refs['nurse_ids']
+    created = []
+
+    def rows():
+        for i in range(counts['queries']):
+            created_at = historical_datetime(rng, now)
+            status = rng.choices(['NEW', 'IN_PROGRESS', 'WAITING', 'RESOLVED', 'CLOSED'], weights=[10, 15, 5, 50, 20])[0]
+            resolved = status in ('RESOLVED', 'CLOSED')
+            response_time = timedelta(hours=rng.randint(1, 96)) if status != 'NEW' else None
+            anonymous = rng.random() < 0.2
+            created.append(created_at)
+            yield Query(
+                user_id=None if anonymous else rng.choice(refs['patient_ids']),
+                assigned_to_id=rng.choice(staff_ids),
+                subject=rng.choice(QUERY_SUBJECTS),
+                description=f'{rng.choice(QUERY_SUBJECTS)} - reference {seed}-{i}',
+                source=rng.choice(sources),
+                priority=rng.choice('ABC'),
+                status=status,
+                created_at=created_at,
+                resolved_at=created_at + timedelta(hours=rng.randint(1, 240)) if resolved else None,
+                is_anonymous=anonymous,
+                contact_email=f'load{seed}.contact{i}@example.com' if anonymous else None,
+                query_type=rng.choice(query_types),
+                is_patient=not anonymous,
+                conversion_status=rng.random() < 0.3,
+                response_time=response_time,
+                satisfaction_rating=rng.randint(1, 5) if resolved else None,
+            )
+
+    with explicit_created_at(Query, QueryUpdate):
+        query_ids = insert_chunks(Query, rows(), batch_size, keep=True)
+
+        QueryTags = Query.tags.through
+        tag_rows = (
+            QueryTags(query_id=query_id, querytag_id=tag_id)
+            for query_id in query_ids
+            for tag_id in rng.sample(refs['tag_ids'], rng.randint(0, 2))
+        )
+        tag_count = insert_chunks(QueryTags, tag_rows, batch_size)
+
+        updates = (
+            QueryUpdate(
+                query_id=query_id,
+                user_id=rng.choice(staff_ids),
+                content=f'Update {n + 1}: contacted patient',
+                created_at=created_at + timedelta(hours=rng.randint(1, 72)),
+            )
+            for query_id, created_at in zip(query_ids, created)
+            for n in range(UPDATES_PER_QUERY)
+        )
+        update_count = insert_chunks(QueryUpdate, updates, batch_size)
+
+    return {'queries': len(query_ids), 'query_tags': tag_count, 'query_updates': update_count}
+
+
+GENERATORS = {
+    'appointments': generate_appointments,
+    'consultations': generate_consultations,
+    'phototherapy': generate_phototherapy,
+    'queries': generate_queries,
+}
+
+# Apps with a populate_* command but no generator here: a load dataset
+# leaves their tables empty (appointment time slots and module permissions
+# included), so run those commands where a benchmark needs them. Users,
+# patient profiles, centers and the phototherapy and query reference data
+# are always created.
+NOT_GENERATED = [
+    'access_control', 'asset_management', 'body_mapping', 'clinic_management',
+    'compliance_management', 'doctor_management', 'financial_management', 'help_support',
+    'hr_management', 'image_management', 'lab_management', 'notifications',
+    'pharmacy_management', 'procedure_management', 'reporting_and_analytics',
+    'research_management', 'stock_management', 'telemedicine_management',
+]
+
+
+def run_generator(name, seed, counts, refs, batch_size, now):
+    """Entry point for worker processes; returns (name, row counts, seconds)"""
+    start = time.monotonic()
+    try:
+        result = GENERATORS[name](seed, counts, refs, batch_size, now)
+    finally:
+        connections.close_all()
+    return name, result, time.monotonic() - start
+
+
+def generate_dataset(scale, seed=42, apps=None, workers=1, batch_size=2000, report=None):
+    """
+    Build a referentially consistent dataset: shared users and reference
+    tables first, then one generator per app, optionally in parallel worker
+    processes. Every generator has its own seeded random stream, so the same
+    seed produces the same data whichever order the workers finish in.
+    """
+    report = report or (lambda message: logger.info(message))
+    now = timezone.now().replace(second=0, microsecond=0)
+    counts = get_counts(scale)
+    apps = apps or list(GENERATORS)
+    results = {}
+
+    start = time.monotonic()
+    refs = create_people(seed, counts, batch_size, now)
+    refs = create_reference_data(seed, refs, now)
+    results['users'] = counts['doctors'] + counts['nurses'] + counts['patients']
+    results['patients'] = counts['patients']
+    report(f"Created {results['users']} users in {time.monotonic() - start:.1f}s")
+
+    jobs = [(name, seed, counts, refs, batch_size, now) for name in apps]
+    if workers > 1 and len(jobs) > 1:
+        # Children must open their own database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            outcomes = [future.result() for future in [pool.submit(run_generator, *job) for job in jobs]]
+    else:
+        outcomes = [run_generator(*job) for job in jobs]
+
+    for name, result, elapsed in outcomes:
+        results.update(result)
+        summary = ', '.join(f'{count} {table}' for table, count in result.items())
+        report(f"{name}: {summary} in {elapsed:.1f}s")
+
+    if 'queries' in apps:
+        # Bulk inserts bypass the signals that maintain the query rollups
+        start = time.monotonic()
+        rollup_rows = rollups.reconcile()
+        report(f"Rebuilt {rollup_rows} query rollup rows in {time.monotonic() - start:.1f}s")
+        # ... and the search index
+        start = time.monotonic()
+        indexed = search.rebuild()
+        report(f"Indexed {indexed} queries for search in {time.monotonic() - start:.1f}s")
+
+    # Bulk-created staff get no workload rows from signals; count their open queries too
+    start = time.monotonic()
+    assignment.reconcile()
+    report(f"Reconciled staff workload in {time.monotonic() - start:.1f}s")
+
+    return results
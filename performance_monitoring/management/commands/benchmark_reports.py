@@ -0,0 +1,114 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from performance_monitoring.report_benchmarks import (
+    DEFAULT_ROW_COUNTS, load_report_baseline, reset_peak_rss, run_report_benchmarks,
+    write_report_benchmarks
+)
+from reporting_and_analytics.services.formats import EXPORT_FORMATS, is_available
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every registered report generator against synthetic Query datasets '
+        'in a throwaway test database and write the measurements as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            action='append',
+            help='Query rows in a dataset (can be repeated; default: 10000, 100000 and 1000000)'
+        )
+        parser.add_argument(
+            '--category',
+            action='append',
+            dest='categories',
+            help='Only benchmark reports of this category (can be repeated)'
+        )
+        parser.add_argument(
+            '--format',
+            default='XLSX',
+            choices=sorted(EXPORT_FORMATS),
+            help='Output format the reports are written in'
+        )
+        parser.add_argument(
+            '--partition-workers',
+            type=int,
+            default=1,
+            help='Worker processes for month-partitioned reports; queries and memory of '
+                 'workers are not measured, so the default keeps them in-process'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed; the same seed always produces the same data'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Rows per bulk insert'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON output of an earlier run to check for regressions against'
+        )
+        parser.add_argument(
+            '--output',
+            default='report_benchmarks.json',
+            help='Where to write the JSON results'
+        )
+
+    def handle(self, *args, **options):
+        row_counts = options['rows'] or DEFAULT_ROW_COUNTS
+        if min(row_counts) < 1:
+            raise CommandError('--rows must be at least 1')
+        if options['partition_workers'] < 1:
+            raise CommandError('--partition-workers must be at least 1')
+        if not is_available(options['format']):
+            raise CommandError(f"{options['format']} output needs a package that is not installed")
+        baseline = load_report_baseline(options['baseline']) if options['baseline'] else None
+
+        start = time.monotonic()
+        with tempfile.TemporaryDirectory(prefix='report_benchmarks_') as directory:
+            old_name = connection.settings_dict['NAME']
+            if connection.vendor == 'sqlite':
+                # A file rather than in-memory database, so partition workers can read it
+                connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+            self.stdout.write('Creating a test database for the benchmark datasets')
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                datasets = run_report_benchmarks(
+                    row_counts,
+                    directory,
+                    seed=options['seed'],
+                    batch_size=options['batch_size'],
+                    categories=options['categories'],
+                    export_format=options['format'],
+                    partition_workers=options['partition_workers'],
+                    report=self.stdout.write,
+                )
+                output = write_report_benchmarks(
+                    options['output'],
+                    datasets,
+                    baseline=baseline,
+                    export_format=options['format'],
+                    partition_workers=options['partition_workers'],
+                    peak_rss_per_report=reset_peak_rss(),
+                )
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(f"Wrote {options['output']} in {time.monotonic() - start:.1f}s")
+        if output['regressions']:
+            for regression in output['regressions']:
+                self.stdout.write(self.style.ERROR(regression))
+            raise CommandError(f"{len(output['regressions'])} report benchmarks regressed")
+        self.stdout.write(self.style.SUCCESS('No regressions'))
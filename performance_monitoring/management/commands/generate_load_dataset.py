@@ -0,0 +1,83 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from performance_monitoring.loadgen import GENERATORS, NOT_GENERATED, generate_dataset, get_counts
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = (
+        'Generate a large, referentially consistent dataset for load testing: users, patients, '
+        f"{', '.join(sorted(GENERATORS))}. Not generated (use their populate_* commands): "
+        f"{', '.join(NOT_GENERATED)}"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=int,
+            default=1,
+            help='Dataset size multiplier: 1 = 1,000 patients / 10,000 phototherapy sessions'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed; the same seed always produces the same data'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Run the per-app generators in this many parallel processes'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Rows per bulk insert'
+        )
+        parser.add_argument(
+            '--app',
+            action='append',
+            dest='apps',
+            choices=sorted(GENERATORS),
+            help='Only generate data for this app (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        scale, seed, workers = options['scale'], options['seed'], options['workers']
+        if scale < 1:
+            raise CommandError('--scale must be at least 1')
+
+        if User.objects.filter(email__startswith=f'load{seed}.').exists():
+            raise CommandError(
+                f'A dataset with seed {seed} already exists; use another --seed or reset the database'
+            )
+
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite allows a single writer; running with one worker'))
+            workers = 1
+
+        counts = get_counts(scale)
+        self.stdout.write(
+            f"Generating scale {scale} (seed {seed}): {counts['patients']} patients, "
+            f"{counts['phototherapy_plans']} phototherapy plans, {counts['queries']} queries"
+        )
+
+        start = time.monotonic()
+        results = generate_dataset(
+            scale,
+            seed=seed,
+            apps=options['apps'],
+            workers=workers,
+            batch_size=options['batch_size'],
+            report=self.stdout.write,
+        )
+
+        total = sum(results.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {total} rows in {time.monotonic() - start:.1f}s"
+        ))
@@ -0,0 +1,201 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+METRIC_FIELDS = (
+    'requests',
+    'response_seconds',
+    'db_queries',
+    'db_seconds',
+    'duplicate_queries',
+    'cache_hits',
+    'cache_misses',
+    'budget_exceeded',
+)
+
+METRIC_HELP = {
+    'requests': ('counter', 'Requests handled per view'),
+    'response_seconds': ('counter', 'Total response time per view in seconds'),
+    'db_queries': ('counter', 'SQL queries executed per view'),
+    'db_seconds': ('counter', 'Total SQL execution time per view in seconds'),
+    'duplicate_queries': ('counter', 'Repeated SQL statements per view (N+1 candidates)'),
+    'cache_hits': ('counter', 'Cache hits per view'),
+    'cache_misses': ('counter', 'Cache misses per view'),
+    'budget_exceeded': ('counter', 'Requests that exceeded the view query budget'),
+}
+
+REDIS_VIEWS_KEY = 'performance:views'
+REDIS_VIEW_KEY = 'performance:view:{view_name}'
+REDIS_DUPLICATES_KEY = 'performance:duplicates:{view_name}'
+MAX_DUPLICATE_FINGERPRINTS = 50
+
+current_request_stats = contextvars.ContextVar('performance_request_stats', default=None)
+
+
+class RequestStats:
+    """SQL and cache activity collected while a single request is handled"""
+
+    def __init__(self):
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.sql_counts = Counter()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.query_count += 1
+            # The SQL string still has its placeholders, so it works as a
+            # fingerprint for "the same query with different parameters"
+            self.sql_counts[sql] += 1
+
+    def duplicate_queries(self):
+        return {sql: count for sql, count in self.sql_counts.items() if count > 1}
+
+
+def record_cache_lookup(hits=0, misses=0):
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+def get_redis_connection():
+    try:
+        from django_redis import get_redis_connection as django_redis_connection
+        return django_redis_connection('default')
+    except Exception:
+        return None
+
+
+class MetricsRegistry:
+    """
+    Per-view counters. Each worker accumulates locally and periodically adds
+    its deltas to Redis, so /metrics reports totals across all workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = defaultdict(lambda: dict.fromkeys(METRIC_FIELDS, 0))
+        self._pending = defaultdict(lambda: dict.fromkeys(METRIC_FIELDS, 0))
+        self._totals_duplicates = defaultdict(Counter)
+        self._pending_duplicates = defaultdict(Counter)
+        self._last_flush = time.monotonic()
+
+    def record(self, view_name, values, duplicates=None):
+        with self._lock:
+            for field, value in values.items():
+                self._totals[view_name][field] += value
+                self._pending[view_name][field] += value
+            for sql, count in (duplicates or {}).items():
+                self._totals_duplicates[view_name][sql] += count - 1
+                self._pending_duplicates[view_name][sql] += count - 1
+
+        interval = getattr(settings, 'PERFORMANCE_METRICS_FLUSH_INTERVAL', 10)
+        if time.monotonic() - self._last_flush >= interval:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: dict.fromkeys(METRIC_FIELDS, 0))
+            pending_duplicates, self._pending_duplicates = self._pending_duplicates, defaultdict(Counter)
+            self._last_flush = time.monotonic()
+
+        if not pending:
+            return
+        redis = get_redis_connection()
+        if redis is None:
+            return
+
+        try:
+            pipe = redis.pipeline(transaction=False)
+            for view_name, values in pending.items():
+                pipe.sadd(REDIS_VIEWS_KEY, view_name)
+                key = REDIS_VIEW_KEY.format(view_name=view_name)
+                for field, value in values.items():
+                    if value:
+                        pipe.hincrbyfloat(key, field, value)
+            for view_name, duplicates in pending_duplicates.items():
+                key = REDIS_DUPLICATES_KEY.format(view_name=view_name)
+                for sql, count in duplicates.items():
+                    pipe.zincrby(key, count, sql[:1000])
+                pipe.zremrangebyrank(key, 0, -(MAX_DUPLICATE_FINGERPRINTS + 1))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error flushing performance metrics to Redis: {str(e)}")
+
+    def snapshot(self):
+        """
+        Return ({view_name: {field: value}}, {view_name: [(sql, count), ...]}),
+        aggregated across workers when Redis is reachable, otherwise for this
+        process only
+        """
+        self.flush()
+        redis = get_redis_connection()
+        if redis is not None:
+            try:
+                view_names = sorted(name.decode() if isinstance(name, bytes) else name
+                                    for name in redis.smembers(REDIS_VIEWS_KEY))
+                pipe = redis.pipeline(transaction=False)
+                for view_name in view_names:
+                    pipe.hgetall(REDIS_VIEW_KEY.format(view_name=view_name))
+                    pipe.zrevrange(REDIS_DUPLICATES_KEY.format(view_name=view_name), 0, 9, withscores=True)
+                results = pipe.execute()
+
+                views, duplicates = {}, {}
+                for index, view_name in enumerate(view_names):
+                    raw_values, raw_duplicates = results[index * 2], results[index * 2 + 1]
+                    values = dict.fromkeys(METRIC_FIELDS, 0)
+                    for field, value in raw_values.items():
+                        field = field.decode() if isinstance(field, bytes) else field
+                        values[field] = float(value)
+                    views[view_name] = values
+                    duplicates[view_name] = [
+                        (sql.decode() if isinstance(sql, bytes) else sql, int(count))
+                        for sql, count in raw_duplicates
+                    ]
+                return views, duplicates
+            except Exception as e:
+                logger.warning(f"Error reading performance metrics from Redis: {str(e)}")
+
+        with self._lock:
+            views = {name: dict(values) for name, values in self._totals.items()}
+            duplicates = {
+                name: counter.most_common(10) for name, counter in self._totals_duplicates.items()
+            }
+        return views, duplicates
+
+
+registry = MetricsRegistry()
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render_prometheus(views):
+    """Render per-view counters in the Prometheus text exposition format"""
+    lines = []
+    for field in METRIC_FIELDS:
+        metric_type, help_text = METRIC_HELP[field]
+        name = f'vitigo_view_{field}_total'
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for view_name, values in sorted(views.items()):
+            lines.append(f'{name}{{view="{escape_label(view_name)}"}} {format_value(values.get(field, 0))}')
+    return '\n'.join(lines) + '\n'
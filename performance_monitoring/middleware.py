@@ -0,0 +1,74 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import RequestStats, current_request_stats, registry
+
+logger = logging.getLogger(__name__)
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name or match._func_path
+
+
+def get_query_budget(view_name):
+    budgets = getattr(settings, 'PERFORMANCE_QUERY_BUDGETS', {})
+    return budgets.get(view_name, getattr(settings, 'PERFORMANCE_DEFAULT_QUERY_BUDGET', None))
+
+
+class PerformanceMonitoringMiddleware:
+    """
+    Record query count, SQL time, repeated queries (N+1 candidates), cache
+    hits/misses and response time for every request, keyed by URL name
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PERFORMANCE_MONITORING_ENABLED', True)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(stats.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            current_request_stats.reset(token)
+        elapsed = time.perf_counter() - start
+
+        view_name = get_view_name(request)
+        duplicates = stats.duplicate_queries()
+        budget = get_query_budget(view_name)
+        over_budget = budget is not None and stats.query_count > budget
+
+        if over_budget:
+            worst = sorted(duplicates.items(), key=lambda item: item[1], reverse=True)[:3]
+            logger.warning(
+                f"Query budget exceeded for {view_name}: {stats.query_count} queries "
+                f"(budget {budget}) in {elapsed * 1000:.0f}ms; most repeated: "
+                + '; '.join(f"{count}x {sql[:200]}" for sql, count in worst)
+            )
+
+        registry.record(view_name, {
+            'requests': 1,
+            'response_seconds': elapsed,
+            'db_queries': stats.query_count,
+            'db_seconds': stats.sql_time,
+            'duplicate_queries': sum(count - 1 for count in duplicates.values()),
+            'cache_hits': stats.cache_hits,
+            'cache_misses': stats.cache_misses,
+            'budget_exceeded': 1 if over_budget else 0,
+        }, duplicates)
+        return response
@@ -0,0 +1,245 @@
+import gc
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from query_management import assignment, rollups
+from query_management.models import Query
+from reporting_and_analytics.services.report_generators import ReportGeneratorFactory
+
+from .loadgen import HISTORY_DAYS, create_people, create_reference_data, generate_queries, get_counts
+
+# Dataset sizes the report benchmark runs at by default, in Query rows
+DEFAULT_ROW_COUNTS = [10000, 100000, 1000000]
+
+# Measurements carried over from an earlier run for comparison
+BASELINE_FIELDS = ['error', 'seconds', 'peak_rss_mb', 'rss_growth_mb', 'queries', 'file_size']
+
+
+def report_label(category, name):
+    return f'{category} / {name}'
+
+
+def benchmark_reports(categories=None):
+    """
+    (category, name) of the registered reports to benchmark. Reports reading
+    the analytics snapshot do not touch Query rows and are left out.
+    """
+    reports = [
+        report for report in sorted(ReportGeneratorFactory.registered_reports())
+        if not ReportGeneratorFactory.uses_snapshot(*report)
+    ]
+    if categories:
+        reports = [report for report in reports if report[0] in categories]
+    return reports
+
+
+def reset_peak_rss():
+    """
+    Reset the kernel's peak RSS counter for this process (Linux only).
+    Returns False where peak RSS can only be read for the whole process lifetime.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _status_bytes(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(f'{field}:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def current_rss_bytes():
+    return _status_bytes('VmRSS')
+
+
+def peak_rss_bytes():
+    peak = _status_bytes('VmHWM')
+    if peak is not None:
+        return peak
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def prepare_people(seed, batch_size, now):
+    """Staff, patients and tags the generated queries point at, as in a scale 1 dataset"""
+    refs = create_people(seed, get_counts(1), batch_size, now)
+    refs = create_reference_data(seed, refs, now)
+    # Bulk-created staff have no workload rows, so nobody could be assigned new queries
+    assignment.reconcile()
+    return refs
+
+
+def grow_queries(target, seed, refs, batch_size, now):
+    """
+    Top the Query table up to `target` rows, so the datasets of a run are
+    generated incrementally (10k, then 90k more for 100k, ...). Each step has its
+    own random stream. Returns the number of queries added.
+    """
+    missing = target - Query.objects.count()
+    if missing <= 0:
+        return 0
+    generate_queries(f'{seed}.{target}', {'queries': missing}, refs, batch_size, now)
+    # Bulk inserts bypass the signals that maintain the query rollups and staff workload
+    rollups.reconcile()
+    assignment.reconcile()
+    return missing
+
+
+def measure_report(category, name, start_date, end_date, directory, export_format='XLSX'):
+    """Render one report over a fresh extraction and measure it"""
+    gc.collect()
+    reset_peak_rss()
+    start_rss = current_rss_bytes()
+    result = {'category': category, 'report': name, 'error': None}
+    path = None
+    with CaptureQueriesContext(connection) as captured:
+        start = time.perf_counter()
+        try:
+            paths = ReportGeneratorFactory.run_reports(
+                [(category, name)], start_date, end_date, directory=directory, export_format=export_format
+            )
+            path = paths[(category, name)]
+        except Exception as e:
+            result['error'] = f'{type(e).__name__}: {e}'
+        elapsed = time.perf_counter() - start
+
+    result.update({
+        'seconds': round(elapsed, 3),
+        'peak_rss_mb': round(peak_rss_bytes() / (1024 * 1024), 1),
+        # Memory the report itself added on top of the process
+        'rss_growth_mb': round((peak_rss_bytes() - start_rss) / (1024 * 1024), 1) if start_rss else None,
+        'queries': len(captured),
+        'file_size': os.path.getsize(path) if path else None,
+    })
+    if path and os.path.exists(path):
+        os.remove(path)
+    return result
+
+
+def run_report_benchmarks(row_counts, directory, seed=42, batch_size=2000, categories=None,
+                          export_format='XLSX', partition_workers=1, report=None):
+    """
+    Grow a synthetic Query dataset through `row_counts` and render every
+    report over the full history at each size. Queries run by partition
+    worker processes are not captured, so partitioned reports run in-process
+    unless `partition_workers` says otherwise.
+    Returns {row count: {'generate_seconds': ..., 'reports': {label: result}}}.
+    """
+    report = report or (lambda message: None)
+    now = timezone.now().replace(second=0, microsecond=0)
+    refs = prepare_people(seed, batch_size, now)
+    reports = benchmark_reports(categories)
+
+    datasets = {}
+    with override_settings(REPORT_PARTITION_WORKERS=partition_workers):
+        for rows in sorted(row_counts):
+            start = time.monotonic()
+            grow_queries(rows, seed, refs, batch_size, now)
+            generate_seconds = round(time.monotonic() - start, 1)
+            report(f"{rows} queries ready in {generate_seconds}s")
+
+            # The whole generated history, plus a day of margin
+            start_date, end_date = now - timedelta(days=HISTORY_DAYS + 1), now
+            results = {}
+            for category, name in reports:
+                result = measure_report(category, name, start_date, end_date, directory, export_format)
+                results[report_label(category, name)] = result
+                report(
+                    f"  {name}: {result['seconds']}s, {result['peak_rss_mb']} MB peak, "
+                    f"{result['queries']} queries" + (f", failed: {result['error']}" if result['error'] else '')
+                )
+            datasets[str(rows)] = {'generate_seconds': generate_seconds, 'reports': results}
+    return datasets
+
+
+def load_report_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def find_report_regression(result, baseline):
+    """
+    Compare one report measurement with the same report at the same size in
+    an earlier run. Query counts must not grow; time may exceed the baseline
+    by PERFORMANCE_BENCHMARK_TIME_TOLERANCE plus PERFORMANCE_BENCHMARK_TIME_SLACK_MS.
+    Returns a description of the regression, or None.
+    """
+    if result['error']:
+        return f"failed: {result['error']}"
+    if baseline is None or baseline.get('error'):
+        return None
+
+    problems = []
+    if result['queries'] > baseline['queries']:
+        problems.append(f"{result['queries']} queries (baseline {baseline['queries']})")
+
+    tolerance = getattr(settings, 'PERFORMANCE_BENCHMARK_TIME_TOLERANCE', 1.5)
+    slack = getattr(settings, 'PERFORMANCE_BENCHMARK_TIME_SLACK_MS', 50) / 1000
+    limit = baseline['seconds'] * tolerance + slack
+    if result['seconds'] > limit:
+        problems.append(f"{result['seconds']}s (limit {limit:.2f}s)")
+
+    return '; '.join(problems) or None
+
+
+def write_report_benchmarks(path, datasets, baseline=None, export_format='XLSX', partition_workers=1,
+                            peak_rss_per_report=True):
+    """
+    Write the measurements as JSON, with failed reports and regressions
+    against `baseline` (an earlier output of this function, when given),
+    sorted so runs diff cleanly
+    """
+    output = {
+        'generated_at': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'export_format': export_format,
+        'partition_workers': partition_workers,
+        # False where the peak RSS is the process peak so far rather than per report
+        'peak_rss_per_report': peak_rss_per_report,
+        'skipped': [
+            report_label(*report) for report in sorted(ReportGeneratorFactory.registered_reports())
+            if ReportGeneratorFactory.uses_snapshot(*report)
+        ],
+        'datasets': {},
+    }
+    regressions = []
+    for rows, dataset in datasets.items():
+        baseline_reports = (baseline or {}).get('datasets', {}).get(rows, {}).get('reports', {})
+        reports = {}
+        for label, result in dataset['reports'].items():
+            previous = baseline_reports.get(label)
+            if previous is not None:
+                previous = {key: previous.get(key) for key in BASELINE_FIELDS}
+            # Failures count as regressions with or without a baseline
+            regression = find_report_regression(result, previous)
+            if regression:
+                regressions.append(f"{label} at {rows} rows: {regression}")
+            reports[label] = {**result, 'baseline': previous, 'regression': regression}
+        output['datasets'][rows] = {**dataset, 'reports': reports}
+    output['regressions'] = regressions
+
+    with open(path, 'w') as f:
+        json.dump(output, f, indent=2, sort_keys=True)
+        f.write('\n')
+    return output
@@ -0,0 +1,81 @@
+import unittest
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from access_control.models import Module, ModulePermission, Role
+from access_control.permissions import PermissionManager
+from .benchmarks import (
+    BENCHMARK_VIEWS, find_regression, load_baselines, run_benchmarks,
+    save_baselines, write_report
+)
+from .loadgen import generate_dataset
+
+User = get_user_model()
+
+
+@unittest.skipUnless(
+    getattr(settings, 'PERFORMANCE_BENCHMARKS_ENABLED', False),
+    'Set PERFORMANCE_BENCHMARKS=True to run the performance regression suite'
+)
+# A private cache, so clearing it between runs cannot flush the shared Redis
+# database (which also holds the Celery broker queues)
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'performance-benchmarks',
+    }
+})
+class ViewPerformanceRegressionTests(TestCase):
+    """
+    Drive the heavy dashboards and list views against a seeded dataset and
+    fail when query counts or wall time regress past the stored baselines.
+    Writes a JSON report to PERFORMANCE_BENCHMARK_REPORT.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.scale = getattr(settings, 'PERFORMANCE_BENCHMARK_SCALE', 1)
+        generate_dataset(cls.scale, seed=getattr(settings, 'PERFORMANCE_BENCHMARK_SEED', 42))
+
+        role, _ = Role.objects.get_or_create(
+            name='ADMINISTRATOR',
+            defaults={'display_name': 'Administrator', 'template_folder': 'administrator'}
+        )
+        for view in BENCHMARK_VIEWS:
+            module, _ = Module.objects.get_or_create(
+                name=view.module,
+                defaults={'display_name': view.module.replace('_', ' ').title(), 'url_name': view.url_name}
+            )
+            ModulePermission.objects.get_or_create(
+                module=module, role=role,
+                defaults={'can_access': True, 'can_modify': True, 'can_delete': True}
+            )
+        cls.user = User.objects.create_user(
+            email='benchmark.admin@example.com', password='benchmark', role=role, is_staff=True
+        )
+
+    def setUp(self):
+        cache.clear()
+        PermissionManager.invalidate()
+        self.client.force_login(self.user)
+
+    def test_views_within_baselines(self):
+        results = run_benchmarks(
+            self.client, repeat=getattr(settings, 'PERFORMANCE_BENCHMARK_REPEAT', 5)
+        )
+
+        if getattr(settings, 'PERFORMANCE_BENCHMARK_UPDATE_BASELINES', False):
+            save_baselines(results, self.scale)
+        baselines = load_baselines()
+        write_report(settings.PERFORMANCE_BENCHMARK_REPORT, results, baselines, self.scale)
+
+        if baselines.get('scale') != self.scale:
+            self.skipTest(f"Baselines were recorded at scale {baselines.get('scale')}, not {self.scale}")
+
+        for name, result in results.items():
+            with self.subTest(view=name):
+                regression = find_regression(result, baselines['views'].get(name))
+                self.assertIsNone(regression, f"{name} regressed: {regression}")
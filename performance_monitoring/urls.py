@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('', views.performance_dashboard, name='performance_dashboard'),
+    path('metrics/', views.metrics, name='performance_metrics'),
+]
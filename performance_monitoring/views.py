@@ -0,0 +1,59 @@
+import hmac
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, HttpResponseForbidden
+from django.shortcuts import render
+
+from .metrics import registry, render_prometheus
+from .middleware import get_query_budget
+
+
+def has_metrics_access(request):
+    token = getattr(settings, 'PERFORMANCE_METRICS_TOKEN', None)
+    if token:
+        auth_header = request.headers.get('Authorization', '')
+        return hmac.compare_digest(auth_header, f'Bearer {token}')
+    return request.user.is_authenticated and request.user.is_staff
+
+
+def metrics(request):
+    """Prometheus scrape endpoint"""
+    if not has_metrics_access(request):
+        return HttpResponseForbidden('Forbidden')
+    views, _ = registry.snapshot()
+    return HttpResponse(render_prometheus(views), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@staff_member_required
+def performance_dashboard(request):
+    views, duplicates = registry.snapshot()
+
+    rows = []
+    for view_name, values in views.items():
+        requests = values['requests'] or 1
+        rows.append({
+            'view_name': view_name,
+            'requests': int(values['requests']),
+            'avg_response_ms': values['response_seconds'] / requests * 1000,
+            'avg_queries': values['db_queries'] / requests,
+            'avg_sql_ms': values['db_seconds'] / requests * 1000,
+            'duplicate_queries': int(values['duplicate_queries']),
+            'cache_hits': int(values['cache_hits']),
+            'cache_misses': int(values['cache_misses']),
+            'budget': get_query_budget(view_name),
+            'budget_exceeded': int(values['budget_exceeded']),
+            'top_duplicates': duplicates.get(view_name, []),
+        })
+
+    sort = request.GET.get('sort', 'avg_queries')
+    if sort not in ('requests', 'avg_response_ms', 'avg_queries', 'avg_sql_ms', 'duplicate_queries', 'budget_exceeded'):
+        sort = 'avg_queries'
+    rows.sort(key=lambda row: row[sort], reverse=True)
+
+    context = {
+        'title': 'View Performance',
+        'rows': rows,
+        'sort': sort,
+    }
+    return render(request, 'performance_monitoring/dashboard.html', context)
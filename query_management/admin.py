@@ -2,9 +2,28 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
-from .models import Query, QueryUpdate, QueryTag, QueryAttachment
+from .models import (
+    EmailMailboxState, Query, QueryUpdate, QueryTag, QueryAttachment, QueryNotification, StaffWorkload
+)
 
 admin.site.register(Query)
 admin.site.register(QueryTag)
 admin.site.register(QueryAttachment)
-admin.site.register(QueryUpdate)
\ No newline at end of file
+admin.site.register(QueryUpdate)
+admin.site.register(EmailMailboxState)
+
+
+@admin.register(StaffWorkload)
+class StaffWorkloadAdmin(admin.ModelAdmin):
+    list_display = ('user', 'open_query_count', 'last_assigned_at', 'is_eligible', 'accepting_queries')
+    list_filter = ('is_eligible', 'accepting_queries')
+    list_editable = ('accepting_queries',)
+    readonly_fields = ('open_query_count', 'last_assigned_at', 'is_eligible')
+    filter_horizontal = ('skills',)
+
+
+@admin.register(QueryNotification)
+class QueryNotificationAdmin(admin.ModelAdmin):
+    list_display = ('query', 'recipient', 'notification_type', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'notification_type')
+    raw_id_fields = ('query', 'recipient')
@@ -0,0 +1,141 @@
+"""
+Workload-aware query assignment.
+
+StaffWorkload holds one row per staff member with the number of open
+queries assigned to them. A new query goes to the eligible member with the
+fewest open queries (ties to whoever was assigned longest ago), found with
+one lookup on the workload index and set before the query is inserted.
+Saves and deletes of Query move the counters through `apply_query_change`;
+`reconcile` recounts them from the Query table and refreshes eligibility,
+repairing drift from bulk writes that bypass signals.
+
+The counters live in the database rather than in the Redis cache (which
+holds e.g. the permission matrix version) so they change in the same
+transaction as the query: a rolled-back save cannot leave a count behind,
+and the pick can filter by eligibility and skills and lock its row.
+"""
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Query, StaffWorkload
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+STAFF_ROLES = ['NURSE', 'DOCTOR', 'MEDICAL_ASSISTANT', 'ADMINISTRATOR']
+OPEN_STATUSES = ['NEW', 'IN_PROGRESS', 'WAITING']
+
+
+def eligible_users():
+    """Staff who can be assigned queries: active, with a staff role and an email address"""
+    return User.objects.filter(
+        role__name__in=STAFF_ROLES, is_active=True
+    ).exclude(Q(email='') | Q(email__isnull=True))
+
+
+def is_eligible(user):
+    role = getattr(user, 'role', None)
+    return bool(user.is_active and user.email and role is not None and role.name in STAFF_ROLES)
+
+
+def pick_staff(tags=None):
+    """
+    Reserve the least-loaded eligible staff member for a new open query and
+    return their user id, or None when nobody is available. With `tags`
+    (tag names), members having one of them as a skill are preferred.
+    The member's open count is incremented here; pass the id as `reserved`
+    to apply_query_change once the query is saved so it is not counted twice.
+    """
+    user_id = _reserve(tags)
+    if user_id is None and not StaffWorkload.objects.exists():
+        # Staff created by bulk inserts (load datasets, imports) have no
+        # workload rows until the nightly reconcile; build them now
+        reconcile()
+        user_id = _reserve(tags)
+    return user_id
+
+
+def _reserve(tags):
+    candidates = StaffWorkload.objects.filter(is_eligible=True, accepting_queries=True).order_by(
+        'open_query_count', F('last_assigned_at').asc(nulls_first=True), 'user_id'
+    )
+    pools = [candidates.filter(skills__name__in=tags), candidates] if tags else [candidates]
+
+    with transaction.atomic():
+        for pool in pools:
+            # Concurrent assignments skip rows another transaction is reserving
+            workload = pool.select_for_update(skip_locked=True, of=('self',)).only('id', 'user_id').first()
+            if workload is not None:
+                StaffWorkload.objects.filter(id=workload.id).update(
+                    open_query_count=F('open_query_count') + 1, last_assigned_at=timezone.now()
+                )
+                return workload.user_id
+    return None
+
+
+def _open_assignee(status, assigned_to_id):
+    return assigned_to_id if status in OPEN_STATUSES else None
+
+
+def _adjust(user_id, delta):
+    StaffWorkload.objects.filter(user_id=user_id).update(open_query_count=F('open_query_count') + delta)
+
+
+def apply_query_change(query, previous=None, deleted=False, reserved=None):
+    """
+    Move a query's open count from the staff member it was open for in its
+    `previous` state (see rollups.previous_state) to its current one.
+    `reserved` is a user id pick_staff already counted this query for.
+    """
+    before = _open_assignee(previous['status'], previous['assigned_to_id']) if previous else None
+    after = None if deleted else _open_assignee(query.status, query.assigned_to_id)
+
+    if reserved is not None and reserved != after:
+        # Reserved for a query that ended up closed or with someone else
+        _adjust(reserved, -1)
+    if before == after:
+        return
+    if before is not None:
+        _adjust(before, -1)
+    if after is not None and after != reserved:
+        _adjust(after, 1)
+
+
+def sync_user(user):
+    """Create or update the workload row of `user` after a change to their account"""
+    eligible = is_eligible(user)
+    if eligible:
+        StaffWorkload.objects.update_or_create(user=user, defaults={'is_eligible': True})
+    else:
+        StaffWorkload.objects.filter(user=user).update(is_eligible=False)
+
+
+@transaction.atomic
+def reconcile():
+    """
+    Refresh eligibility and recount every open count from the Query table.
+    Returns the number of rows corrected.
+    """
+    eligible = set(eligible_users().values_list('id', flat=True))
+    existing = set(StaffWorkload.objects.values_list('user_id', flat=True))
+    StaffWorkload.objects.bulk_create([StaffWorkload(user_id=user_id) for user_id in eligible - existing])
+    StaffWorkload.objects.filter(user_id__in=eligible).exclude(is_eligible=True).update(is_eligible=True)
+    StaffWorkload.objects.exclude(user_id__in=eligible).exclude(is_eligible=False).update(is_eligible=False)
+
+    counts = dict(
+        Query.objects.filter(status__in=OPEN_STATUSES, assigned_to__isnull=False)
+        .values('assigned_to').annotate(total=Count('query_id')).values_list('assigned_to', 'total')
+    )
+    stale = []
+    for workload in StaffWorkload.objects.only('id', 'user_id', 'open_query_count'):
+        if workload.open_query_count != counts.get(workload.user_id, 0):
+            workload.open_query_count = counts.get(workload.user_id, 0)
+            stale.append(workload)
+    StaffWorkload.objects.bulk_update(stale, ['open_query_count'], batch_size=1000)
+    logger.info(f"Reconciled staff workload: {len(eligible - existing)} added, {len(stale)} recounted")
+    return len(stale)
@@ -0,0 +1,276 @@
+"""
+Query event notifications, delivered outside the request.
+
+send_query_notification records the in-app notification and a pending
+QueryNotification row, then schedules the send_query_notifications task
+once the transaction commits. Events arriving within
+QUERY_NOTIFICATION_BATCH_DELAY seconds share one task run, which renders
+the emails and sends them over a single SMTP connection. Failed emails are
+retried with exponential backoff; a periodic sweep picks up retries and
+rows whose scheduling message was lost.
+"""
+import logging
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from notifications.models import EmailNotification, NotificationType, UserNotification
+
+from .models import QueryNotification
+
+logger = logging.getLogger('query_management')
+
+# Errors meaning the SMTP connection itself is unusable rather than one message rejected
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+# Set while a send_query_notifications run is scheduled, so a burst of events shares one run
+SCHEDULED_KEY = 'query_notifications:scheduled'
+
+NOTIFICATION_TYPE_NAMES = {
+    'created': 'QUERY_CREATED',
+    'assigned': 'QUERY_ASSIGNED',
+    'status_updated': 'QUERY_STATUS_UPDATED',
+    'resolved': 'QUERY_RESOLVED',
+}
+
+# NotificationType ids by name, resolved once per process
+_notification_type_ids = {}
+
+
+def notification_type_id(notification_type):
+    name = NOTIFICATION_TYPE_NAMES.get(notification_type, 'QUERY_STATUS_UPDATED')
+    if name not in _notification_type_ids:
+        notification_type_obj, created = NotificationType.objects.get_or_create(
+            name=name,
+            defaults={'description': f'Notification for {notification_type} query event'}
+        )
+        if created:
+            logger.info(f"Created new NotificationType: {name}")
+        _notification_type_ids[name] = notification_type_obj.id
+    return _notification_type_ids[name]
+
+
+def in_app_message(query, notification_type):
+    messages = {
+        'created': f'New query #{query.query_id} has been created: {query.subject}',
+        'assigned': f'Query #{query.query_id} has been assigned to you',
+        'status_updated': f'Status updated for query #{query.query_id}: {query.status}',
+        'resolved': f'Query #{query.query_id} has been resolved',
+    }
+    return messages.get(notification_type, '')
+
+
+def email_subject(query, notification_type):
+    subjects = {
+        'created': f'New Query Created - #{query.query_id}',
+        'assigned': f'Query Assigned - #{query.query_id}',
+        'status_updated': f'Query Status Updated - #{query.query_id}',
+        'resolved': f'Query Resolved - #{query.query_id}',
+    }
+    return subjects.get(notification_type, '')
+
+
+def serialize_context(context):
+    """Template context as JSON values; model instances and other objects are stored as text"""
+    serialized = {}
+    for key, value in context.items():
+        if value is None or isinstance(value, (str, int, float, bool)):
+            serialized[key] = value
+        else:
+            serialized[key] = str(value)
+    return serialized
+
+
+def enqueue(query, notification_type, recipient, context=None):
+    """Record a query event for `recipient`; the email is sent by the worker"""
+    UserNotification.objects.create(
+        user=recipient,
+        notification_type_id=notification_type_id(notification_type),
+        message=in_app_message(query, notification_type)
+    )
+    if not recipient.email:
+        logger.warning(f"Recipient {recipient.pk} of query #{query.query_id} has no email address")
+        return None
+
+    # Attachments are collected when the email is rendered
+    context = {key: value for key, value in (context or {}).items() if key != 'attachments'}
+    notification = QueryNotification.objects.create(
+        query=query,
+        recipient=recipient,
+        notification_type=notification_type,
+        context=serialize_context(context)
+    )
+    transaction.on_commit(schedule_delivery)
+    return notification
+
+
+def schedule_delivery():
+    """Schedule a send run unless one is already waiting"""
+    delay = getattr(settings, 'QUERY_NOTIFICATION_BATCH_DELAY', 5)
+    try:
+        if not cache.add(SCHEDULED_KEY, 1, timeout=delay + 60):
+            return
+    except Exception as e:
+        logger.error(f"Error checking scheduled query notifications: {str(e)}")
+    try:
+        from .tasks import send_query_notifications
+        send_query_notifications.apply_async(countdown=delay)
+    except Exception as e:
+        # The periodic sweep sends the pending rows later
+        logger.error(f"Error scheduling query notifications: {str(e)}")
+        cache.delete(SCHEDULED_KEY)
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt after `attempts` failed ones"""
+    base = getattr(settings, 'QUERY_NOTIFICATION_RETRY_DELAY', 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+@transaction.atomic
+def claim_batch(limit):
+    """
+    Take up to `limit` due notifications for this worker. Claimed rows are
+    pushed out of the due window for a lease period, so concurrent workers
+    skip them and a crashed worker's rows come back on their own.
+    """
+    now = timezone.now()
+    ids = list(
+        QueryNotification.objects.select_for_update(skip_locked=True)
+        .filter(status='PENDING', next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    lease = getattr(settings, 'QUERY_NOTIFICATION_LEASE', 600)
+    QueryNotification.objects.filter(id__in=ids).update(next_attempt_at=now + timedelta(seconds=lease))
+    return list(
+        QueryNotification.objects.filter(id__in=ids)
+        .select_related('query', 'query__assigned_to', 'query__assigned_to__role', 'recipient')
+        .order_by('id')
+    )
+
+
+def render(notification, connection):
+    query = notification.query
+    attachments = list(query.attachments.filter(uploaded_at__lte=notification.created_at))
+    html_message = render_to_string(f'query_{notification.notification_type}_email.html', {
+        'query': query,
+        'recipient': notification.recipient,
+        'attachments': attachments,
+        **notification.context
+    })
+    email = EmailMessage(
+        subject=email_subject(query, notification.notification_type),
+        body=html_message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[notification.recipient.email],
+        connection=connection
+    )
+    email.content_subtype = "html"
+    for attachment in attachments:
+        try:
+            email.attach_file(attachment.file.path)
+        except Exception as e:
+            logger.error(f"Failed to attach file {attachment.file.name}: {str(e)}")
+    return email
+
+
+def release(notifications, error):
+    """Put claimed notifications back for a later attempt, failing those out of attempts"""
+    max_attempts = getattr(settings, 'QUERY_NOTIFICATION_MAX_ATTEMPTS', 5)
+    now = timezone.now()
+    for notification in notifications:
+        notification.attempts += 1
+        notification.last_error = str(error)
+        if notification.attempts >= max_attempts:
+            notification.status = 'FAILED'
+            EmailNotification.objects.create(
+                user=notification.recipient,
+                subject=email_subject(notification.query, notification.notification_type),
+                message=f"Error sending email: {str(error)}",
+                status='FAILED',
+                sent_at=now
+            )
+        else:
+            notification.next_attempt_at = now + retry_delay(notification.attempts)
+    QueryNotification.objects.bulk_update(
+        notifications, ['attempts', 'last_error', 'status', 'next_attempt_at']
+    )
+
+
+def send_batch(notifications):
+    """
+    Render and send `notifications` over one SMTP connection. A message that
+    cannot be rendered or is rejected is retried on its own; a connection
+    failure puts the whole batch back and is raised.
+    """
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Error connecting to {settings.EMAIL_HOST}:{settings.EMAIL_PORT}: {str(e)}")
+        release(notifications, e)
+        raise
+
+    sent, failed = [], []
+    try:
+        for index, notification in enumerate(notifications):
+            try:
+                email = render(notification, connection)
+            except Exception as e:
+                logger.error(f"Error rendering notification {notification.id}: {str(e)}")
+                failed.append((notification, e))
+                continue
+            try:
+                email.send(fail_silently=False)
+            except Exception as e:
+                logger.error(f"Error sending notification {notification.id} to {notification.recipient.email}: {str(e)}")
+                failed.append((notification, e))
+                if isinstance(e, CONNECTION_ERRORS):
+                    # The connection is gone; the rest of the batch waits for the retry
+                    release(notifications[index + 1:], e)
+                    raise
+                continue
+            notification.status = 'SENT'
+            notification.sent_at = timezone.now()
+            notification.last_error = ''
+            sent.append((notification, email.body))
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+        if sent:
+            QueryNotification.objects.bulk_update([n for n, body in sent], ['status', 'sent_at', 'last_error'])
+            EmailNotification.objects.bulk_create([
+                EmailNotification(
+                    user=notification.recipient,
+                    subject=email_subject(notification.query, notification.notification_type),
+                    message=body,
+                    status='SENT',
+                    sent_at=notification.sent_at
+                )
+                for notification, body in sent
+            ])
+        for notification, error in failed:
+            release([notification], error)
+    return len(sent)
+
+
+def deliver_pending(batch_size=None):
+    """Send every due notification, a batch at a time. Returns the number sent."""
+    batch_size = batch_size or getattr(settings, 'QUERY_NOTIFICATION_BATCH_SIZE', 50)
+    total = 0
+    while True:
+        notifications = claim_batch(batch_size)
+        if not notifications:
+            return total
+        total += send_batch(notifications)
+        if len(notifications) < batch_size:
+            return total
@@ -0,0 +1,440 @@
+"""
+Incremental ingestion of query emails from an IMAP folder.
+
+The folder's UIDVALIDITY and the highest UID seen are kept per mailbox in
+EmailMailboxState, so each poll asks the server only for messages added
+since the last one. New messages are read in windows: headers first, then
+full bodies for unread messages whose subject carries QUERY_SUBJECT_MARKER
+and whose Message-ID has no query yet. Each window's queries are created in
+one transaction before the cursor moves past it. Query emails that could
+not be imported are remembered with the cursor and fetched again on the
+next polls, up to QUERY_EMAIL_MAX_ATTEMPTS times.
+
+Everything takes a logged-in imaplib connection, so a local IMAP server
+(plain IMAP4 on a test port) can stand in for the real mailbox.
+"""
+import email
+import imaplib
+import logging
+import random
+import re
+import string
+from email.header import decode_header, make_header
+from email.utils import parseaddr
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from access_control.models import Role
+
+from . import assignment, rollups, search
+from .models import EmailMailboxState, Query, QueryTag
+from .utils import send_query_notification
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+QUERY_SUBJECT_MARKER = '[VITIGO-QUERY]'
+HEADER_ITEMS = '(UID FLAGS BODY.PEEK[HEADER.FIELDS (SUBJECT FROM DATE MESSAGE-ID)])'
+BODY_ITEMS = '(UID BODY.PEEK[])'
+
+UID_RE = re.compile(rb'UID (\d+)')
+
+
+class UserManager:
+    @staticmethod
+    def generate_random_password(length=12):
+        """Generate a secure random password"""
+        characters = string.ascii_letters + string.digits + string.punctuation
+        while True:
+            password = ''.join(random.choice(characters) for i in range(length))
+            # Check if password contains at least one of each required type
+            if (any(c.islower() for c in password)
+                and any(c.isupper() for c in password)
+                and any(c.isdigit() for c in password)
+                and any(c in string.punctuation for c in password)):
+                return password
+
+    @staticmethod
+    def extract_user_info(email_body):
+        """Extract user information from email body"""
+        info = {
+            'email': None,
+            'phone_number': None,
+            'first_name': None,
+            'last_name': None,
+            'country_code': '+91'  # Default country code
+        }
+
+        try:
+            # Extract phone number using regex
+            phone_matches = re.findall(r'(?:Contact|Phone|Mobile):\s*([+\d\s-]+)', email_body, re.IGNORECASE)
+            if phone_matches:
+                phone = re.sub(r'[^\d+]', '', phone_matches[0])
+                if phone.startswith('+91'):
+                    info['country_code'] = '+91'
+                    info['phone_number'] = phone[3:]
+                else:
+                    info['phone_number'] = phone
+
+            # Extract name if provided
+            name_matches = re.findall(r'Name:\s*([^\n]+)', email_body, re.IGNORECASE)
+            if name_matches:
+                full_name = name_matches[0].strip().split(' ', 1)
+                info['first_name'] = full_name[0]
+                info['last_name'] = full_name[1] if len(full_name) > 1 else ''
+
+        except Exception as e:
+            logger.error(f"Error extracting user info: {str(e)}")
+
+        return info
+
+    @staticmethod
+    def get_or_create_user(email, phone_number=None, first_name=None, last_name=None, country_code='+91'):
+        """Get existing user or create new one"""
+        try:
+            # Try to find user by email
+            user = User.objects.filter(email=email).first()
+            if user:
+                logger.info(f"Found existing user with email: {email}")
+                return user, False
+
+            # Try to find user by phone number if provided
+            if phone_number:
+                user = User.objects.filter(phone_number=phone_number).first()
+                if user:
+                    logger.info(f"Found existing user with phone: {phone_number}")
+                    return user, False
+
+            # Get the patient role
+            patient_role = Role.objects.get(name='PATIENT')
+
+            # Create new user
+            with transaction.atomic():
+                # Generate a secure random password
+                password = UserManager.generate_random_password()
+                user = User.objects.create_user(
+                    email=email,
+                    password=password,  # Use our generated password
+                    first_name=first_name or email.split('@')[0],
+                    last_name=last_name or '',
+                    phone_number=phone_number or '',
+                    country_code=country_code,
+                    role=patient_role
+                )
+                logger.info(f"Created new user with email: {email}")
+                return user, True
+
+        except Exception as e:
+            logger.error(f"Error in get_or_create_user: {str(e)}")
+            raise
+
+
+def determine_priority(subject, body):
+    """Determine query priority based on content"""
+    subject_lower = subject.lower()
+    body_lower = body.lower()
+
+    # High priority keywords
+    if any(word in subject_lower or word in body_lower for word in
+           ['urgent', 'emergency', 'immediate', 'critical']):
+        return 'A'
+
+    # Low priority keywords
+    if any(word in subject_lower or word in body_lower for word in
+           ['feedback', 'suggestion', 'general', 'inquiry']):
+        return 'C'
+
+    # Default to medium priority
+    return 'B'
+
+
+def determine_query_type(subject, body):
+    """Determine query type based on content"""
+    content = (subject + ' ' + body).lower()
+
+    if any(word in content for word in ['appointment', 'schedule', 'booking']):
+        return 'APPOINTMENT'
+    elif any(word in content for word in ['treatment', 'medicine', 'prescription']):
+        return 'TREATMENT'
+    elif any(word in content for word in ['bill', 'payment', 'cost', 'price']):
+        return 'BILLING'
+    elif any(word in content for word in ['complaint', 'issue', 'problem']):
+        return 'COMPLAINT'
+    elif any(word in content for word in ['feedback', 'suggestion']):
+        return 'FEEDBACK'
+
+    return 'GENERAL'
+
+
+def connect(host=None, port=None, use_ssl=None, user=None, password=None):
+    """Logged-in IMAP connection, from the QUERY_EMAIL_IMAP_* settings by default"""
+    host = host or getattr(settings, 'QUERY_EMAIL_IMAP_HOST', 'imap.gmail.com')
+    default_ssl = getattr(settings, 'QUERY_EMAIL_IMAP_SSL', True)
+    use_ssl = default_ssl if use_ssl is None else use_ssl
+    if not port:
+        # The configured port belongs to the configured protocol
+        port = getattr(settings, 'QUERY_EMAIL_IMAP_PORT', None) if use_ssl == default_ssl else None
+        port = port or (993 if use_ssl else 143)
+    logger.info(f"Connecting to {host}:{port}")
+    imap = (imaplib.IMAP4_SSL if use_ssl else imaplib.IMAP4)(host, port)
+    imap.login(user or settings.EMAIL_HOST_USER, password or settings.EMAIL_HOST_PASSWORD)
+    return imap
+
+
+def mailbox_name(user, host, folder):
+    return f'{user}@{host}/{folder}'
+
+
+def _check(response, action):
+    status, data = response
+    if status != 'OK':
+        raise imaplib.IMAP4.error(f"{action} failed: {data}")
+    return data
+
+
+def _uid_set(uids):
+    return ','.join(str(uid) for uid in uids)
+
+
+def _response_number(imap, code):
+    value = imap.response(code)[1]
+    return int(value[0]) if value and value[0] is not None else None
+
+
+def select_folder(imap, folder):
+    """Select `folder` for reading and flagging; returns its (UIDVALIDITY, UIDNEXT)"""
+    _check(imap.select(folder), f"SELECT {folder}")
+    uidvalidity = _response_number(imap, 'UIDVALIDITY')
+    if uidvalidity is None:
+        raise imaplib.IMAP4.error(f"{folder} did not report a UIDVALIDITY")
+    return uidvalidity, _response_number(imap, 'UIDNEXT')
+
+
+def new_uids(imap, state, uidvalidity):
+    """
+    UIDs added to the selected folder since `state`. When the folder is new to
+    us or was recreated (UIDVALIDITY changed) earlier UIDs mean nothing, so
+    today's messages are read instead; their Message-IDs keep them from
+    creating queries twice.
+    """
+    if state.uidvalidity == uidvalidity:
+        data = _check(imap.uid('SEARCH', f'UID {state.last_uid + 1}:*'), "UID SEARCH")
+        # "n:*" always matches the newest message, even when it is below n
+        return sorted(uid for uid in map(int, data[0].split()) if uid > state.last_uid)
+
+    if state.uidvalidity is not None:
+        logger.warning(f"UIDVALIDITY of {state.mailbox} changed, rescanning today's messages")
+    since = timezone.localdate().strftime('%d-%b-%Y')
+    data = _check(imap.uid('SEARCH', f'SINCE {since}'), "UID SEARCH")
+    return sorted(map(int, data[0].split()))
+
+
+def fetch(imap, uids, items):
+    """{uid: (flags, payload)} for `uids`"""
+    if not uids:
+        return {}
+    data = _check(imap.uid('FETCH', _uid_set(uids), items), "UID FETCH")
+    messages, uid = {}, None
+    for part in data:
+        if isinstance(part, tuple):
+            match = UID_RE.search(part[0])
+            if not match:
+                uid = None
+                continue
+            uid = int(match.group(1))
+            messages[uid] = (imaplib.ParseFlags(part[0]), part[1])
+        elif uid is not None and part and b'FLAGS' in part:
+            # Some servers send FLAGS after the literal
+            messages[uid] = (messages[uid][0] + imaplib.ParseFlags(part), messages[uid][1])
+    return messages
+
+
+def decode_subject(message):
+    try:
+        return str(make_header(decode_header(message['subject'] or '')))
+    except Exception:
+        return message['subject'] or ''
+
+
+def get_email_body(message):
+    """Plain text body of a message"""
+    try:
+        parts = message.walk() if message.is_multipart() else [message]
+        for part in parts:
+            if part.get_content_type() == 'text/plain':
+                payload = part.get_payload(decode=True) or b''
+                return payload.decode(part.get_content_charset() or 'utf-8', errors='replace')
+        return ''
+    except Exception as e:
+        logger.error(f"Error extracting email body: {str(e)}")
+        return ""
+
+
+def find_candidates(headers, mailbox, uidvalidity):
+    """
+    {uid: (Message-ID, subject)} of the unread query emails among `headers`
+    that have no query yet. Messages without a Message-ID get one from their UID.
+    """
+    candidates = {}
+    for uid, (flags, header) in headers.items():
+        if b'\\Seen' in flags:
+            continue
+        message = email.message_from_bytes(header or b'')
+        subject = decode_subject(message)
+        if QUERY_SUBJECT_MARKER not in subject.upper():
+            continue
+        message_id = (message['message-id'] or '').strip() or f'<{uidvalidity}.{uid}@{mailbox}>'
+        candidates[uid] = (message_id[:255], subject)
+
+    known = set(Query.objects.filter(
+        email_message_id__in=[message_id for message_id, subject in candidates.values()]
+    ).values_list('email_message_id', flat=True))
+    seen_ids = set()
+    for uid in sorted(candidates):
+        message_id = candidates[uid][0]
+        if message_id in known or message_id in seen_ids:
+            logger.info(f"Query already exists for message {message_id}")
+            del candidates[uid]
+        seen_ids.add(message_id)
+    return candidates
+
+
+def build_queries(candidates, bodies):
+    """
+    Unsaved queries for the candidate messages, with the set of those from new
+    patients. Returns ([(uid, query)], {uid of a new patient's query}).
+    """
+    queries, new_patients, users = [], set(), {}
+    for uid in sorted(candidates):
+        if uid not in bodies:
+            logger.error(f"Message {uid} vanished before its body was fetched")
+            continue
+        message_id, subject = candidates[uid]
+        try:
+            message = email.message_from_bytes(bodies[uid][1])
+            sender = parseaddr(message['from'] or '')[1]
+            body = get_email_body(message)
+
+            user_info = UserManager.extract_user_info(body)
+            user_info['email'] = sender
+            if sender.lower() not in users:
+                users[sender.lower()] = UserManager.get_or_create_user(**user_info)
+            user, is_new_user = users[sender.lower()]
+
+            clean_subject = subject.split(']', 1)[1].strip()
+            query = Query(
+                user=user,
+                subject=clean_subject[:255],
+                description=body,
+                source='EMAIL',
+                contact_email=sender,
+                contact_phone=user_info['phone_number'],
+                status='NEW',
+                is_anonymous=False,
+                query_type=determine_query_type(clean_subject, body),
+                priority=determine_priority(clean_subject, body),
+                is_patient=True,
+                email_message_id=message_id,
+            )
+        except Exception as e:
+            logger.error(f"Error processing message {uid} ({message_id}): {str(e)}")
+            continue
+        queries.append((uid, query))
+        if is_new_user:
+            new_patients.add(uid)
+    return queries, new_patients
+
+
+def create_queries(queries, new_patients):
+    """
+    Bulk-create `queries`, doing what the Query save signals would: staff
+    assignment, rollups, the search index and the assignment notification
+    """
+    with transaction.atomic():
+        for uid, query in queries:
+            query.assigned_to_id = assignment.pick_staff()
+        Query.objects.bulk_create([query for uid, query in queries])
+
+        if new_patients:
+            tag, _ = QueryTag.objects.get_or_create(name='New Patient')
+            Query.tags.through.objects.bulk_create([
+                Query.tags.through(query_id=query.pk, querytag_id=tag.id)
+                for uid, query in queries if uid in new_patients
+            ])
+        for uid, query in queries:
+            rollups.apply_query_change(query)
+        search.index_queries([query.pk for uid, query in queries])
+
+    staff = User.objects.in_bulk({query.assigned_to_id for uid, query in queries if query.assigned_to_id})
+    for uid, query in queries:
+        if query.assigned_to_id:
+            try:
+                send_query_notification(query, 'assigned', recipient=staff[query.assigned_to_id])
+            except Exception as e:
+                logger.error(f"Error notifying assignment of query {query.query_id}: {str(e)}")
+
+
+def ingest(imap, folder='INBOX', mailbox=None, batch_size=None):
+    """
+    Create queries from the messages added to `folder` since the last run and
+    mark them read, retrying the query emails earlier runs failed to import.
+    Returns counts of the messages scanned, the queries created and the
+    query emails that could not be imported.
+    """
+    batch_size = batch_size or getattr(settings, 'QUERY_EMAIL_FETCH_BATCH', 200)
+    max_attempts = getattr(settings, 'QUERY_EMAIL_MAX_ATTEMPTS', 5)
+    mailbox = mailbox or folder
+    uidvalidity, uidnext = select_folder(imap, folder)
+    state, _ = EmailMailboxState.objects.get_or_create(mailbox=mailbox)
+    rescan = state.uidvalidity != uidvalidity
+    # UIDs from an earlier UIDVALIDITY name other messages now
+    last_uid = 0 if rescan else state.last_uid
+    failed = {} if rescan else {int(uid): attempts for uid, attempts in state.failed_uids.items()}
+    uids = new_uids(imap, state, uidvalidity)
+    logger.info(f"{len(uids)} new messages in {mailbox}, {len(failed)} to retry")
+    uids = sorted(set(uids) | set(failed))
+
+    summary = {'scanned': 0, 'created': 0, 'failed': 0}
+    for start in range(0, len(uids), batch_size):
+        window = uids[start:start + batch_size]
+        headers = fetch(imap, window, HEADER_ITEMS)
+        candidates = find_candidates(headers, mailbox, uidvalidity)
+        bodies = fetch(imap, sorted(candidates), BODY_ITEMS)
+        queries, new_patients = build_queries(candidates, bodies)
+        if queries:
+            create_queries(queries, new_patients)
+            _check(imap.uid('STORE', _uid_set(uid for uid, query in queries), '+FLAGS', '(\\Seen)'), "UID STORE")
+            for uid, query in queries:
+                logger.info(f"Created query {query.query_id} from message {query.email_message_id}")
+
+        # Failed query emails stay unread and are fetched again by the next polls.
+        # Retries that are read, deleted or imported by now are dropped.
+        created = {uid for uid, query in queries}
+        for uid in window:
+            if uid in candidates and uid not in created:
+                failed[uid] = failed.get(uid, 0) + 1
+                if failed[uid] >= max_attempts:
+                    logger.error(f"Giving up on message {uid} in {mailbox} after {failed.pop(uid)} attempts")
+            else:
+                failed.pop(uid, None)
+
+        last_uid = max(last_uid, window[-1])
+        _save_state(state, uidvalidity, last_uid, failed)
+        summary['scanned'] += len(window)
+        summary['created'] += len(queries)
+        summary['failed'] += len(candidates) - len(queries)
+
+    # Everything below UIDNEXT at selection time has been looked at
+    _save_state(state, uidvalidity, max(last_uid, uidnext - 1) if uidnext else last_uid, failed)
+    return summary
+
+
+def _save_state(state, uidvalidity, last_uid, failed):
+    state.uidvalidity = uidvalidity
+    state.last_uid = last_uid
+    state.failed_uids = {str(uid): attempts for uid, attempts in sorted(failed.items())}
+    state.last_checked_at = timezone.now()
+    state.save()
@@ -0,0 +1,29 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from query_management import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily query rollups from the raw Query rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Only rebuild the last N days (default: full history)'
+        )
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days is not None and days < 1:
+            raise CommandError('--days must be at least 1')
+
+        start_day = timezone.localdate() - timedelta(days=days) if days else None
+        start = time.monotonic()
+        written = rollups.reconcile(start_day=start_day)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} rollup rows in {time.monotonic() - start:.1f}s"
+        ))
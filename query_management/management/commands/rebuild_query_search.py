@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from query_management import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of queries from the Query, QueryUpdate and tag rows'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stdout.write(self.style.WARNING("This database has no full-text index; search uses substring matching"))
+            return
+
+        start = time.monotonic()
+        indexed = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} queries in {time.monotonic() - start:.1f}s"
+        ))
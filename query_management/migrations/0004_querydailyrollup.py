@@ -0,0 +1,43 @@
+# Generated by Django 4.2.9 on 2026-10-17 03:58
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('query_management', '0003_remove_report_category_remove_reportexport_report_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('source', models.CharField(choices=[('WEBSITE', 'Website'), ('CHATBOT', 'Chatbot'), ('SOCIAL_MEDIA', 'Social Media'), ('PHONE', 'Phone Call'), ('IVR', 'Interactive Voice Response'), ('EMAIL', 'Email'), ('WALK_IN', 'Walk-in'), ('MOBILE_APP', 'Mobile App')], max_length=20)),
+                ('priority', models.CharField(choices=[('A', 'High'), ('B', 'Medium'), ('C', 'Low')], max_length=1)),
+                ('status', models.CharField(choices=[('NEW', 'New'), ('IN_PROGRESS', 'In Progress'), ('WAITING', 'Waiting for Response'), ('RESOLVED', 'Resolved'), ('CLOSED', 'Closed')], max_length=20)),
+                ('query_type', models.CharField(blank=True, choices=[('GENERAL', 'General Inquiry'), ('APPOINTMENT', 'Appointment Related'), ('TREATMENT', 'Treatment Related'), ('BILLING', 'Billing Related'), ('COMPLAINT', 'Complaint'), ('FEEDBACK', 'Feedback'), ('OTHER', 'Other')], max_length=20, null=True)),
+                ('is_anonymous', models.BooleanField(default=False)),
+                ('query_count', models.IntegerField(default=0)),
+                ('resolved_count', models.IntegerField(default=0)),
+                ('resolution_time_total', models.DurationField(default=datetime.timedelta)),
+                ('response_count', models.IntegerField(default=0)),
+                ('response_time_total', models.DurationField(default=datetime.timedelta)),
+                ('satisfaction_count', models.IntegerField(default=0)),
+                ('satisfaction_total', models.IntegerField(default=0)),
+                ('conversion_known_count', models.IntegerField(default=0)),
+                ('converted_count', models.IntegerField(default=0)),
+                ('update_count', models.IntegerField(default=0)),
+                ('assigned_to', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'status'], name='query_rollup_day_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.9 on 2026-10-17 04:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q
+
+STAFF_ROLES = ['NURSE', 'DOCTOR', 'MEDICAL_ASSISTANT', 'ADMINISTRATOR']
+OPEN_STATUSES = ['NEW', 'IN_PROGRESS', 'WAITING']
+
+
+def create_workloads(apps, schema_editor):
+    """Start every eligible staff member off with their current open query count"""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Query = apps.get_model('query_management', 'Query')
+    StaffWorkload = apps.get_model('query_management', 'StaffWorkload')
+
+    staff = User.objects.filter(role__name__in=STAFF_ROLES, is_active=True).exclude(
+        Q(email='') | Q(email__isnull=True)
+    ).values_list('id', flat=True)
+    counts = dict(
+        Query.objects.filter(status__in=OPEN_STATUSES, assigned_to__isnull=False)
+        .values('assigned_to').annotate(total=Count('query_id')).values_list('assigned_to', 'total')
+    )
+    StaffWorkload.objects.bulk_create([
+        StaffWorkload(user_id=user_id, open_query_count=counts.get(user_id, 0)) for user_id in staff
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('query_management', '0004_querydailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaffWorkload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('open_query_count', models.IntegerField(default=0)),
+                ('last_assigned_at', models.DateTimeField(blank=True, null=True)),
+                ('is_eligible', models.BooleanField(default=True)),
+                ('accepting_queries', models.BooleanField(default=True, help_text='Uncheck to stop automatic assignment (leave, training)')),
+                ('skills', models.ManyToManyField(blank=True, help_text='Tags this staff member is preferred for', related_name='skilled_staff', to='query_management.querytag')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='query_workload', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['is_eligible', 'accepting_queries', 'open_query_count', 'last_assigned_at'], name='staff_workload_pick_idx')],
+            },
+        ),
+        migrations.RunPython(create_workloads, migrations.RunPython.noop),
+    ]
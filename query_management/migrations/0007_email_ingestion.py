@@ -0,0 +1,28 @@
+# Generated by Django 4.2.9 on 2026-10-17 04:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('query_management', '0006_querynotification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailMailboxState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mailbox', models.CharField(help_text='user@host/folder', max_length=255, unique=True)),
+                ('uidvalidity', models.BigIntegerField(blank=True, null=True)),
+                ('last_uid', models.BigIntegerField(default=0)),
+                ('last_checked_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='query',
+            name='email_message_id',
+            field=models.CharField(blank=True, help_text='Message-ID header of the email the query was created from', max_length=255, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,67 @@
+from django.db import migrations
+
+# Document columns of the search index, in order
+COLUMNS = ['subject', 'tags', 'contact', 'description', 'updates']
+WEIGHTS = {'subject': 'A', 'tags': 'B', 'contact': 'B', 'description': 'C', 'updates': 'D'}
+
+
+def documents_sql(aggregate):
+    return f"""
+        SELECT q.query_id,
+               COALESCE(q.subject, ''),
+               COALESCE((SELECT {aggregate.format('t.name')} FROM query_management_query_tags qt
+                         JOIN query_management_querytag t ON t.id = qt.querytag_id
+                         WHERE qt.query_id = q.query_id), ''),
+               COALESCE(p.first_name, '') || ' ' || COALESCE(p.last_name, '') || ' ' || COALESCE(p.email, '') || ' ' ||
+               COALESCE(q.contact_email, '') || ' ' || COALESCE(q.contact_phone, ''),
+               COALESCE(q.description, ''),
+               COALESCE((SELECT {aggregate.format('u.content')} FROM query_management_queryupdate u
+                         WHERE u.query_id = q.query_id), '')
+        FROM query_management_query q
+        LEFT JOIN user_management_customuser p ON p.id = q.user_id
+    """
+
+
+def create_search_index(apps, schema_editor):
+    """Create and fill the full-text index of queries on databases that have one"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE query_search USING fts5({', '.join(COLUMNS)}, "
+            f"tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        documents = documents_sql("group_concat({}, ' ')")
+        schema_editor.execute(f"INSERT INTO query_search (rowid, {', '.join(COLUMNS)}) {documents}")
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE query_search ("
+            "query_id integer PRIMARY KEY REFERENCES query_management_query (query_id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute("CREATE INDEX query_search_document_idx ON query_search USING GIN (document)")
+        vector = ' || '.join(
+            f"setweight(to_tsvector('english', d.{name}), '{WEIGHTS[name]}')" for name in COLUMNS
+        )
+        documents = documents_sql("string_agg({}, ' ')")
+        schema_editor.execute(
+            f"INSERT INTO query_search (query_id, document) SELECT d.query_id, {vector} "
+            f"FROM ({documents}) AS d (query_id, {', '.join(COLUMNS)})"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS query_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('query_management', '0007_email_ingestion'),
+        ('user_management', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-17 05:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('query_management', '0008_query_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailmailboxstate',
+            name='failed_uids',
+            field=models.JSONField(blank=True, default=dict, help_text='Failed attempts by UID of query emails at or below last_uid to import again'),
+        ),
+    ]
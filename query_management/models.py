@@ -2,8 +2,10 @@ from django.db import models
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from django.template.defaultfilters import register
 import os
+from datetime import timedelta
 
 User = get_user_model()
 
@@ -68,6 +70,10 @@ class Query(models.Model):
     resolution_summary = models.TextField(null=True, blank=True)
     response_time = models.DurationField(null=True, blank=True)
     satisfaction_rating = models.IntegerField(null=True, blank=True, choices=[(i, i) for i in range(1, 6)])
+    email_message_id = models.CharField(
+        max_length=255, null=True, blank=True, unique=True,
+        help_text="Message-ID header of the email the query was created from"
+    )
 
     class Meta:
         ordering = ['-created_at']
@@ -107,3 +113,120 @@ class QueryAttachment(models.Model):
         return f"Attachment for Query {self.query.query_id}"
     
 
+
+
+class QueryDailyRollup(models.Model):
+    """
+    Additive daily totals of queries per (local creation day, source, priority,
+    status, type, assigned staff, anonymity). Kept current by the signals in
+    query_management.signals and rebuilt nightly by reconcile_query_rollups.
+    A dimension combination may span several rows; readers always sum.
+    """
+    day = models.DateField()
+    source = models.CharField(max_length=20, choices=Query.SOURCE_CHOICES)
+    priority = models.CharField(max_length=1, choices=Query.PRIORITY_CHOICES)
+    status = models.CharField(max_length=20, choices=Query.STATUS_CHOICES)
+    query_type = models.CharField(max_length=20, choices=Query.QUERY_TYPE_CHOICES, null=True, blank=True)
+    assigned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    is_anonymous = models.BooleanField(default=False)
+
+    query_count = models.IntegerField(default=0)
+    resolved_count = models.IntegerField(default=0)
+    resolution_time_total = models.DurationField(default=timedelta)
+    response_count = models.IntegerField(default=0)
+    response_time_total = models.DurationField(default=timedelta)
+    satisfaction_count = models.IntegerField(default=0)
+    satisfaction_total = models.IntegerField(default=0)
+    conversion_known_count = models.IntegerField(default=0)
+    converted_count = models.IntegerField(default=0)
+    update_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['day', 'status'], name='query_rollup_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"Query rollup {self.day} ({self.query_count})"
+
+
+class StaffWorkload(models.Model):
+    """
+    Live open-query count per staff member, used to assign new queries to
+    the least-loaded eligible member. Kept current by the signals in
+    query_management.signals and recounted nightly by reconcile_staff_workload.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='query_workload')
+    open_query_count = models.IntegerField(default=0)
+    last_assigned_at = models.DateTimeField(null=True, blank=True)
+    # Active staff with an email address; maintained from the user record
+    is_eligible = models.BooleanField(default=True)
+    accepting_queries = models.BooleanField(
+        default=True, help_text="Uncheck to stop automatic assignment (leave, training)"
+    )
+    skills = models.ManyToManyField(
+        QueryTag, blank=True, related_name='skilled_staff',
+        help_text="Tags this staff member is preferred for"
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['is_eligible', 'accepting_queries', 'open_query_count', 'last_assigned_at'],
+                name='staff_workload_pick_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} ({self.open_query_count} open)"
+
+
+class QueryNotification(models.Model):
+    """
+    Outbox of query event emails. Requests only record the event; the
+    send_query_notifications task renders and sends pending rows in batches
+    over one SMTP connection, retrying failures with backoff.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    ]
+
+    query = models.ForeignKey(Query, on_delete=models.CASCADE, related_name='notifications')
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='query_notifications')
+    notification_type = models.CharField(max_length=20)
+    # Extra template context (old_status, update_content, resolver, ...)
+    context = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='query_notification_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.notification_type} notification for query {self.query_id} ({self.status})"
+
+
+class EmailMailboxState(models.Model):
+    """
+    Position of the query email ingestion in an IMAP folder: messages with a
+    UID above `last_uid` are new, as long as the folder's UIDVALIDITY is unchanged
+    """
+    mailbox = models.CharField(max_length=255, unique=True, help_text="user@host/folder")
+    uidvalidity = models.BigIntegerField(null=True, blank=True)
+    last_uid = models.BigIntegerField(default=0)
+    failed_uids = models.JSONField(
+        default=dict, blank=True,
+        help_text="Failed attempts by UID of query emails at or below last_uid to import again"
+    )
+    last_checked_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.mailbox} (UID {self.last_uid})"
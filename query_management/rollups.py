@@ -0,0 +1,227 @@
+"""
+Daily query rollups.
+
+QueryDailyRollup holds additive totals per local creation day and dimension.
+Saves and deletes of Query/QueryUpdate apply their delta through
+`apply_query_change` / `apply_update_change`; `reconcile` rebuilds days from
+the raw rows to repair drift from bulk writes that bypass signals.
+"""
+import logging
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import (
+    Count,
+    DurationField,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Query, QueryDailyRollup, QueryUpdate
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ['source', 'priority', 'status', 'query_type', 'assigned_to_id', 'is_anonymous']
+MEASURES = [
+    'query_count', 'resolved_count', 'resolution_time_total', 'response_count',
+    'response_time_total', 'satisfaction_count', 'satisfaction_total',
+    'conversion_known_count', 'converted_count', 'update_count',
+]
+DURATION_MEASURES = ['resolution_time_total', 'response_time_total']
+
+# Query fields a rollup row depends on; a save touching none of them is a no-op
+TRACKED_FIELDS = [
+    'created_at', 'source', 'priority', 'status', 'query_type', 'assigned_to_id',
+    'is_anonymous', 'resolved_at', 'response_time', 'satisfaction_rating', 'conversion_status',
+]
+
+BULK_CREATE_BATCH_SIZE = 1000
+
+
+def _aggregates():
+    """Per-group measures over Query rows, mirroring `query_measures`"""
+    update_counts = QueryUpdate.objects.filter(
+        query=OuterRef('pk')
+    ).order_by().values('query').annotate(total=Count('id')).values('total')
+    zero = Value(timedelta(0), output_field=DurationField())
+    return {
+        'query_count': Count('query_id'),
+        'resolved_count': Count('resolved_at'),
+        'resolution_time_total': Coalesce(Sum(ExpressionWrapper(
+            F('resolved_at') - F('created_at'), output_field=DurationField()
+        )), zero),
+        'response_count': Count('response_time'),
+        'response_time_total': Coalesce(Sum('response_time'), zero),
+        'satisfaction_count': Count('satisfaction_rating'),
+        'satisfaction_total': Coalesce(Sum('satisfaction_rating'), 0),
+        'conversion_known_count': Count('query_id', filter=Q(conversion_status__isnull=False)),
+        'converted_count': Count('query_id', filter=Q(conversion_status=True)),
+        'update_count': Coalesce(Sum(Coalesce(
+            Subquery(update_counts, output_field=IntegerField()), 0
+        )), 0),
+    }
+
+
+def aggregate_queries(queryset):
+    """Rollup-shaped rows (day, dimensions, measures) computed from raw Query rows"""
+    return queryset.order_by().annotate(
+        day=TruncDate('created_at')
+    ).values('day', *DIMENSIONS).annotate(**_aggregates())
+
+
+def query_key(values):
+    """Rollup dimensions of a query, from an instance or a values() dict"""
+    get = values.get if isinstance(values, dict) else lambda name: getattr(values, name)
+    key = {name: get(name) for name in DIMENSIONS}
+    key['day'] = timezone.localdate(get('created_at'))
+    return key
+
+
+def query_measures(values, update_count=0):
+    """Contribution of a single query to its rollup row"""
+    get = values.get if isinstance(values, dict) else lambda name: getattr(values, name)
+    resolved_at = get('resolved_at')
+    response_time = get('response_time')
+    satisfaction = get('satisfaction_rating')
+    conversion = get('conversion_status')
+    return {
+        'query_count': 1,
+        'resolved_count': int(resolved_at is not None),
+        'resolution_time_total': resolved_at - get('created_at') if resolved_at else timedelta(0),
+        'response_count': int(response_time is not None),
+        'response_time_total': response_time or timedelta(0),
+        'satisfaction_count': int(satisfaction is not None),
+        'satisfaction_total': satisfaction or 0,
+        'conversion_known_count': int(conversion is not None),
+        'converted_count': int(conversion is True),
+        'update_count': update_count,
+    }
+
+
+def _apply(key, measures, sign):
+    """Add (sign=1) or remove (sign=-1) `measures` on the rollup row for `key`"""
+    measures = {name: value for name, value in measures.items() if value}
+    if not measures:
+        return
+    row_id = QueryDailyRollup.objects.filter(**key).values_list('id', flat=True).first()
+    if row_id is None:
+        if sign < 0:
+            # Nothing to subtract from; the nightly reconciliation restores it
+            logger.warning(f"Missing query rollup row for {key}")
+            return
+        QueryDailyRollup.objects.create(**key, **measures)
+        return
+    QueryDailyRollup.objects.filter(id=row_id).update(**{
+        name: F(name) + value if sign > 0 else F(name) - value
+        for name, value in measures.items()
+    })
+
+
+def previous_state(query):
+    """Tracked field values of `query` as currently stored, or None if unsaved"""
+    if query.pk is None:
+        return None
+    return Query.objects.filter(pk=query.pk).values(*TRACKED_FIELDS).first()
+
+
+def apply_query_change(query, previous=None, deleted=False):
+    """Move a query's contribution from its `previous` state to its current one"""
+    current = None if deleted else {name: getattr(query, name) for name in TRACKED_FIELDS}
+    if previous == current:
+        return
+
+    update_count = 0
+    if previous and current and query_key(previous) != query_key(current):
+        # The query's updates move with it to the new rollup row
+        update_count = QueryUpdate.objects.filter(query_id=query.pk).count()
+
+    with transaction.atomic():
+        if previous:
+            _apply(query_key(previous), query_measures(previous, update_count), -1)
+        if current:
+            _apply(query_key(current), query_measures(current, update_count), 1)
+
+
+def apply_update_change(update, sign):
+    """Count (sign=1) or uncount (sign=-1) a QueryUpdate on its query's rollup row"""
+    values = Query.objects.filter(pk=update.query_id).values(*TRACKED_FIELDS).first()
+    if values is None:
+        # The query itself is being deleted; its row is removed with it
+        return
+    with transaction.atomic():
+        _apply(query_key(values), {'update_count': 1}, sign)
+
+
+def day_bounds(day):
+    """Aware [start, end) datetimes of a local calendar day"""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(day, time.min), tz)
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def full_days(start_date, end_date):
+    """
+    First and last local day lying entirely inside [start_date, end_date];
+    first > last when the range covers no complete day
+    """
+    first = timezone.localdate(start_date)
+    if day_bounds(first)[0] < start_date:
+        first += timedelta(days=1)
+    last = timezone.localdate(end_date) - timedelta(days=1)
+    return first, last
+
+
+def period_rows(start_date, end_date, **filters):
+    """
+    Rollup rows for queries created in [start_date, end_date]: complete days
+    come from QueryDailyRollup and the partial days at either edge are
+    aggregated from the raw Query rows, so totals match a scan of Query.
+    `filters` are applied to the dimensions.
+    """
+    first, last = full_days(start_date, end_date)
+    if first > last:
+        return list(aggregate_queries(Query.objects.filter(created_at__range=(start_date, end_date), **filters)))
+
+    rows = list(QueryDailyRollup.objects.filter(day__range=(first, last), **filters).values('day', *DIMENSIONS, *MEASURES))
+    edges = Q(created_at__gte=start_date, created_at__lt=day_bounds(first)[0]) | Q(
+        created_at__gte=day_bounds(last)[1], created_at__lte=end_date
+    )
+    rows.extend(aggregate_queries(Query.objects.filter(edges, **filters)))
+    return rows
+
+
+@transaction.atomic
+def reconcile(start_day=None, end_day=None):
+    """
+    Rebuild rollup rows for days in [start_day, end_day] (all days when
+    omitted) from the raw Query rows. Returns the number of rows written.
+    """
+    rollups = QueryDailyRollup.objects.all()
+    queries = Query.objects.all()
+    if start_day:
+        rollups = rollups.filter(day__gte=start_day)
+        queries = queries.filter(created_at__gte=day_bounds(start_day)[0])
+    if end_day:
+        rollups = rollups.filter(day__lte=end_day)
+        queries = queries.filter(created_at__lt=day_bounds(end_day)[1])
+
+    rollups.delete()
+    rows = (QueryDailyRollup(**row) for row in aggregate_queries(queries).iterator())
+    written = 0
+    while True:
+        batch = [row for _, row in zip(range(BULK_CREATE_BATCH_SIZE), rows)]
+        if not batch:
+            break
+        QueryDailyRollup.objects.bulk_create(batch)
+        written += len(batch)
+    logger.info(f"Reconciled query rollups for {start_day or 'start'} - {end_day or 'today'}: {written} rows")
+    return written
@@ -0,0 +1,271 @@
+"""
+Full-text search over queries.
+
+Each query has one document in the `query_search` index, built from its
+subject, tag names, description, update contents and contact details
+(patient name, email, phone). On SQLite the index is an FTS5 table keyed by
+query_id; on PostgreSQL a table of weighted tsvectors with a GIN index.
+The signals in query_management.signals refresh a query's document when
+any of its parts is saved; writes that bypass signals call index_queries
+or run rebuild_query_search.
+
+Other databases have no index and fall back to substring matching.
+"""
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Case, Q, When
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+from .models import Query, QueryTag, QueryUpdate
+
+User = get_user_model()
+
+TABLE = 'query_search'
+
+# Document columns, in index order, with their FTS5 bm25 weight and tsvector weight class
+COLUMNS = [
+    ('subject', 10.0, 'A'),
+    ('tags', 5.0, 'B'),
+    ('contact', 3.0, 'B'),
+    ('description', 2.0, 'C'),
+    ('updates', 1.0, 'D'),
+]
+
+# Highlight delimiters, swapped for <mark> tags once the text is escaped
+MARK_START, MARK_END = '\ue000', '\ue001'
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def is_available():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def _config():
+    return getattr(settings, 'QUERY_SEARCH_CONFIG', 'english')
+
+
+def _chunks(ids, size=500):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _documents_sql():
+    """SELECT of (query_id, *document columns) for every query; a WHERE on q may follow"""
+    if connection.vendor == 'sqlite':
+        aggregate = "group_concat({}, ' ')"
+    else:
+        aggregate = "string_agg({}, ' ')"
+    tags = Query.tags.through._meta.db_table
+    return f"""
+        SELECT q.query_id,
+               COALESCE(q.subject, ''),
+               COALESCE((SELECT {aggregate.format('t.name')} FROM {tags} qt
+                         JOIN {QueryTag._meta.db_table} t ON t.id = qt.querytag_id
+                         WHERE qt.query_id = q.query_id), ''),
+               COALESCE(p.first_name, '') || ' ' || COALESCE(p.last_name, '') || ' ' || COALESCE(p.email, '') || ' ' ||
+               COALESCE(q.contact_email, '') || ' ' || COALESCE(q.contact_phone, ''),
+               COALESCE(q.description, ''),
+               COALESCE((SELECT {aggregate.format('u.content')} FROM {QueryUpdate._meta.db_table} u
+                         WHERE u.query_id = q.query_id), '')
+        FROM {Query._meta.db_table} q
+        LEFT JOIN {User._meta.db_table} p ON p.id = q.user_id
+    """
+
+
+def _write(cursor, where, params):
+    """Replace the documents of the queries selected by `where`"""
+    documents = f"{_documents_sql()} WHERE {where}"
+    names = [name for name, bm25_weight, tsvector_weight in COLUMNS]
+    if connection.vendor == 'sqlite':
+        cursor.execute(
+            f"INSERT INTO {TABLE} (rowid, {', '.join(names)}) {documents}", params
+        )
+    else:
+        vector = ' || '.join(
+            f"setweight(to_tsvector(%s::regconfig, d.{name}), '{weight}')"
+            for name, bm25_weight, weight in COLUMNS
+        )
+        cursor.execute(
+            f"INSERT INTO {TABLE} (query_id, document) "
+            f"SELECT d.query_id, {vector} FROM ({documents}) AS d (query_id, {', '.join(names)}) "
+            f"ON CONFLICT (query_id) DO UPDATE SET document = EXCLUDED.document",
+            [_config()] * len(COLUMNS) + list(params)
+        )
+
+
+def remove_queries(query_ids):
+    if not is_available():
+        return
+    key = 'rowid' if connection.vendor == 'sqlite' else 'query_id'
+    with connection.cursor() as cursor:
+        for chunk in _chunks(query_ids):
+            cursor.execute(f"DELETE FROM {TABLE} WHERE {key} IN ({_placeholders(chunk)})", chunk)
+
+
+def index_queries(query_ids):
+    """Rebuild the search documents of `query_ids` from their current rows"""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(query_ids):
+            if connection.vendor == 'sqlite':
+                # FTS5 tables have no upsert
+                cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({_placeholders(chunk)})", chunk)
+            _write(cursor, f"q.query_id IN ({_placeholders(chunk)})", chunk)
+
+
+def index_tag(tag_id):
+    """Rebuild the documents of the queries carrying a (renamed) tag"""
+    query_ids = Query.tags.through.objects.filter(querytag_id=tag_id).values_list('query_id', flat=True)
+    index_queries(list(query_ids))
+
+
+def rebuild(batch_size=5000):
+    """Rebuild the whole index. Returns the number of queries indexed."""
+    if not is_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        last_id, total = 0, 0
+        while True:
+            ids = list(
+                Query.objects.filter(query_id__gt=last_id).order_by('query_id')
+                .values_list('query_id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            _write(cursor, "q.query_id >= %s AND q.query_id <= %s", [ids[0], ids[-1]])
+            last_id, total = ids[-1], total + len(ids)
+        if connection.vendor == 'sqlite':
+            cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return total
+
+
+def _terms(text):
+    """
+    Search terms of `text`. While typing, the last word is unfinished, so
+    it matches as a prefix unless the text ends with a space.
+    """
+    tokens = TOKEN_RE.findall(text)
+    return tokens, bool(tokens) and not text[-1:].isspace()
+
+
+def _match(text):
+    """Backend search expression matching every term of `text`, or None"""
+    tokens, prefix = _terms(text)
+    if not tokens:
+        return None
+    if connection.vendor == 'sqlite':
+        terms = [f'"{token}"' for token in tokens]
+        if prefix:
+            terms[-1] += '*'
+    else:
+        terms = list(tokens)
+        if prefix:
+            terms[-1] += ':*'
+    return ' '.join(terms) if connection.vendor == 'sqlite' else ' & '.join(terms)
+
+
+def _html(text):
+    return escape(text).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def highlight(query_ids, text):
+    """
+    {query_id: {'subject': html, 'snippet': html}} with the terms of `text`
+    marked in each query's subject and in a passage of its description
+    """
+    match = _match(text)
+    if match is None or not query_ids:
+        return {}
+    query_ids = list(query_ids)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f"SELECT rowid, highlight({TABLE}, 0, %s, %s), snippet({TABLE}, 3, %s, %s, '…', 24) "
+                f"FROM {TABLE} WHERE {TABLE} MATCH %s AND rowid IN ({_placeholders(query_ids)})",
+                [MARK_START, MARK_END, MARK_START, MARK_END, match] + query_ids
+            )
+        else:
+            options = f'StartSel={MARK_START}, StopSel={MARK_END}'
+            cursor.execute(
+                f"SELECT q.query_id, ts_headline(%s::regconfig, q.subject, tsq, %s), "
+                f"ts_headline(%s::regconfig, q.description, tsq, %s) "
+                f"FROM {Query._meta.db_table} q, to_tsquery(%s::regconfig, %s) tsq "
+                f"WHERE q.query_id IN ({_placeholders(query_ids)})",
+                [_config(), f'{options}, HighlightAll=true', _config(),
+                 f'{options}, MaxFragments=2, MaxWords=24, MinWords=8', _config(), match] + query_ids
+            )
+        return {
+            query_id: {'subject': _html(subject), 'snippet': _html(snippet)}
+            for query_id, subject, snippet in cursor.fetchall()
+        }
+
+
+def _matches_sql(match):
+    """(SQL, params) selecting the ids of the queries matching `match`"""
+    if connection.vendor == 'sqlite':
+        return f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s", [match]
+    return f"SELECT query_id FROM {TABLE} WHERE document @@ to_tsquery(%s::regconfig, %s)", [_config(), match]
+
+
+def filter_queryset(queryset, text):
+    """
+    Queries of `queryset` matching `text`, in the queryset's order. The match
+    runs inside the database query, so other filters apply to every match.
+    A number also finds the query with that id.
+    """
+    text = text.strip()
+    if not is_available():
+        return queryset.filter(Q(subject__icontains=text) | Q(description__icontains=text))
+
+    match = _match(text)
+    condition = Q(query_id__in=RawSQL(*_matches_sql(match))) if match else Q(pk__in=[])
+    if text.isdigit():
+        condition |= Q(query_id=int(text))
+    return queryset.filter(condition)
+
+
+def ranked(queryset, text):
+    """
+    Queries of `queryset` matching `text`, best matches first. The index is
+    joined rather than looked up per row, so ranking stays cheap for broad
+    searches. A number finds the query with that id first, then the newest matches.
+    """
+    text = text.strip()
+    match = _match(text)
+    if not is_available() or text.isdigit() or match is None:
+        queryset = filter_queryset(queryset, text)
+        if text.isdigit():
+            queryset = queryset.order_by(Case(When(query_id=int(text), then=0), default=1), '-created_at')
+        return queryset
+
+    column = f'{Query._meta.db_table}.query_id'
+    if connection.vendor == 'sqlite':
+        weights = ', '.join(str(bm25_weight) for name, bm25_weight, weight in COLUMNS)
+        return queryset.extra(
+            tables=[TABLE],
+            where=[f"{TABLE}.rowid = {column}", f"{TABLE} MATCH %s"],
+            params=[match],
+            # bm25() is lower for better matches
+            select={'search_rank': f"-bm25({TABLE}, {weights})"},
+            order_by=['-search_rank'],
+        )
+    return queryset.extra(
+        tables=[TABLE],
+        where=[f"{TABLE}.query_id = {column}", f"{TABLE}.document @@ to_tsquery(%s::regconfig, %s)"],
+        params=[_config(), match],
+        select={'search_rank': f"ts_rank_cd({TABLE}.document, to_tsquery(%s::regconfig, %s))"},
+        select_params=[_config(), match],
+        order_by=['-search_rank'],
+    )
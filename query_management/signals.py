@@ -1,35 +1,151 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from django.db.models import Q
-import random
-from .models import Query
+import logging
+from .models import Query, QueryTag, QueryUpdate
+from . import assignment, rollups, search
+
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
-def get_random_staff():
-    """Get a random staff member with appropriate roles"""
-    staff_roles = ['NURSE', 'DOCTOR', 'MEDICAL_ASSISTANT', 'ADMINISTRATOR'] 
-    staff_users = User.objects.filter(
-        Q(role__name__in=staff_roles) & 
-        Q(is_active=True)
-    ).exclude(
-        Q(email='') | Q(email__isnull=True)
-    )
-    
-    if staff_users.exists():
-        return random.choice(staff_users)
-    return None
+# remember_rollup_state runs first: the workload and rollup receivers both
+# move a query's contribution from its stored state to its saved one
+
+@receiver(pre_save, sender=Query)
+def remember_rollup_state(sender, instance, **kwargs):
+    """Keep the stored state of a query so its rollup delta can be applied after saving"""
+    instance._rollup_previous = rollups.previous_state(instance)
+
+@receiver(pre_save, sender=Query)
+def assign_least_loaded_staff(sender, instance, **kwargs):
+    """
+    Assign a new query to the least-loaded staff member as part of its
+    insert. Callers knowing the query's tags up front can set
+    `instance.routing_tags` (tag names) to prefer staff with those skills.
+    """
+    if instance._state.adding and instance.assigned_to_id is None and instance.status in assignment.OPEN_STATUSES:
+        try:
+            user_id = assignment.pick_staff(getattr(instance, 'routing_tags', None))
+        except Exception as e:
+            logger.error(f"Error assigning new query: {str(e)}")
+            return
+        if user_id:
+            instance.assigned_to_id = user_id
+            instance._workload_reserved = user_id
+
+@receiver(post_save, sender=Query)
+def update_staff_workload(sender, instance, created, **kwargs):
+    reserved = instance.__dict__.pop('_workload_reserved', None)
+    try:
+        assignment.apply_query_change(instance, instance.__dict__.get('_rollup_previous'), reserved=reserved)
+    except Exception as e:
+        logger.error(f"Error updating staff workload for query {instance.pk}: {str(e)}")
+    if created and reserved:
+        # Trigger notification for assignment
+        from .utils import send_query_notification
+        send_query_notification(instance, 'assigned', recipient=instance.assigned_to)
 
 @receiver(post_save, sender=Query)
-def assign_random_staff(sender, instance, created, **kwargs):
-    """Assign newly created queries to random staff members"""
-    if created and not instance.assigned_to:
-        random_staff = get_random_staff()
-        if random_staff:
-            instance.assigned_to = random_staff
-            instance.save(update_fields=['assigned_to'])
-            
-            # Trigger notification for assignment
-            from .utils import send_query_notification
-            send_query_notification(instance, 'assigned', recipient=random_staff)
\ No newline at end of file
+def update_query_rollup(sender, instance, created, **kwargs):
+    try:
+        rollups.apply_query_change(instance, instance.__dict__.pop('_rollup_previous', None))
+    except Exception as e:
+        logger.error(f"Error updating rollup for query {instance.pk}: {str(e)}")
+
+@receiver(post_delete, sender=Query)
+def release_staff_workload(sender, instance, **kwargs):
+    try:
+        previous = {'status': instance.status, 'assigned_to_id': instance.assigned_to_id}
+        assignment.apply_query_change(instance, previous, deleted=True)
+    except Exception as e:
+        logger.error(f"Error updating staff workload for deleted query {instance.pk}: {str(e)}")
+
+@receiver(post_delete, sender=Query)
+def remove_query_rollup(sender, instance, **kwargs):
+    try:
+        previous = {name: getattr(instance, name) for name in rollups.TRACKED_FIELDS}
+        rollups.apply_query_change(instance, previous, deleted=True)
+    except Exception as e:
+        logger.error(f"Error updating rollup for deleted query {instance.pk}: {str(e)}")
+
+@receiver(post_save, sender=QueryUpdate)
+def count_query_update(sender, instance, created, **kwargs):
+    if created:
+        try:
+            rollups.apply_update_change(instance, 1)
+        except Exception as e:
+            logger.error(f"Error updating rollup for query update {instance.pk}: {str(e)}")
+
+@receiver(post_delete, sender=QueryUpdate)
+def uncount_query_update(sender, instance, **kwargs):
+    try:
+        rollups.apply_update_change(instance, -1)
+    except Exception as e:
+        logger.error(f"Error updating rollup for query update {instance.pk}: {str(e)}")
+
+@receiver(post_save, sender=User)
+def sync_staff_workload(sender, instance, created, update_fields=None, **kwargs):
+    """Keep the user's assignment eligibility in step with their role and status"""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    try:
+        if created and not assignment.is_eligible(instance):
+            return
+        assignment.sync_user(instance)
+    except Exception as e:
+        logger.error(f"Error syncing staff workload for user {instance.pk}: {str(e)}")
+
+# Fields of a query that are part of its search document
+SEARCH_FIELDS = {'subject', 'description', 'user', 'contact_email', 'contact_phone'}
+
+@receiver(post_save, sender=Query)
+def index_query(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields and not SEARCH_FIELDS & set(update_fields):
+        return
+    try:
+        search.index_queries([instance.pk])
+    except Exception as e:
+        logger.error(f"Error indexing query {instance.pk} for search: {str(e)}")
+
+@receiver(post_delete, sender=Query)
+def unindex_query(sender, instance, **kwargs):
+    try:
+        search.remove_queries([instance.pk])
+    except Exception as e:
+        logger.error(f"Error removing query {instance.pk} from search: {str(e)}")
+
+@receiver(post_save, sender=QueryUpdate)
+@receiver(post_delete, sender=QueryUpdate)
+def index_query_update(sender, instance, **kwargs):
+    try:
+        search.index_queries([instance.query_id])
+    except Exception as e:
+        logger.error(f"Error indexing query {instance.query_id} for search: {str(e)}")
+
+@receiver(m2m_changed, sender=Query.tags.through)
+def index_query_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # A tag being cleared from its queries; remember which ones
+        instance._search_cleared = list(sender.objects.filter(querytag_id=instance.pk).values_list('query_id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    try:
+        if not reverse:
+            search.index_queries([instance.pk])
+        elif action == 'post_clear':
+            search.index_queries(instance.__dict__.pop('_search_cleared', []))
+        else:
+            search.index_queries(pk_set)
+    except Exception as e:
+        logger.error(f"Error indexing query tags for search: {str(e)}")
+
+@receiver(post_save, sender=QueryTag)
+def index_renamed_tag(sender, instance, created, **kwargs):
+    if created:
+        return
+    try:
+        search.index_tag(instance.pk)
+    except Exception as e:
+        logger.error(f"Error indexing queries tagged {instance.pk} for search: {str(e)}")
@@ -0,0 +1,61 @@
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import assignment, delivery, rollups
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def reconcile_query_rollups(days=None):
+    """
+    Rebuild the daily query rollups from raw Query rows, repairing drift from
+    writes that bypass model signals (bulk inserts, queryset updates).
+    Covers the last `days` days, QUERY_ROLLUP_RECONCILE_DAYS by default;
+    None rebuilds the full history.
+    """
+    days = days if days is not None else getattr(settings, 'QUERY_ROLLUP_RECONCILE_DAYS', None)
+    start_day = timezone.localdate() - timedelta(days=days) if days else None
+    try:
+        return rollups.reconcile(start_day=start_day)
+    except Exception as e:
+        logger.error(f"Error reconciling query rollups: {str(e)}")
+        raise
+
+
+@shared_task
+def reconcile_staff_workload():
+    """
+    Recount open queries per staff member and refresh assignment eligibility,
+    repairing counters skewed by bulk updates that bypass model signals
+    """
+    try:
+        return assignment.reconcile()
+    except Exception as e:
+        logger.error(f"Error reconciling staff workload: {str(e)}")
+        raise
+
+
+@shared_task(bind=True, max_retries=5)
+def send_query_notifications(self):
+    """
+    Send the pending query notification emails in batches over one SMTP
+    connection. Scheduled after query events and swept every minute for
+    retries; an unreachable mail server retries the run with backoff.
+    """
+    # Events recorded from here on schedule a new run
+    cache.delete(delivery.SCHEDULED_KEY)
+    try:
+        return delivery.deliver_pending()
+    except OSError as e:
+        # Mail server unreachable or connection lost (smtplib errors are OSErrors);
+        # messages rejected on their own are retried by the sweep instead
+        raise self.retry(exc=e, countdown=delivery.retry_delay(self.request.retries + 1).total_seconds())
+    except Exception as e:
+        logger.error(f"Error sending query notifications: {str(e)}")
+        raise
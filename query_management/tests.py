@@ -1,3 +1,146 @@
-from django.test import TestCase
+from email.message import EmailMessage
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from access_control.models import Role
+from . import email_ingestion
+from .models import EmailMailboxState, Query
+
+
+class FakeIMAP:
+    """
+    The part of an imaplib connection email_ingestion uses, over an
+    in-memory folder of {uid: (flags, message bytes)}
+    """
+
+    def __init__(self, uidvalidity=1):
+        self.uidvalidity = uidvalidity
+        self.messages = {}
+        self.searches = []
+
+    def add(self, subject, sender='patient@example.com', message_id=None, body='Name: Asha Rao\nPhone: 9876543210'):
+        message = EmailMessage()
+        message['Subject'] = subject
+        message['From'] = sender
+        if message_id:
+            message['Message-ID'] = message_id
+        message.set_content(body)
+        uid = max(self.messages, default=0) + 1
+        self.messages[uid] = (set(), message.as_bytes())
+        return uid
+
+    def recreate(self, uidvalidity):
+        """Renumber the folder, as a server does when it is rebuilt"""
+        self.uidvalidity = uidvalidity
+        self.messages = {uid: (set(), payload) for uid, (flags, payload) in
+                         enumerate((self.messages[uid] for uid in sorted(self.messages)), start=1)}
+
+    def select(self, folder):
+        return 'OK', [str(len(self.messages)).encode()]
+
+    def response(self, code):
+        values = {'UIDVALIDITY': self.uidvalidity, 'UIDNEXT': max(self.messages, default=0) + 1}
+        return code, [str(values[code]).encode()]
+
+    def uid(self, command, *args):
+        if command == 'SEARCH':
+            criteria = args[0]
+            self.searches.append(criteria)
+            uids = sorted(self.messages)
+            if criteria.startswith('UID '):
+                first = int(criteria.split()[1].split(':')[0])
+                # "n:*" matches the newest message even when it is below n
+                uids = [uid for uid in uids if uid >= first] or uids[-1:]
+            return 'OK', [' '.join(map(str, uids)).encode()]
+
+        uids = [int(uid) for uid in args[0].split(',') if int(uid) in self.messages]
+        if command == 'FETCH':
+            data = []
+            for uid in uids:
+                flags, payload = self.messages[uid]
+                if 'HEADER.FIELDS' in args[1]:
+                    payload = payload.split(b'\n\n', 1)[0] + b'\n\n'
+                data.append((f"{uid} (UID {uid} FLAGS ({' '.join(sorted(flags))}) BODY[] {{{len(payload)}}}".encode(), payload))
+                data.append(b')')
+            return 'OK', data
+        if command == 'STORE':
+            for uid in uids:
+                self.messages[uid][0].add('\\Seen')
+            return 'OK', []
+        raise AssertionError(f"Unexpected command {command}")
+
+
+class EmailIngestionTests(TestCase):
+    """Drive ingest() against a fake IMAP folder"""
+
+    def setUp(self):
+        Role.objects.get_or_create(name='PATIENT', defaults={'display_name': 'Patient', 'template_folder': 'patient'})
+        self.imap = FakeIMAP()
+
+    def ingest(self):
+        return email_ingestion.ingest(self.imap, mailbox='test')
+
+    def test_reads_only_messages_after_the_last_uid(self):
+        self.imap.add('[VITIGO-QUERY] Appointment request', message_id='<a@example.com>')
+        self.imap.add('Newsletter')
+        self.assertEqual(self.ingest(), {'scanned': 2, 'created': 1, 'failed': 0})
+        self.assertEqual(EmailMailboxState.objects.get(mailbox='test').last_uid, 2)
+        self.assertIn('\\Seen', self.imap.messages[1][0])
+
+        self.imap.add('[VITIGO-QUERY] Billing question', message_id='<b@example.com>')
+        self.assertEqual(self.ingest(), {'scanned': 1, 'created': 1, 'failed': 0})
+        self.assertEqual(self.imap.searches[-1], 'UID 3:*')
+        self.assertEqual(Query.objects.filter(source='EMAIL').count(), 2)
+
+        self.assertEqual(self.ingest(), {'scanned': 0, 'created': 0, 'failed': 0})
+
+    def test_uidvalidity_change_rescans_without_duplicates(self):
+        self.imap.add('[VITIGO-QUERY] Appointment request', message_id='<a@example.com>')
+        self.ingest()
+
+        self.imap.recreate(uidvalidity=2)
+        self.imap.add('[VITIGO-QUERY] Treatment question', message_id='<b@example.com>')
+        self.assertEqual(self.ingest()['created'], 1)
+        self.assertTrue(self.imap.searches[-1].startswith('SINCE '))
+        self.assertEqual(
+            sorted(Query.objects.values_list('email_message_id', flat=True)),
+            ['<a@example.com>', '<b@example.com>']
+        )
+        state = EmailMailboxState.objects.get(mailbox='test')
+        self.assertEqual((state.uidvalidity, state.last_uid), (2, 2))
+
+    def test_message_id_dedupe(self):
+        self.imap.add('[VITIGO-QUERY] Appointment request', message_id='<a@example.com>')
+        self.imap.add('[VITIGO-QUERY] Appointment request', message_id='<a@example.com>')
+        self.assertEqual(self.ingest()['created'], 1)
+        self.assertEqual(Query.objects.filter(email_message_id='<a@example.com>').count(), 1)
+
+    def test_failed_message_is_retried(self):
+        self.imap.add('[VITIGO-QUERY] Appointment request', message_id='<a@example.com>')
+        self.imap.add('[VITIGO-QUERY] Billing question', sender='other@example.com', message_id='<b@example.com>')
+        get_or_create_user = email_ingestion.UserManager.get_or_create_user
+
+        def fail_first_sender(email, **kwargs):
+            if email == 'patient@example.com':
+                raise RuntimeError('database unavailable')
+            return get_or_create_user(email, **kwargs)
+
+        with mock.patch.object(email_ingestion.UserManager, 'get_or_create_user', side_effect=fail_first_sender):
+            self.assertEqual(self.ingest(), {'scanned': 2, 'created': 1, 'failed': 1})
+        state = EmailMailboxState.objects.get(mailbox='test')
+        self.assertEqual((state.last_uid, state.failed_uids), (2, {'1': 1}))
+
+        self.assertEqual(self.ingest(), {'scanned': 1, 'created': 1, 'failed': 0})
+        self.assertEqual(EmailMailboxState.objects.get(mailbox='test').failed_uids, {})
+        self.assertTrue(Query.objects.filter(email_message_id='<a@example.com>').exists())
+
+    @override_settings(QUERY_EMAIL_MAX_ATTEMPTS=2)
+    def test_failed_message_is_given_up_after_max_attempts(self):
+        self.imap.add('[VITIGO-QUERY] Appointment request', message_id='<a@example.com>')
+        with mock.patch.object(email_ingestion.UserManager, 'get_or_create_user', side_effect=RuntimeError('broken')):
+            self.ingest()
+            self.assertEqual(EmailMailboxState.objects.get(mailbox='test').failed_uids, {'1': 1})
+            self.ingest()
+        self.assertEqual(EmailMailboxState.objects.get(mailbox='test').failed_uids, {})
+        self.assertEqual(self.ingest()['scanned'], 0)
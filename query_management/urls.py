@@ -13,6 +13,8 @@ urlpatterns = [
     # Dashboard/Main Views
     path('', dashboard_views.QueryManagementView.as_view(), 
          name='query_management'),
+    path('search/', dashboard_views.QuerySearchView.as_view(),
+         name='query_search'),
 
     # Query CRUD Operations
     path('create/', query_views.QueryCreateView.as_view(), 
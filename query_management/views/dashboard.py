@@ -20,6 +20,7 @@ from reportlab.platypus import (
 )
 
 # Django core imports
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import (
@@ -37,6 +38,7 @@ from django.db.models import (
     ExpressionWrapper,
     F,
     Q,
+    Sum,
     fields,
 )
 from django.db.models.functions import (
@@ -51,9 +53,10 @@ from django.shortcuts import (
     redirect,
     render,
 )
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
 from django.utils.decorators import method_decorator
+from django.utils.html import escape
 from django.views import View
 from django.views.decorators.http import require_http_methods
 from django.views.generic.edit import CreateView
@@ -73,6 +76,7 @@ from ..forms import QueryCreateForm
 from ..models import (
     Query,
     QueryAttachment,
+    QueryDailyRollup,
     QueryTag,
     QueryUpdate,
 )
@@ -80,6 +84,7 @@ from ..utils import (
     get_template_path,
     send_query_notification,
 )
+from .. import search
 
 # Logger configuration
 logger = logging.getLogger(__name__)
@@ -88,26 +93,36 @@ logger = logging.getLogger(__name__)
 User = get_user_model()
 
 class QueryManagementView(LoginRequiredMixin, View):
-    def get_query_trend_data(self, queryset, days=30):
+    # Charts read the daily rollups unless a free-text search narrows the
+    # queries, which only the raw Query rows can answer.
+
+    def get_query_trend_data(self, queryset, days=30, rollup=None):
         """Calculate query volume trend data"""
         end_date = timezone.now()
         start_date = end_date - timedelta(days=days)
         
-        daily_counts = (queryset
-            .filter(created_at__gte=start_date)
-            .annotate(date=TruncDate('created_at'))
-            .values('date')
-            .annotate(count=Count('query_id'))
-            .order_by('date'))
+        if rollup is not None:
+            daily_counts = (rollup
+                .filter(day__gte=timezone.localdate(start_date))
+                .values('day')
+                .annotate(count=Sum('query_count'))
+                .values_list('day', 'count'))
+        else:
+            daily_counts = (queryset
+                .filter(created_at__gte=start_date)
+                .annotate(date=TruncDate('created_at'))
+                .values('date')
+                .annotate(count=Count('query_id'))
+                .values_list('date', 'count'))
+        daily_counts = dict(daily_counts)
 
         dates = []
         counts = []
         
-        current = start_date.date()
-        while current <= end_date.date():
+        current = timezone.localdate(start_date)
+        while current <= timezone.localdate(end_date):
             dates.append(current.strftime('%Y-%m-%d'))
-            count = next((item['count'] for item in daily_counts if item['date'] == current), 0)
-            counts.append(count)
+            counts.append(daily_counts.get(current, 0))
             current += timedelta(days=1)
 
         return {
@@ -115,12 +130,19 @@ class QueryManagementView(LoginRequiredMixin, View):
             'values': counts
         }
 
-    def get_status_distribution(self, queryset):
+    def get_status_distribution(self, queryset, rollup=None):
         """Calculate query status distribution"""
-        status_counts = (queryset
-            .values('status')
-            .annotate(count=Count('query_id'))
-            .order_by('status'))
+        if rollup is not None:
+            status_counts = (rollup
+                .values('status')
+                .annotate(count=Sum('query_count'))
+                .filter(count__gt=0)
+                .order_by('status'))
+        else:
+            status_counts = (queryset
+                .values('status')
+                .annotate(count=Count('query_id'))
+                .order_by('status'))
 
         status_map = dict(Query.STATUS_CHOICES)
         return {
@@ -128,7 +150,7 @@ class QueryManagementView(LoginRequiredMixin, View):
             'values': [item['count'] for item in status_counts]
         }
 
-    def get_response_time_data(self, queryset, period='day'):
+    def get_response_time_data(self, queryset, period='day', rollup=None):
         """Calculate average response times"""
         if period == 'week':
             trunc_fn = TruncWeek
@@ -137,23 +159,48 @@ class QueryManagementView(LoginRequiredMixin, View):
         else:  # day
             trunc_fn = TruncDate
 
-        data = (queryset
-            .annotate(period=trunc_fn('created_at'))
-            .values('period')
-            .annotate(avg_time=Avg('response_time'))
-            .order_by('period'))
+        if rollup is not None:
+            # Rollup days are already local dates
+            rollup_period = F('day') if trunc_fn is TruncDate else trunc_fn('day')
+            data = (rollup
+                .annotate(period=rollup_period)
+                .values('period')
+                .annotate(
+                    total_time=Sum('response_time_total'),
+                    responses=Sum('response_count'),
+                    queries=Sum('query_count')
+                )
+                .filter(queries__gt=0)
+                .order_by('period'))
+            data = [
+                {'period': item['period'], 'avg_time': item['total_time'] / item['responses'] if item['responses'] else None}
+                for item in data
+            ]
+        else:
+            data = (queryset
+                .annotate(period=trunc_fn('created_at'))
+                .values('period')
+                .annotate(avg_time=Avg('response_time'))
+                .order_by('period'))
         
         return {
             'labels': [item['period'].strftime('%Y-%m-%d') for item in data],
             'values': [float(item['avg_time'].total_seconds()/3600) if item['avg_time'] else 0 for item in data]
         }
 
-    def get_source_distribution(self, queryset):
+    def get_source_distribution(self, queryset, rollup=None):
         """Calculate query source distribution"""
-        source_counts = (queryset
-            .values('source')
-            .annotate(count=Count('query_id'))
-            .order_by('-count'))
+        if rollup is not None:
+            source_counts = (rollup
+                .values('source')
+                .annotate(count=Sum('query_count'))
+                .filter(count__gt=0)
+                .order_by('-count'))
+        else:
+            source_counts = (queryset
+                .values('source')
+                .annotate(count=Count('query_id'))
+                .order_by('-count'))
 
         source_map = dict(Query.SOURCE_CHOICES)
         return {
@@ -161,21 +208,33 @@ class QueryManagementView(LoginRequiredMixin, View):
             'values': [item['count'] for item in source_counts]
         }
 
-    def get_staff_performance(self, queryset, days=30):
+    def get_staff_performance(self, queryset, days=30, rollup=None):
         """Calculate staff performance metrics"""
         end_date = timezone.now()
         start_date = end_date - timedelta(days=days)
         
-        data = (queryset
-            .filter(created_at__gte=start_date)
-            .values('assigned_to__first_name', 'assigned_to__last_name')
-            .annotate(
-                total_queries=Count('query_id'),
-                resolved_queries=Count('query_id', filter=Q(status='RESOLVED')),
-                avg_response_time=Avg('response_time')
-            )
-            .exclude(assigned_to=None)
-            .order_by('-total_queries'))
+        if rollup is not None:
+            data = (rollup
+                .filter(day__gte=timezone.localdate(start_date))
+                .exclude(assigned_to=None)
+                .values('assigned_to__first_name', 'assigned_to__last_name')
+                .annotate(
+                    total_queries=Sum('query_count'),
+                    resolved_queries=Sum('query_count', filter=Q(status='RESOLVED'), default=0)
+                )
+                .filter(total_queries__gt=0)
+                .order_by('-total_queries'))
+        else:
+            data = (queryset
+                .filter(created_at__gte=start_date)
+                .values('assigned_to__first_name', 'assigned_to__last_name')
+                .annotate(
+                    total_queries=Count('query_id'),
+                    resolved_queries=Count('query_id', filter=Q(status='RESOLVED')),
+                    avg_response_time=Avg('response_time')
+                )
+                .exclude(assigned_to=None)
+                .order_by('-total_queries'))
 
         return {
             'labels': [f"{item['assigned_to__first_name']} {item['assigned_to__last_name']}" for item in data],
@@ -183,10 +242,17 @@ class QueryManagementView(LoginRequiredMixin, View):
             'resolved_queries': [item['resolved_queries'] for item in data]
         }
 
-    def get_conversion_metrics(self, queryset):
+    def get_conversion_metrics(self, queryset, rollup=None):
         """Calculate conversion metrics"""
-        total = queryset.count()
-        converted = queryset.filter(conversion_status=True).count()
+        if rollup is not None:
+            totals = rollup.aggregate(
+                total=Sum('query_count', default=0),
+                converted=Sum('converted_count', default=0)
+            )
+            total, converted = totals['total'], totals['converted']
+        else:
+            total = queryset.count()
+            converted = queryset.filter(conversion_status=True).count()
         conversion_rate = (converted / total * 100) if total > 0 else 0
 
         return {
@@ -231,20 +297,15 @@ class QueryManagementView(LoginRequiredMixin, View):
             if source:
                 queryset = queryset.filter(source=source)
             
-            # Apply search
+            # Apply search, best matches first
+            results = queryset
             if search_query:
-                queryset = queryset.filter(
-                    Q(subject__icontains=search_query) |
-                    Q(description__icontains=search_query) |
-                    Q(query_id__icontains=search_query) |
-                    Q(user__first_name__icontains=search_query) |
-                    Q(user__last_name__icontains=search_query) |
-                    Q(contact_email__icontains=search_query) |
-                    Q(contact_phone__icontains=search_query)
-                )
+                results = search.ranked(queryset, search_query)
+                # Charts group the matches; the rank column would split their groups
+                queryset = search.filter_queryset(queryset, search_query)
 
             # Pagination
-            paginator = Paginator(queryset, 10)
+            paginator = Paginator(results, 10)
             page = request.GET.get('page', 1)
             try:
                 queries = paginator.page(page)
@@ -293,16 +354,24 @@ class QueryManagementView(LoginRequiredMixin, View):
             }
 
             # Prepare graph data
+            rollup = None
+            if not search_query:
+                rollup = QueryDailyRollup.objects.filter(**{
+                    field: value
+                    for field, value in [('priority', priority), ('status', status), ('source', source)]
+                    if value
+                })
             context.update({
-                'query_trend_data': self.get_query_trend_data(queryset),
-                'status_distribution': self.get_status_distribution(queryset),
+                'query_trend_data': self.get_query_trend_data(queryset, rollup=rollup),
+                'status_distribution': self.get_status_distribution(queryset, rollup=rollup),
                 'response_time_data': self.get_response_time_data(
                     queryset, 
-                    request.GET.get('response_time_period', 'day')
+                    request.GET.get('response_time_period', 'day'),
+                    rollup=rollup
                 ),
-                'source_distribution': self.get_source_distribution(queryset),
-                'staff_performance': self.get_staff_performance(queryset),
-                'conversion_metrics': self.get_conversion_metrics(queryset),
+                'source_distribution': self.get_source_distribution(queryset, rollup=rollup),
+                'staff_performance': self.get_staff_performance(queryset, rollup=rollup),
+                'conversion_metrics': self.get_conversion_metrics(queryset, rollup=rollup),
                 'periods': [
                     ('7', 'Last 7 Days'),
                     ('30', 'Last 30 Days'),
@@ -323,4 +392,35 @@ class QueryManagementView(LoginRequiredMixin, View):
             
         except Exception as e:
             logger.error(f"Error in QueryManagementView: {str(e)}", exc_info=True)
-            return handler500(request, exception=str(e))
\ No newline at end of file
+            return handler500(request, exception=str(e))
+
+class QuerySearchView(LoginRequiredMixin, View):
+    """Ranked search-as-you-type results with the matched terms highlighted"""
+
+    def get(self, request):
+        if not PermissionManager.check_module_access(request.user, 'query_management'):
+            return JsonResponse({'error': "Access Denied"}, status=403)
+        try:
+            text = request.GET.get('q', '').strip()
+            limit = min(int(request.GET.get('limit', 10)), getattr(settings, 'QUERY_SEARCH_MAX_RESULTS', 50))
+            if not text:
+                return JsonResponse({'results': []})
+
+            matches = list(
+                search.ranked(Query.objects.all(), text)
+                .values('query_id', 'subject', 'status', 'priority')[:limit]
+            )
+            highlights = search.highlight([match['query_id'] for match in matches], text)
+            results = []
+            for match in matches:
+                highlighted = highlights.get(match['query_id'], {})
+                results.append({
+                    **match,
+                    'subject_html': highlighted.get('subject', escape(match['subject'])),
+                    'snippet_html': highlighted.get('snippet', ''),
+                    'url': reverse('query_detail', args=[match['query_id']]),
+                })
+            return JsonResponse({'results': results})
+        except Exception as e:
+            logger.error(f"Error searching queries: {str(e)}")
+            return JsonResponse({'error': str(e)}, status=400)
@@ -1,8 +1,25 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
-from .models import Report, ReportCategory, ReportExport
+from .models import Report, ReportCategory, ReportExport, ReportResult, ReportSubscription
 
 admin.site.register(ReportCategory)
 admin.site.register(Report)
-admin.site.register(ReportExport)
\ No newline at end of file
+admin.site.register(ReportExport)
+admin.site.register(ReportResult)
+
+
+@admin.register(ReportSubscription)
+class ReportSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ('report', 'frequency', 'run_time', 'range_days', 'recipients', 'is_active', 'next_run_at', 'last_run_at')
+    list_filter = ('frequency', 'is_active')
+    list_select_related = ('report',)
+    search_fields = ('report__name', 'recipients')
+    readonly_fields = ('created_by', 'created_at', 'last_run_at', 'next_run_at', 'last_export')
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        # Reschedule from the (possibly edited) frequency and run time
+        obj.next_run_at = obj.compute_next_run() if obj.is_active else None
+        super().save_model(request, obj, form, change)
@@ -2,6 +2,7 @@ from django import forms
 from django.utils import timezone
 from datetime import datetime, timedelta
 from .models import ReportExport
+from .services.formats import DEFAULT_FORMAT, available_formats
 
 class ReportGenerationForm(forms.Form):
     PRESET_RANGES = [
@@ -21,10 +22,21 @@ class ReportGenerationForm(forms.Form):
         })
     )
 
+    export_format = forms.ChoiceField(
+        choices=available_formats,
+        initial=DEFAULT_FORMAT,
+        required=False,
+        widget=forms.Select(attrs={
+            'class': 'bg-gray-50 border border-gray-300 text-gray-900 text-sm rounded-lg focus:ring-blue-500 focus:border-blue-500 block w-full p-2.5'
+        })
+    )
+
     def clean(self):
         cleaned_data = super().clean()
         preset_range = cleaned_data.get('preset_range')
-        end_date = timezone.now()
+        # Periods end at the next full hour, so reports requested within the same
+        # hour cover the same range and can share a cached result
+        end_date = timezone.localtime().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
         
         if preset_range == '7d':
             start_date = end_date - timedelta(days=7)
@@ -41,4 +53,5 @@ class ReportGenerationForm(forms.Form):
         
         cleaned_data['start_date'] = start_date
         cleaned_data['end_date'] = end_date
+        cleaned_data['export_format'] = cleaned_data.get('export_format') or DEFAULT_FORMAT
         return cleaned_data
@@ -86,6 +86,14 @@ class Command(BaseCommand):
                             {'name': 'Time to Resolution by Query Type', 'description': 'Resolution time analysis by query type'},
                             {'name': 'Resolution Satisfaction Correlation', 'description': 'Analysis of resolution quality and satisfaction'}
                         ]
+                    },
+                    'Clinic Analytics Reports': {
+                        'description': 'Cross-module clinic reports from the nightly analytics snapshot',
+                        'reports': [
+                            {'name': 'Phototherapy Plan Revenue Analysis', 'description': 'Revenue per phototherapy plan against sessions, consultations and no-shows'},
+                            {'name': 'Appointment No-show Analysis', 'description': 'No-show rates of appointments and consultations by doctor, center and weekday'},
+                            {'name': 'Monthly Clinic Activity', 'description': 'Monthly appointments, consultations, phototherapy sessions and revenue'}
+                        ]
                     }
                 }
 
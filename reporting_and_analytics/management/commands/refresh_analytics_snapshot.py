@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reporting_and_analytics.services import snapshot
+
+
+class Command(BaseCommand):
+    help = 'Load changes from the clinic modules into the analytics snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Rebuild the snapshot from scratch instead of loading changes only'
+        )
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        stats = snapshot.refresh(full=options['full'])
+        for source, (loaded, deleted) in stats.items():
+            self.stdout.write(f"{source}: {loaded} rows loaded, {deleted} deleted")
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed {snapshot.snapshot_path()} in {time.monotonic() - start:.1f}s"
+        ))
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.9 on 2026-10-17 03:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting_and_analytics', '0004_rename_moule_reportcategory_module'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(max_length=64, unique=True)),
+                ('start_date', models.DateTimeField()),
+                ('end_date', models.DateTimeField()),
+                ('watermark', models.CharField(max_length=255)),
+                ('result_file', models.FileField(upload_to='report_cache/')),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cached_results', to='reporting_and_analytics.report')),
+            ],
+            options={
+                'ordering': ['last_used_at'],
+                'indexes': [models.Index(fields=['report', 'start_date', 'end_date'], name='reportresult_range_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.9 on 2026-10-17 04:04
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reporting_and_analytics', '0005_reportresult'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reportexport',
+            name='status',
+            field=models.CharField(choices=[('SCHEDULED', 'Scheduled'), ('PENDING', 'Pending'), ('IN_PROGRESS', 'In Progress'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ReportSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipients', models.TextField(help_text='Comma-separated email addresses')),
+                ('frequency', models.CharField(choices=[('DAILY', 'Daily'), ('WEEKLY', 'Weekly'), ('MONTHLY', 'Monthly')], default='WEEKLY', max_length=10)),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')], default=0, help_text='Used by weekly subscriptions')),
+                ('day_of_month', models.PositiveSmallIntegerField(default=1, help_text='Used by monthly subscriptions (1-28)')),
+                ('run_time', models.TimeField(default=datetime.time(6, 0))),
+                ('range_days', models.PositiveIntegerField(default=7)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('next_run_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('last_export', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='reporting_and_analytics.reportexport')),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='reporting_and_analytics.report')),
+            ],
+            options={
+                'ordering': ['next_run_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.9 on 2026-10-17 04:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting_and_analytics', '0006_alter_reportexport_status_reportsubscription'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportexport',
+            name='cancel_requested',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='reportexport',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='reportexport',
+            name='stage',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='reportexport',
+            name='status',
+            field=models.CharField(choices=[('SCHEDULED', 'Scheduled'), ('PENDING', 'Pending'), ('IN_PROGRESS', 'In Progress'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed'), ('CANCELLED', 'Cancelled')], default='PENDING', max_length=20),
+        ),
+    ]
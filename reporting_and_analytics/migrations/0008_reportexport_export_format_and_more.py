@@ -0,0 +1,23 @@
+# Generated by Django 4.2.9 on 2026-10-17 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting_and_analytics', '0007_reportexport_cancel_requested_reportexport_progress_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportexport',
+            name='export_format',
+            field=models.CharField(choices=[('XLSX', 'Excel Workbook (.xlsx)'), ('PARQUET', 'Parquet (.zip)'), ('ARROW', 'Arrow IPC (.zip)'), ('CSV_GZ', 'Gzip CSV (.zip)')], default='XLSX', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='reportresult',
+            name='export_format',
+            field=models.CharField(choices=[('XLSX', 'Excel Workbook (.xlsx)'), ('PARQUET', 'Parquet (.zip)'), ('ARROW', 'Arrow IPC (.zip)'), ('CSV_GZ', 'Gzip CSV (.zip)')], default='XLSX', max_length=10),
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.conf import settings
 from django.db.models import JSONField
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from datetime import datetime, time, timedelta
 from access_control.models import Module
 
 User = get_user_model()
@@ -29,10 +31,19 @@ class Report(models.Model):
     
 class ReportExport(models.Model):
     STATUS_CHOICES = [
+        ('SCHEDULED', 'Scheduled'),
         ('PENDING', 'Pending'),
         ('IN_PROGRESS', 'In Progress'), 
         ('COMPLETED', 'Completed'),
-        ('FAILED', 'Failed')
+        ('FAILED', 'Failed'),
+        ('CANCELLED', 'Cancelled')
+    ]
+    ACTIVE_STATUSES = ['SCHEDULED', 'PENDING', 'IN_PROGRESS']
+    FORMAT_CHOICES = [
+        ('XLSX', 'Excel Workbook (.xlsx)'),
+        ('PARQUET', 'Parquet (.zip)'),
+        ('ARROW', 'Arrow IPC (.zip)'),
+        ('CSV_GZ', 'Gzip CSV (.zip)'),
     ]
 
     report = models.ForeignKey(Report, on_delete=models.CASCADE, related_name='exports')
@@ -41,11 +52,131 @@ class ReportExport(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    export_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='XLSX')
     export_file = models.FileField(upload_to='report_exports/', null=True, blank=True)
     error_message = models.TextField(null=True, blank=True)
+    progress = models.PositiveSmallIntegerField(default=0)
+    stage = models.CharField(max_length=100, blank=True)
+    cancel_requested = models.BooleanField(default=False)
 
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"{self.report.name} Export ({self.start_date.date()} to {self.end_date.date()})"
\ No newline at end of file
+        return f"{self.report.name} Export ({self.start_date.date()} to {self.end_date.date()})"
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+    def request_cancel(self):
+        """
+        Cancel the export. One that has not started is cancelled at once; a
+        running job sees the flag at its next progress update and stops.
+        Returns False if the export had already finished.
+        """
+        exports = ReportExport.objects.filter(id=self.id, status__in=self.ACTIVE_STATUSES)
+        if not exports.update(cancel_requested=True):
+            return False
+        exports.filter(status__in=['SCHEDULED', 'PENDING']).update(status='CANCELLED', stage='Cancelled')
+        self.refresh_from_db()
+        return True
+
+class ReportSubscription(models.Model):
+    """
+    A report delivered by email on a schedule, covering the last `range_days`
+    complete days before each run. Runs are dispatched by the
+    dispatch_report_subscriptions beat task.
+    """
+    FREQUENCY_CHOICES = [
+        ('DAILY', 'Daily'),
+        ('WEEKLY', 'Weekly'),
+        ('MONTHLY', 'Monthly'),
+    ]
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    report = models.ForeignKey(Report, on_delete=models.CASCADE, related_name='subscriptions')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    recipients = models.TextField(help_text="Comma-separated email addresses")
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='WEEKLY')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES, default=0, help_text="Used by weekly subscriptions")
+    day_of_month = models.PositiveSmallIntegerField(default=1, help_text="Used by monthly subscriptions (1-28)")
+    run_time = models.TimeField(default=time(6, 0))
+    range_days = models.PositiveIntegerField(default=7)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    next_run_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    last_export = models.ForeignKey(ReportExport, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        ordering = ['next_run_at']
+
+    def __str__(self):
+        return f"{self.report.name} ({self.get_frequency_display()}, last {self.range_days} days)"
+
+    def recipient_list(self):
+        return [email.strip() for email in self.recipients.split(',') if email.strip()]
+
+    def compute_next_run(self, after=None):
+        """First scheduled local run time strictly after `after` (default now)"""
+        after = timezone.localtime(after or timezone.now())
+        day = after.date()
+        while True:
+            if self.frequency == 'WEEKLY':
+                day += timedelta(days=(self.weekday - day.weekday()) % 7)
+            elif self.frequency == 'MONTHLY':
+                day_of_month = min(max(self.day_of_month, 1), 28)
+                if day.day > day_of_month:
+                    day = (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+                day = day.replace(day=day_of_month)
+            candidate = timezone.make_aware(datetime.combine(day, self.run_time), after.tzinfo)
+            if candidate > after:
+                return candidate
+            day += timedelta(days=1)
+
+    def period(self, run_at):
+        """(start, end) covering the `range_days` complete local days before `run_at`"""
+        end = timezone.localtime(run_at).replace(hour=0, minute=0, second=0, microsecond=0)
+        return end - timedelta(days=self.range_days), end
+
+    def save(self, *args, **kwargs):
+        if self.next_run_at is None and self.is_active:
+            self.next_run_at = self.compute_next_run()
+        super().save(*args, **kwargs)
+
+
+class ReportResult(models.Model):
+    """
+    Content-addressed cache of a rendered report. The cache key hashes the
+    report, the date range and the data watermark, so an entry is only reused
+    while the source rows behind it are unchanged.
+    """
+    cache_key = models.CharField(max_length=64, unique=True)
+    report = models.ForeignKey(Report, on_delete=models.CASCADE, related_name='cached_results')
+    start_date = models.DateTimeField()
+    end_date = models.DateTimeField()
+    watermark = models.CharField(max_length=255)
+    export_format = models.CharField(max_length=10, choices=ReportExport.FORMAT_CHOICES, default='XLSX')
+    result_file = models.FileField(upload_to='report_cache/')
+    size = models.PositiveBigIntegerField(default=0)
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['last_used_at']
+        indexes = [
+            models.Index(fields=['report', 'start_date', 'end_date'], name='reportresult_range_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.report.name} cache ({self.start_date.date()} to {self.end_date.date()})"
@@ -0,0 +1,506 @@
+"""
+Report engine shared by the query report generators.
+
+`QueryFacts` pulls the query fact set for a date range once, as a
+column-selected values stream, into a typed pandas DataFrame. Side tables
+(updates, tags, staff) are loaded lazily the first time a report asks for
+them, so a batch of reports over the same period reads each row only once.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+from django.contrib.auth import get_user_model
+from django.db.models import BooleanField, Case, Count, Max, Q, Sum, Value, When
+from django.utils import timezone
+
+from query_management import rollups
+from query_management.models import Query, QueryTag, QueryUpdate
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = ['NEW', 'IN_PROGRESS', 'WAITING']
+CLOSED_STATUSES = ['RESOLVED', 'CLOSED']
+
+# Columns streamed for every report. Free text such as the description is
+# fetched separately by the few reports that print it
+FACT_COLUMNS = [
+    'query_id', 'subject', 'source', 'priority', 'status', 'query_type',
+    'created_at', 'updated_at', 'resolved_at', 'expected_response_date',
+    'follow_up_date', 'is_anonymous', 'is_patient', 'conversion_status',
+    'response_time', 'satisfaction_rating', 'assigned_to_id',
+]
+CATEGORY_COLUMNS = ['source', 'priority', 'status', 'query_type']
+DATETIME_COLUMNS = ['created_at', 'updated_at', 'resolved_at', 'expected_response_date', 'follow_up_date']
+BOOLEAN_COLUMNS = ['is_anonymous', 'is_patient', 'conversion_status']
+
+SOURCE_LABELS = dict(Query.SOURCE_CHOICES)
+PRIORITY_LABELS = dict(Query.PRIORITY_CHOICES)
+STATUS_LABELS = dict(Query.STATUS_CHOICES)
+TYPE_LABELS = dict(Query.QUERY_TYPE_CHOICES)
+
+FETCH_CHUNK_SIZE = 2000
+
+# Rows converted and streamed to the worksheet at a time when writing a report
+WRITE_CHUNK_ROWS = 5000
+DATETIME_FORMAT = 'yyyy-mm-dd hh:mm:ss'
+
+HEADER_FORMAT = {
+    'bold': True,
+    'bg_color': '#0066cc',
+    'font_color': 'white'
+}
+
+
+class QueryFacts:
+    """Typed query facts for one reporting period, shared by every report builder"""
+
+    def __init__(self, start_date, end_date, now=None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.now = pd.Timestamp(now or timezone.now()).tz_convert(timezone.get_current_timezone())
+        self.tz = self.now.tz
+        self._queries = None
+        self._descriptions = None
+        self._updates = None
+        self._update_stats = None
+        self._tags = None
+        self._tag_cooccurrence = None
+        self._staff = None
+        self._rollup = None
+
+    def _period(self):
+        return Query.objects.filter(created_at__range=(self.start_date, self.end_date))
+
+    def _to_local(self, values):
+        return pd.to_datetime(values, utc=True).dt.tz_convert(self.tz)
+
+    @property
+    def queries(self):
+        """One row per query created in the period"""
+        if self._queries is None:
+            rows = self._period().values_list(*FACT_COLUMNS).iterator(chunk_size=FETCH_CHUNK_SIZE)
+            frame = pd.DataFrame.from_records(rows, columns=FACT_COLUMNS)
+            for column in CATEGORY_COLUMNS:
+                frame[column] = frame[column].astype('category')
+            for column in DATETIME_COLUMNS:
+                frame[column] = self._to_local(frame[column])
+            for column in BOOLEAN_COLUMNS:
+                frame[column] = frame[column].astype('boolean')
+            frame['query_id'] = frame['query_id'].astype('int64')
+            frame['subject'] = frame['subject'].astype(object)
+            frame['response_time'] = pd.to_timedelta(frame['response_time'])
+            frame['satisfaction_rating'] = frame['satisfaction_rating'].astype('float64')
+            frame['assigned_to_id'] = frame['assigned_to_id'].astype('Int64')
+            self._queries = frame
+            logger.info(f"Loaded {len(frame)} query facts for {self.start_date} - {self.end_date}")
+        return self._queries
+
+    @property
+    def rollup(self):
+        """
+        Daily totals per dimension for the period, from the query rollups.
+        Reports that only need counts and sums read this instead of `queries`.
+        """
+        if self._rollup is None:
+            columns = ['day', *rollups.DIMENSIONS, *rollups.MEASURES]
+            frame = pd.DataFrame.from_records(rollups.period_rows(self.start_date, self.end_date), columns=columns)
+            frame = frame[frame['query_count'] > 0]
+            frame['day'] = pd.to_datetime(frame['day'])
+            for column in CATEGORY_COLUMNS:
+                frame[column] = frame[column].astype('category')
+            frame['is_anonymous'] = frame['is_anonymous'].astype('boolean')
+            for column in rollups.DURATION_MEASURES:
+                frame[column] = pd.to_timedelta(frame[column])
+            self._rollup = frame
+            logger.info(f"Loaded {len(frame)} rollup rows for {self.start_date} - {self.end_date}")
+        return self._rollup
+
+    @property
+    def descriptions(self):
+        """Query descriptions keyed by query_id"""
+        if self._descriptions is None:
+            rows = self._period().values_list('query_id', 'description').iterator(chunk_size=FETCH_CHUNK_SIZE)
+            frame = pd.DataFrame.from_records(rows, columns=['query_id', 'description'])
+            self._descriptions = frame.set_index('query_id')['description']
+        return self._descriptions
+
+    @property
+    def updates(self):
+        """
+        One row per update on a query in the period. Escalation markers are
+        evaluated in SQL so the update text itself never leaves the database.
+        """
+        if self._updates is None:
+            rows = QueryUpdate.objects.filter(
+                query__created_at__range=(self.start_date, self.end_date)
+            ).annotate(
+                is_priority_change=Case(
+                    When(content__contains='priority changed', then=Value(True)),
+                    default=Value(False),
+                    output_field=BooleanField()
+                ),
+                is_escalation=Case(
+                    When(
+                        Q(content__contains='priority changed') & Q(content__contains='increased'),
+                        then=Value(True)
+                    ),
+                    default=Value(False),
+                    output_field=BooleanField()
+                )
+            ).values_list(
+                'query_id', 'created_at', 'is_priority_change', 'is_escalation'
+            ).iterator(chunk_size=FETCH_CHUNK_SIZE)
+            frame = pd.DataFrame.from_records(
+                rows, columns=['query_id', 'created_at', 'is_priority_change', 'is_escalation']
+            )
+            frame['query_id'] = frame['query_id'].astype('int64')
+            frame['created_at'] = self._to_local(frame['created_at'])
+            frame['is_priority_change'] = frame['is_priority_change'].astype(bool)
+            frame['is_escalation'] = frame['is_escalation'].astype(bool)
+            self._updates = frame
+        return self._updates
+
+    @property
+    def update_stats(self):
+        """Per-query update counts and timestamps, indexed by query_id"""
+        if self._update_stats is None:
+            updates = self.updates
+            escalations = updates[updates['is_escalation']]
+            stats = updates.groupby('query_id').agg(
+                update_count=('created_at', 'size'),
+                first_update_at=('created_at', 'min'),
+                last_update_at=('created_at', 'max'),
+                priority_changed=('is_priority_change', 'any'),
+            )
+            stats = stats.join(escalations.groupby('query_id').agg(
+                escalation_count=('created_at', 'size'),
+                first_escalation_at=('created_at', 'min'),
+            ))
+            self._update_stats = stats
+        return self._update_stats
+
+    def with_update_stats(self, frame):
+        """`frame` with the update statistics of each query joined on"""
+        merged = frame.join(self.update_stats, on='query_id')
+        for column in ['update_count', 'escalation_count']:
+            merged[column] = merged[column].fillna(0).astype('int64')
+        merged['priority_changed'] = merged['priority_changed'].astype('boolean').fillna(False).astype(bool)
+        merged['has_updates'] = merged['update_count'] > 0
+        return merged
+
+    @property
+    def tags(self):
+        """One row per (query, tag) pair in the period"""
+        if self._tags is None:
+            through = Query.tags.through
+            rows = through.objects.filter(
+                query__created_at__range=(self.start_date, self.end_date)
+            ).values_list('query_id', 'querytag_id').iterator(chunk_size=FETCH_CHUNK_SIZE)
+            frame = pd.DataFrame.from_records(rows, columns=['query_id', 'tag_id'])
+            names = dict(QueryTag.objects.values_list('id', 'name'))
+            frame['query_id'] = frame['query_id'].astype('int64')
+            frame['tag'] = frame['tag_id'].map(names).astype('category')
+            self._tags = frame[['query_id', 'tag_id', 'tag']]
+        return self._tags
+
+    @property
+    def tag_cooccurrence(self):
+        """
+        Tag co-occurrence of the period, cached with the tag pairs. 'pairs'
+        is the sparse co-occurrence matrix as one row per (tag1, tag2) found
+        together on a query, tag1 < tag2, with the number of such queries
+        ('count'), how many of them are closed ('resolved') or high priority
+        ('high'), and the microseconds of response time over the closed ones
+        ('resolution_time_total' / 'resolution_time_count'). 'tags_per_query'
+        counts tagged queries by how many tags they have.
+        """
+        if self._tag_cooccurrence is None:
+            tags = self.tags
+            query_codes, query_ids = pd.factorize(tags['query_id'])
+            queries = self.queries.set_index('query_id').reindex(query_ids)
+            closed = queries['status'].isin(CLOSED_STATUSES).to_numpy()
+            response_time = queries['response_time'].where(closed)
+
+            names = np.array(sorted(tags['tag'].astype(object).dropna().unique()), dtype=object)
+            tag_codes = pd.Categorical(tags['tag'].astype(object), categories=names).codes
+            known = tag_codes >= 0
+            first, second, sums = cooccurrence(query_codes[known], tag_codes[known], {
+                'count': np.ones(len(query_ids)),
+                'resolved': closed,
+                'high': (queries['priority'] == 'A').to_numpy(),
+                'resolution_time_total': (response_time.dt.total_seconds() * 1e6).fillna(0).to_numpy(),
+                'resolution_time_count': response_time.notna().to_numpy(),
+            })
+            self._tag_cooccurrence = {
+                'pairs': pd.DataFrame({'tag1': names[first], 'tag2': names[second], **sums}),
+                'tags_per_query': pd.Series(query_codes).value_counts().value_counts(),
+            }
+        return self._tag_cooccurrence
+
+    @property
+    def staff(self):
+        """Name and email of every staff member assigned in the period, indexed by user id"""
+        if self._staff is None:
+            staff_ids = self.queries['assigned_to_id'].dropna().unique().tolist()
+            rows = get_user_model().objects.filter(
+                pk__in=staff_ids
+            ).values_list('id', 'first_name', 'last_name', 'email')
+            self._staff = pd.DataFrame.from_records(
+                list(rows), columns=['id', 'first_name', 'last_name', 'email']
+            ).set_index('id')
+        return self._staff
+
+    def with_staff(self, frame):
+        """`frame` with assigned_first_name/last_name/email columns joined on"""
+        staff = self.staff.add_prefix('assigned_')
+        return frame.join(staff, on='assigned_to_id')
+
+
+def cooccurrence(row_codes, column_codes, weights):
+    """
+    Sparse weighted co-occurrence of columns sharing a row, in one pass over
+    the (row, column) entries. Every pair of distinct columns found in the
+    same row adds that row's weight, for each weight vector in `weights`
+    (indexed by row code). Returns (first, second, sums) in coordinate form:
+    only pairs that occur are listed, with first < second, so the cost
+    grows with the entries per row rather than the number of columns squared.
+    """
+    row_codes, column_codes = np.asarray(row_codes), np.asarray(column_codes)
+    order = np.lexsort((column_codes, row_codes))
+    rows, columns = row_codes[order], column_codes[order]
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]) if len(rows) else np.array([], dtype=int)
+    sizes = np.diff(np.r_[starts, len(rows)])
+    # Entries after each one within its row
+    remaining = np.repeat(sizes, sizes) - (np.arange(len(rows)) - np.repeat(starts, sizes)) - 1
+
+    firsts, seconds, owners = [], [], []
+    for offset in range(1, int(sizes.max()) if len(sizes) else 1):
+        left = np.flatnonzero(remaining >= offset)
+        firsts.append(columns[left])
+        seconds.append(columns[left + offset])
+        owners.append(rows[left])
+    if not firsts:
+        empty = np.array([], dtype='int64')
+        return empty, empty, {name: np.array([], dtype='float64') for name in weights}
+
+    first, second, owner = np.concatenate(firsts), np.concatenate(seconds), np.concatenate(owners)
+    distinct = first != second
+    first, second, owner = first[distinct], second[distinct], owner[distinct]
+    width = int(columns.max()) + 1
+    pairs, inverse = np.unique(first.astype('int64') * width + second, return_inverse=True)
+    sums = {
+        name: np.bincount(inverse, weights=np.asarray(weight, dtype='float64')[owner], minlength=len(pairs))
+        for name, weight in weights.items()
+    }
+    return pairs // width, pairs % width, sums
+
+
+def data_watermark(start_date, end_date):
+    """
+    Fingerprint of the source rows behind a reporting period. It changes
+    whenever a query in the period is added, edited or deleted, gains or
+    loses an update, or has its tags changed, and when a tag or a staff
+    member the period's reports print is renamed.
+    """
+    in_period = Q(query__created_at__range=(start_date, end_date))
+    period_queries = Query.objects.filter(created_at__range=(start_date, end_date))
+    queries = period_queries.aggregate(
+        count=Count('query_id'), latest=Max('updated_at')
+    )
+    updates = QueryUpdate.objects.filter(in_period).aggregate(
+        count=Count('id'), latest=Max('created_at')
+    )
+    tags = Query.tags.through.objects.filter(in_period).aggregate(
+        count=Count('id'), checksum=Sum('querytag_id')
+    )
+    # Tags and users carry no change timestamp, so their printed names are hashed
+    tag_names = QueryTag.objects.filter(
+        id__in=Query.tags.through.objects.filter(in_period).values('querytag_id')
+    ).order_by('id').values_list('id', 'name')
+    staff_names = get_user_model().objects.filter(
+        pk__in=period_queries.values('assigned_to_id')
+    ).order_by('id').values_list('id', 'first_name', 'last_name', 'email')
+    names = hashlib.sha256(repr((list(tag_names), list(staff_names))).encode()).hexdigest()[:16]
+    parts = [
+        queries['count'], queries['latest'],
+        updates['count'], updates['latest'],
+        tags['count'], tags['checksum'] or 0,
+        names,
+    ]
+    return ':'.join(part.isoformat() if hasattr(part, 'isoformat') else str(part) for part in parts)
+
+
+def group(frame, keys):
+    """Group like values().annotate(): nulls form their own group, unused categories are dropped"""
+    return frame.groupby(keys, observed=True, dropna=False, sort=False)
+
+
+# How each partial aggregate is combined across partitions
+MERGE_FUNCTIONS = {'size': 'sum', 'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max'}
+
+
+def partial_agg(frame, keys, spec):
+    """
+    Mergeable form of group(frame, keys).agg(**spec), where `spec` maps an
+    output column to (source column, 'size'/'sum'/'count'/'min'/'max'/'mean').
+    Means are carried as a sum and a count so partitions can be combined
+    with merge_agg.
+    """
+    columns = {}
+    for name, (column, how) in spec.items():
+        if how == 'mean':
+            columns[f'{name}__sum'] = (column, 'sum')
+            columns[f'{name}__count'] = (column, 'count')
+        else:
+            columns[name] = (column, how)
+    return group(frame, keys).agg(**columns).reset_index()
+
+
+def concat_partials(partials):
+    """Stack per-partition frames, skipping empty ones so they do not affect dtypes"""
+    frames = [frame for frame in partials if not frame.empty] or partials[:1]
+    return pd.concat(frames, ignore_index=True)
+
+
+def merge_agg(partials, keys, spec):
+    """Combine partial_agg results into the same frame a single group().agg() would give"""
+    frame = concat_partials(partials)
+    columns = {}
+    for name, (_, how) in spec.items():
+        if how == 'mean':
+            columns[f'{name}__sum'] = (f'{name}__sum', 'sum')
+            columns[f'{name}__count'] = (f'{name}__count', 'sum')
+        else:
+            columns[name] = (name, MERGE_FUNCTIONS[how])
+    merged = group(frame, keys).agg(**columns).reset_index()
+    for name, (_, how) in spec.items():
+        if how == 'mean':
+            total, count = merged.pop(f'{name}__sum'), merged.pop(f'{name}__count')
+            merged[name] = (total / count.where(count > 0)).where(count > 0)
+    return merged[[*([keys] if isinstance(keys, str) else keys), *spec]]
+
+
+def labels(series, choices, default=None):
+    """Map choice codes to their display names"""
+    mapped = series.astype(object).map(choices)
+    if default is not None:
+        mapped = mapped.fillna(default)
+    return mapped
+
+
+def staff_names(frame, default='Unassigned'):
+    """'First Last' for each row of a frame joined with QueryFacts.with_staff"""
+    names = frame['assigned_first_name'].fillna('') + ' ' + frame['assigned_last_name'].fillna('')
+    return names.str.strip().replace('', default)
+
+
+def percent(numerator, denominator):
+    return (numerator * 100.0 / denominator).round(2)
+
+
+def format_duration(value):
+    """
+    Render a duration as pandas prints it, "1 days 15:20:00", without
+    fractional seconds. Detail columns always printed this way; summary
+    figures used to print Python's "1 day, 15:20:00" and now match them.
+    """
+    if pd.isnull(value):
+        return 'N/A'
+    return str(pd.Timedelta(value)).split('.')[0]
+
+
+def format_durations(series):
+    return series.map(format_duration).astype(object)
+
+
+def mean_duration(series):
+    """
+    Mean of a duration column as a numpy timedelta64, so that a null mean
+    still makes a duration column (a bare NaT would read as a datetime)
+    """
+    value = series.mean()
+    if pd.isnull(value):
+        return np.timedelta64('NaT', 'ns')
+    return pd.Timedelta(value).to_timedelta64()
+
+
+def naive(series):
+    """Local wall-clock datetimes for Excel, which cannot store timezones"""
+    return series.dt.tz_localize(None)
+
+
+def same_day(left, right):
+    return left.dt.normalize() == right.dt.normalize()
+
+
+def temp_report_path(start_date, end_date, directory=None, suffix='.xlsx'):
+    """A fresh temp file for one rendered report, inside `directory` when given"""
+    fd, path = tempfile.mkstemp(
+        prefix=f'temp_report_{start_date:%Y%m%d}_{end_date:%Y%m%d}_',
+        suffix=suffix,
+        dir=directory
+    )
+    os.close(fd)
+    return path
+
+
+def write_workbook(sheets, path, progress=None):
+    """
+    Write `sheets`, a list of (sheet name, DataFrame), to an xlsx file with
+    the standard blue header row and content-fitted column widths.
+    `progress(fraction, stage)`, when given, is called after every chunk.
+
+    xlsxwriter runs in constant_memory mode: each row is flushed to a temp
+    file next to `path` as soon as it is written, so rows are streamed in
+    order, WRITE_CHUNK_ROWS at a time, instead of through DataFrame.to_excel
+    (which writes column by column and keeps every cell in memory).
+    """
+    workbook = xlsxwriter.Workbook(path, {
+        'constant_memory': True,
+        'tmpdir': os.path.dirname(path),
+        'nan_inf_to_errors': True,
+    })
+    total_rows = sum(len(df) for _, df in sheets) or 1
+    written = 0
+    try:
+        header_format = workbook.add_format(HEADER_FORMAT)
+        datetime_format = workbook.add_format({'num_format': DATETIME_FORMAT})
+        for sheet_name, df in sheets:
+            if progress:
+                progress(written / total_rows, f"Writing {sheet_name}")
+            # Builders keep durations as timedeltas; the workbook shows them as text
+            df = df.assign(**{
+                column: format_durations(df[column])
+                for column in df.columns if pd.api.types.is_timedelta64_dtype(df[column])
+            })
+            worksheet = workbook.add_worksheet(sheet_name)
+            formats = []
+            for col_num, value in enumerate(df.columns.values):
+                column = df.iloc[:, col_num]
+                max_length = len(str(value))
+                if not df.empty:
+                    max_length = max(column.astype(str).str.len().max(), max_length)
+                worksheet.set_column(col_num, col_num, max_length + 2)
+                formats.append(datetime_format if pd.api.types.is_datetime64_any_dtype(column) else None)
+
+            worksheet.write_row(0, 0, [str(value) for value in df.columns.values], header_format)
+            for offset in range(0, len(df), WRITE_CHUNK_ROWS):
+                chunk = df.iloc[offset:offset + WRITE_CHUNK_ROWS]
+                # Python scalars with nulls as None, which xlsxwriter writes as blanks
+                chunk = chunk.astype(object).where(chunk.notna(), None)
+                for row_num, row in enumerate(chunk.itertuples(index=False, name=None), start=offset + 1):
+                    for col_num, value in enumerate(row):
+                        if value is None:
+                            continue
+                        worksheet.write(row_num, col_num, value, formats[col_num])
+                written += len(chunk)
+                if progress:
+                    progress(written / total_rows)
+    finally:
+        workbook.close()
+    return path
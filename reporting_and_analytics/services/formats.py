@@ -0,0 +1,149 @@
+"""
+Output formats for rendered reports.
+
+Besides the xlsx workbook, a report can be exported for analytics consumers
+as Parquet, Arrow IPC or gzip-compressed CSV. These are written straight from
+the builder DataFrames with typed columns: durations become float seconds and
+datetimes stay timestamps rather than formatted text. A report may have several
+sheets, so columnar exports are a zip archive holding one file per sheet.
+
+Parquet and Arrow need the optional pyarrow package; formats whose library
+is missing are not offered.
+"""
+import gzip
+import importlib.util
+import logging
+import os
+import zipfile
+
+import pandas as pd
+from django.utils.text import slugify
+
+from ..models import ReportExport
+from .engine import write_workbook
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FORMAT = 'XLSX'
+
+
+def _sheet_files(sheets, path, extension, write_sheet, progress=None):
+    """
+    Write each sheet with `write_sheet(frame, path)` next to `path` and store
+    them in a zip archive at `path`. Members are already compressed, so the
+    archive does not compress them again.
+    """
+    directory = os.path.dirname(path)
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED) as archive:
+        names = set()
+        for index, (sheet_name, df) in enumerate(sheets):
+            if progress:
+                progress(index / len(sheets), f"Writing {sheet_name}")
+            name = slugify(sheet_name).replace('-', '_') or f'sheet_{index + 1}'
+            if name in names:
+                name = f'{name}_{index + 1}'
+            names.add(name)
+
+            member = os.path.join(directory, f'{os.path.basename(path)}.{name}{extension}')
+            try:
+                write_sheet(columnar_frame(df), member)
+                archive.write(member, f'{name}{extension}')
+            finally:
+                if os.path.exists(member):
+                    os.remove(member)
+    if progress:
+        progress(1)
+    return path
+
+
+def columnar_frame(df):
+    """
+    Typed copy of a report frame for columnar formats: durations as float
+    seconds, numbers mixed with a single placeholder text ('N/A',
+    'No Rating') as numbers with nulls, and any other object column mixing
+    value types as text, since a column holds a single type
+    """
+    df = df.copy()
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_timedelta64_dtype(series):
+            df[column] = series.dt.total_seconds()
+        elif series.dtype == object:
+            values = series.dropna()
+            is_number = values.map(lambda value: pd.api.types.is_number(value) and not isinstance(value, bool))
+            placeholders = set(values[~is_number.astype(bool)])
+            kinds = {type(value) for value in values}
+            if is_number.any() and len(placeholders) == 1 and isinstance(next(iter(placeholders)), str):
+                df[column] = pd.to_numeric(series.where(series.map(lambda value: value not in placeholders)))
+            elif len(kinds) > 1:
+                df[column] = series.map(lambda value: value if pd.isnull(value) else str(value)).astype(object)
+    df.columns = [str(column) for column in df.columns]
+    return df
+
+
+def _write_parquet(df, path):
+    df.to_parquet(path, engine='pyarrow', index=False, compression='snappy')
+
+
+def _write_arrow(df, path):
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), path, compression='zstd')
+
+
+def _write_csv_gz(df, path):
+    # mtime=0 keeps the output byte-identical for identical data
+    with gzip.GzipFile(path, 'wb', mtime=0) as f:
+        df.to_csv(f, index=False, date_format='%Y-%m-%d %H:%M:%S')
+
+
+def write_xlsx(sheets, path, progress=None):
+    return write_workbook(sheets, path, progress=progress)
+
+
+def write_parquet(sheets, path, progress=None):
+    return _sheet_files(sheets, path, '.parquet', _write_parquet, progress)
+
+
+def write_arrow(sheets, path, progress=None):
+    return _sheet_files(sheets, path, '.arrow', _write_arrow, progress)
+
+
+def write_csv_gz(sheets, path, progress=None):
+    return _sheet_files(sheets, path, '.csv.gz', _write_csv_gz, progress)
+
+
+# ReportExport.export_format code: (file extension, content type, writer, required module)
+EXPORT_FORMATS = {
+    'XLSX': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', write_xlsx, None),
+    'PARQUET': ('.parquet.zip', 'application/zip', write_parquet, 'pyarrow'),
+    'ARROW': ('.arrow.zip', 'application/zip', write_arrow, 'pyarrow'),
+    'CSV_GZ': ('.csv.zip', 'application/zip', write_csv_gz, None),
+}
+
+
+def is_available(export_format):
+    required = EXPORT_FORMATS[export_format][3]
+    return required is None or importlib.util.find_spec(required) is not None
+
+
+def available_formats():
+    """(code, label) choices for the formats that can be written here"""
+    return [(code, label) for code, label in ReportExport.FORMAT_CHOICES if is_available(code)]
+
+
+def extension(export_format):
+    return EXPORT_FORMATS[export_format][0]
+
+
+def content_type(export_format):
+    return EXPORT_FORMATS[export_format][1]
+
+
+def write_report(sheets, path, export_format=DEFAULT_FORMAT, progress=None):
+    """Write `sheets`, a list of (sheet name, DataFrame), to `path` in `export_format`"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format}")
+    if not is_available(export_format):
+        raise ValueError(f"{export_format} export requires the {EXPORT_FORMATS[export_format][3]} package")
+    return EXPORT_FORMATS[export_format][2](sheets, path, progress=progress)
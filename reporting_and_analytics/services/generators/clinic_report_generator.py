@@ -0,0 +1,281 @@
+import pandas as pd
+
+from appointment_management.models import Appointment
+from consultation_management.models import ConsultationType
+from phototherapy_management.models import PhototherapyType
+
+from ..engine import labels, percent
+from ..snapshot import period_keys, read_frame
+
+APPOINTMENT_TYPE_LABELS = dict(Appointment.APPOINTMENT_TYPES)
+CONSULTATION_TYPE_LABELS = dict(ConsultationType.choices)
+THERAPY_TYPE_LABELS = dict(PhototherapyType.THERAPY_CHOICES)
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def _rate(numerator, denominator):
+    return percent(numerator, denominator.where(denominator > 0)).fillna(0)
+
+
+class ClinicReportGenerator:
+    """
+    Handles generation of cross-module clinic reports. These read the
+    analytics snapshot (see services.snapshot) rather than the production
+    tables, so figures are as of its last nightly refresh.
+    """
+
+    @staticmethod
+    def build_plan_revenue_analysis(facts):
+        """Builds revenue per phototherapy plan against sessions, consultations and no-shows of its patient"""
+        start_key, end_key = period_keys(facts.start_date, facts.end_date)
+        df = read_frame("""
+            WITH payments AS (
+                SELECT plan_id, SUM(amount) AS revenue, COUNT(*) AS payment_count
+                FROM fact_payment
+                WHERE status = 'COMPLETED' AND plan_id IS NOT NULL AND date_key BETWEEN :start AND :end
+                GROUP BY plan_id
+            ), sessions AS (
+                SELECT plan_id, SUM(is_completed) AS completed, SUM(is_missed) AS missed
+                FROM fact_phototherapy_session
+                WHERE date_key BETWEEN :start AND :end
+                GROUP BY plan_id
+            ), consultations AS (
+                SELECT patient_id, COUNT(*) AS consultations, SUM(is_no_show) AS no_shows
+                FROM fact_consultation
+                WHERE date_key BETWEEN :start AND :end
+                GROUP BY patient_id
+            ), appointments AS (
+                SELECT patient_id, COUNT(*) AS appointments, SUM(is_no_show) AS no_shows
+                FROM fact_appointment
+                WHERE date_key BETWEEN :start AND :end
+                GROUP BY patient_id
+            )
+            SELECT
+                plan.plan_id,
+                patient.name AS patient,
+                plan.protocol,
+                plan.therapy_type,
+                center.name AS center,
+                plan.billing_status,
+                plan.total_cost,
+                COALESCE(payments.revenue, 0) AS revenue,
+                COALESCE(payments.payment_count, 0) AS payment_count,
+                COALESCE(sessions.completed, 0) AS sessions_completed,
+                COALESCE(sessions.missed, 0) AS sessions_missed,
+                COALESCE(consultations.consultations, 0) AS consultations,
+                COALESCE(appointments.appointments, 0) AS appointments,
+                COALESCE(consultations.no_shows, 0) + COALESCE(appointments.no_shows, 0) AS no_shows
+            FROM dim_phototherapy_plan AS plan
+            LEFT JOIN dim_person AS patient ON patient.person_id = plan.patient_id
+            LEFT JOIN dim_center AS center ON center.center_key = plan.center_key
+            LEFT JOIN payments ON payments.plan_id = plan.plan_id
+            LEFT JOIN sessions ON sessions.plan_id = plan.plan_id
+            LEFT JOIN consultations ON consultations.patient_id = plan.patient_id
+            LEFT JOIN appointments ON appointments.patient_id = plan.patient_id
+            WHERE payments.plan_id IS NOT NULL OR sessions.plan_id IS NOT NULL
+            ORDER BY revenue DESC, sessions_completed DESC
+        """, {'start': start_key, 'end': end_key})
+
+        df['therapy_type'] = labels(df['therapy_type'], THERAPY_TYPE_LABELS, 'Unspecified')
+        df['revenue_per_session'] = (
+            df['revenue'] / df['sessions_completed'].where(df['sessions_completed'] > 0)
+        ).round(2).fillna(0)
+        df['attendance_rate'] = _rate(df['sessions_completed'], df['sessions_completed'] + df['sessions_missed'])
+        df['no_show_rate'] = _rate(df['no_shows'], df['consultations'] + df['appointments'])
+
+        df.rename(columns={
+            'plan_id': 'Plan ID',
+            'patient': 'Patient',
+            'protocol': 'Protocol',
+            'therapy_type': 'Therapy Type',
+            'center': 'Center',
+            'billing_status': 'Billing Status',
+            'total_cost': 'Plan Cost',
+            'revenue': 'Revenue',
+            'payment_count': 'Payments',
+            'sessions_completed': 'Sessions Completed',
+            'sessions_missed': 'Sessions Missed',
+            'attendance_rate': 'Attendance Rate (%)',
+            'revenue_per_session': 'Revenue per Session',
+            'consultations': 'Consultations',
+            'appointments': 'Appointments',
+            'no_shows': 'No-shows',
+            'no_show_rate': 'No-show Rate (%)'
+        }, inplace=True)
+        df = df[[
+            'Plan ID',
+            'Patient',
+            'Protocol',
+            'Therapy Type',
+            'Center',
+            'Billing Status',
+            'Plan Cost',
+            'Revenue',
+            'Payments',
+            'Sessions Completed',
+            'Sessions Missed',
+            'Attendance Rate (%)',
+            'Revenue per Session',
+            'Consultations',
+            'Appointments',
+            'No-shows',
+            'No-show Rate (%)'
+        ]]
+
+        summary = df.groupby('Therapy Type', observed=True).agg(**{
+            'Plans': ('Plan ID', 'size'),
+            'Revenue': ('Revenue', 'sum'),
+            'Sessions Completed': ('Sessions Completed', 'sum'),
+            'Sessions Missed': ('Sessions Missed', 'sum'),
+            'Consultations': ('Consultations', 'sum'),
+            'No-shows': ('No-shows', 'sum'),
+        }).reset_index().sort_values('Revenue', ascending=False)
+        summary['Revenue per Session'] = (
+            summary['Revenue'] / summary['Sessions Completed'].where(summary['Sessions Completed'] > 0)
+        ).round(2).fillna(0)
+
+        return [('Revenue by Plan', df), ('Summary by Therapy Type', summary)]
+
+    @staticmethod
+    def build_no_show_analysis(facts):
+        """Builds no-show analysis of appointments and consultations by doctor, center and weekday"""
+        start_key, end_key = period_keys(facts.start_date, facts.end_date)
+        visits = read_frame("""
+            SELECT 'Appointment' AS visit, appointment_type AS visit_type, doctor_id, center_key, date_key,
+                   is_completed, is_cancelled, is_no_show
+            FROM fact_appointment
+            WHERE date_key BETWEEN :start AND :end
+            UNION ALL
+            SELECT 'Consultation', consultation_type, doctor_id, center_key, date_key,
+                   is_completed, is_cancelled, is_no_show
+            FROM fact_consultation
+            WHERE date_key BETWEEN :start AND :end
+        """, {'start': start_key, 'end': end_key})
+        people = read_frame("SELECT person_id AS doctor_id, name AS doctor FROM dim_person")
+        centers = read_frame("SELECT center_key, name AS center FROM dim_center")
+        dates = read_frame(
+            "SELECT date_key, weekday FROM dim_date WHERE date_key BETWEEN :start AND :end",
+            {'start': start_key, 'end': end_key}
+        )
+
+        visits = visits.merge(people, on='doctor_id', how='left').merge(
+            centers, on='center_key', how='left'
+        ).merge(dates, on='date_key', how='left')
+        visits['doctor'] = visits['doctor'].fillna('Unknown')
+        visits['center'] = visits['center'].fillna('Unspecified')
+        visits['visit_type'] = labels(
+            visits['visit_type'], {**APPOINTMENT_TYPE_LABELS, **CONSULTATION_TYPE_LABELS}, 'Unspecified'
+        )
+
+        def breakdown(keys):
+            df = visits.groupby(keys, observed=True).agg(
+                total=('date_key', 'size'),
+                completed=('is_completed', 'sum'),
+                cancelled=('is_cancelled', 'sum'),
+                no_shows=('is_no_show', 'sum'),
+            ).reset_index()
+            df['no_show_rate'] = _rate(df['no_shows'], df['total'])
+            df['completion_rate'] = _rate(df['completed'], df['total'])
+            return df.rename(columns={
+                'visit': 'Visit',
+                'visit_type': 'Type',
+                'doctor': 'Doctor',
+                'center': 'Center',
+                'weekday': 'Weekday',
+                'total': 'Total Scheduled',
+                'completed': 'Completed',
+                'cancelled': 'Cancelled',
+                'no_shows': 'No-shows',
+                'no_show_rate': 'No-show Rate (%)',
+                'completion_rate': 'Completion Rate (%)'
+            })
+
+        by_doctor = breakdown(['doctor', 'visit']).sort_values('No-shows', ascending=False)
+        by_center = breakdown(['center', 'visit']).sort_values('No-shows', ascending=False)
+        by_type = breakdown(['visit', 'visit_type']).sort_values('No-shows', ascending=False)
+        by_weekday = breakdown(['weekday', 'visit'])
+        by_weekday['Weekday'] = pd.Categorical(by_weekday['Weekday'], WEEKDAYS, ordered=True)
+        by_weekday = by_weekday.sort_values(['Weekday', 'Visit'])
+        by_weekday['Weekday'] = by_weekday['Weekday'].astype(object)
+
+        return [
+            ('By Doctor', by_doctor),
+            ('By Center', by_center),
+            ('By Visit Type', by_type),
+            ('By Weekday', by_weekday),
+        ]
+
+    @staticmethod
+    def build_monthly_clinic_activity(facts):
+        """Builds month by month clinic activity and revenue across appointments, consultations and phototherapy"""
+        start_key, end_key = period_keys(facts.start_date, facts.end_date)
+        df = read_frame("""
+            WITH activity AS (
+                SELECT date_key, 1 AS appointments, is_no_show AS appointment_no_shows,
+                       0 AS consultations, 0 AS consultation_no_shows, 0 AS sessions, 0 AS missed_sessions,
+                       0 AS phototherapy_revenue, 0 AS invoice_revenue
+                FROM fact_appointment
+                UNION ALL
+                SELECT date_key, 0, 0, 1, is_no_show, 0, 0, 0, 0 FROM fact_consultation
+                UNION ALL
+                SELECT date_key, 0, 0, 0, 0, is_completed, is_missed, 0, 0 FROM fact_phototherapy_session
+                UNION ALL
+                SELECT date_key, 0, 0, 0, 0, 0, 0,
+                       CASE WHEN source = 'phototherapy' THEN amount ELSE 0 END,
+                       CASE WHEN source = 'invoice' THEN amount ELSE 0 END
+                FROM fact_payment
+                WHERE status = 'COMPLETED'
+            )
+            SELECT
+                d.month_start,
+                SUM(a.appointments) AS appointments,
+                SUM(a.appointment_no_shows) AS appointment_no_shows,
+                SUM(a.consultations) AS consultations,
+                SUM(a.consultation_no_shows) AS consultation_no_shows,
+                SUM(a.sessions) AS sessions,
+                SUM(a.missed_sessions) AS missed_sessions,
+                SUM(a.phototherapy_revenue) AS phototherapy_revenue,
+                SUM(a.invoice_revenue) AS invoice_revenue
+            FROM activity AS a
+            JOIN dim_date AS d ON d.date_key = a.date_key
+            WHERE a.date_key BETWEEN :start AND :end
+            GROUP BY d.month_start
+            ORDER BY d.month_start
+        """, {'start': start_key, 'end': end_key})
+
+        df['month'] = pd.to_datetime(df['month_start']).dt.strftime('%B %Y')
+        df['appointment_no_show_rate'] = _rate(df['appointment_no_shows'], df['appointments'])
+        df['consultation_no_show_rate'] = _rate(df['consultation_no_shows'], df['consultations'])
+        df['total_revenue'] = df['phototherapy_revenue'] + df['invoice_revenue']
+
+        df.rename(columns={
+            'month': 'Month',
+            'appointments': 'Appointments',
+            'appointment_no_shows': 'Appointment No-shows',
+            'appointment_no_show_rate': 'Appointment No-show Rate (%)',
+            'consultations': 'Consultations',
+            'consultation_no_shows': 'Consultation No-shows',
+            'consultation_no_show_rate': 'Consultation No-show Rate (%)',
+            'sessions': 'Phototherapy Sessions',
+            'missed_sessions': 'Missed Sessions',
+            'phototherapy_revenue': 'Phototherapy Revenue',
+            'invoice_revenue': 'Invoice Revenue',
+            'total_revenue': 'Total Revenue'
+        }, inplace=True)
+        df = df[[
+            'Month',
+            'Appointments',
+            'Appointment No-shows',
+            'Appointment No-show Rate (%)',
+            'Consultations',
+            'Consultation No-shows',
+            'Consultation No-show Rate (%)',
+            'Phototherapy Sessions',
+            'Missed Sessions',
+            'Phototherapy Revenue',
+            'Invoice Revenue',
+            'Total Revenue'
+        ]]
+
+        return [('Monthly Activity', df)]
@@ -1,384 +1,187 @@
-# Standard library imports
-from datetime import datetime
-import pytz
-
-# Third-party imports
-import pandas as pd
-
-# Django imports
-from django.contrib.auth import get_user_model
-from django.db import models
-from django.db.models import Count, Q
-from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
-from django.utils import timezone
-
 # Local application imports
-from query_management.models import Query
-
-class StaffReportGenerator:
-    """Handles generation of Staff/Assignment related reports"""
-    
-    @staticmethod
-    def generate_queries_per_staff(start_date, end_date):
-        """Generates report showing distribution of queries among staff members"""
-        User = get_user_model()
-        
-        # Get base queryset within date range
-        queries = Query.objects.filter(
-            created_at__range=(start_date, end_date),
-            assigned_to__isnull=False
-        )
+from ..engine import (
+    CLOSED_STATUSES, PRIORITY_LABELS, SOURCE_LABELS, STATUS_LABELS, TYPE_LABELS,
+    group, labels, naive, percent
+)
 
-        # Get distribution by staff member
-        staff_counts = list(queries.values(
-            'assigned_to',
-            'assigned_to__first_name',
-            'assigned_to__last_name',
-            'assigned_to__email'
-        ).annotate(
-            count=Count('query_id'),
-            resolved_count=Count('query_id', filter=models.Q(status='RESOLVED')),
-            pending_count=Count('query_id', filter=~models.Q(status='RESOLVED'))
-        ).order_by('-count'))
+STAFF_KEYS = ['assigned_to_id', 'assigned_first_name', 'assigned_last_name', 'assigned_email']
 
-        # Create DataFrame
-        df = pd.DataFrame(staff_counts)
-        
-        if not df.empty:
-            # Create full name and format columns
-            df['Staff Member'] = df['assigned_to__first_name'] + ' ' + df['assigned_to__last_name']
-            df['Email'] = df['assigned_to__email']
-            df.rename(columns={
-                'count': 'Total Queries',
-                'resolved_count': 'Resolved Queries',
-                'pending_count': 'Pending Queries'
-            }, inplace=True)
-            
-            # Select and order columns
-            df = df[[
-                'Staff Member',
-                'Email',
-                'Total Queries',
-                'Resolved Queries',
-                'Pending Queries'
-            ]]
 
-        # Create unique filename
-        temp_file = f'temp_report_{datetime.combine(start_date.date(), datetime.min.time()).strftime("%Y%m%d")}_{datetime.combine(end_date.date(), datetime.min.time()).strftime("%Y%m%d")}.xlsx'
-        
-        # Write to Excel
-        with pd.ExcelWriter(temp_file, engine='xlsxwriter') as excel_file:
-            workbook = excel_file.book
-            header_format = workbook.add_format({
-                'bold': True,
-                'bg_color': '#0066cc',
-                'font_color': 'white'
-            })
+def _staff_columns(df):
+    df['Staff Member'] = df['assigned_first_name'] + ' ' + df['assigned_last_name']
+    df['Email'] = df['assigned_email']
+    return df
 
-            # Write sheet
-            df.to_excel(excel_file, sheet_name='Queries per Staff', index=False)
 
-            # Format headers and adjust column widths
-            worksheet = excel_file.sheets['Queries per Staff']
-            for col_num, value in enumerate(df.columns.values):
-                worksheet.write(0, col_num, value, header_format)
-                if not df.empty:
-                    max_length = max(
-                        df[df.columns[col_num]].astype(str).apply(len).max(),
-                        len(str(value))
-                    )
-                else:
-                    max_length = len(str(value))
-                worksheet.set_column(col_num, col_num, max_length + 2)
-
-        return temp_file
+class StaffReportGenerator:
+    """Handles generation of Staff/Assignment related reports"""
 
     @staticmethod
-    def generate_open_queries_by_staff(start_date, end_date):
-        """Generates report showing current workload analysis by staff member"""
-        User = get_user_model()
-        
-        # Get base queryset for open queries within date range
-        queries = Query.objects.filter(
-            created_at__range=(start_date, end_date),
-            assigned_to__isnull=False
-        ).exclude(status__in=['RESOLVED', 'CLOSED'])
-
-        # Get workload distribution by staff member
-        staff_workload = list(queries.values(
-            'assigned_to',
-            'assigned_to__first_name',
-            'assigned_to__last_name',
-            'assigned_to__email'
-        ).annotate(
-            total_open=Count('query_id'),
-            high_priority=Count('query_id', filter=Q(priority='A')),
-            medium_priority=Count('query_id', filter=Q(priority='B')),
-            low_priority=Count('query_id', filter=Q(priority='C')),
-            waiting_response=Count('query_id', filter=Q(status='WAITING')),
-            in_progress=Count('query_id', filter=Q(status='IN_PROGRESS')),
-            new_queries=Count('query_id', filter=Q(status='NEW'))
-        ).order_by('-total_open'))
-
-        # Create DataFrame
-        df = pd.DataFrame(staff_workload)
-        
-        if not df.empty:
-            # Create full name and format columns
-            df['Staff Member'] = df['assigned_to__first_name'] + ' ' + df['assigned_to__last_name']
-            df['Email'] = df['assigned_to__email']
-            
-            # Select and order columns
-            df = df[[
-                'Staff Member',
-                'Email',
-                'total_open',
-                'high_priority',
-                'medium_priority',
-                'low_priority',
-                'new_queries',
-                'in_progress',
-                'waiting_response'
-            ]]
-            
-            # Rename columns for better readability
-            df.rename(columns={
-                'total_open': 'Total Open Queries',
-                'high_priority': 'High Priority',
-                'medium_priority': 'Medium Priority',
-                'low_priority': 'Low Priority',
-                'new_queries': 'New',
-                'in_progress': 'In Progress',
-                'waiting_response': 'Waiting for Response'
-            }, inplace=True)
-
-        # Create unique filename
-        temp_file = f'temp_report_{datetime.combine(start_date.date(), datetime.min.time()).strftime("%Y%m%d")}_{datetime.combine(end_date.date(), datetime.min.time()).strftime("%Y%m%d")}.xlsx'
-        
-        # Write to Excel
-        with pd.ExcelWriter(temp_file, engine='xlsxwriter') as excel_file:
-            workbook = excel_file.book
-            header_format = workbook.add_format({
-                'bold': True,
-                'bg_color': '#0066cc',
-                'font_color': 'white'
-            })
-
-            # Write sheet
-            df.to_excel(excel_file, sheet_name='Open Queries by Staff', index=False)
-
-            # Format headers and adjust column widths
-            worksheet = excel_file.sheets['Open Queries by Staff']
-            for col_num, value in enumerate(df.columns.values):
-                worksheet.write(0, col_num, value, header_format)
-                if not df.empty:
-                    max_length = max(
-                        df[df.columns[col_num]].astype(str).apply(len).max(),
-                        len(str(value))
-                    )
-                else:
-                    max_length = len(str(value))
-                worksheet.set_column(col_num, col_num, max_length + 2)
-
-        return temp_file
+    def build_queries_per_staff(facts):
+        """Builds report showing distribution of queries among staff members"""
+        queries = facts.queries
+        queries = facts.with_staff(queries[queries['assigned_to_id'].notna()])
+        queries = queries.assign(resolved=queries['status'] == 'RESOLVED')
+
+        df = group(queries, STAFF_KEYS).agg(
+            total=('query_id', 'size'),
+            resolved=('resolved', 'sum'),
+        ).reset_index().sort_values('total', ascending=False)
+        df['pending'] = df['total'] - df['resolved']
+
+        df = _staff_columns(df)
+        df.rename(columns={
+            'total': 'Total Queries',
+            'resolved': 'Resolved Queries',
+            'pending': 'Pending Queries'
+        }, inplace=True)
+        df = df[[
+            'Staff Member',
+            'Email',
+            'Total Queries',
+            'Resolved Queries',
+            'Pending Queries'
+        ]]
+        return [('Queries per Staff', df)]
 
     @staticmethod
-    def generate_unassigned_queries_list(start_date, end_date):
-        """Generates report showing queries that are pending assignment"""
-        # Get base queryset for unassigned queries within date range
-        queries = Query.objects.filter(
-            created_at__range=(start_date, end_date),
-            assigned_to__isnull=True
-        ).values(
-            'query_id',
-            'subject',
-            'created_at',
-            'source',
-            'priority',
-            'query_type',
-            'status'
-        ).order_by('-created_at')
-
-        # Create DataFrame
-        df = pd.DataFrame(list(queries))
-        
-        if not df.empty:
-            # Map codes to their display names
-            source_mapping = dict(Query.SOURCE_CHOICES)
-            priority_mapping = dict(Query.PRIORITY_CHOICES)
-            type_mapping = dict(Query.QUERY_TYPE_CHOICES)
-            status_mapping = dict(Query.STATUS_CHOICES)
-
-            # Apply mappings and rename columns
-            df['source'] = df['source'].map(source_mapping)
-            df['priority'] = df['priority'].map(priority_mapping)
-            df['query_type'] = df['query_type'].map(type_mapping)
-            df['status'] = df['status'].map(status_mapping)
-            
-            # Handle null values in query_type
-            df['query_type'].fillna('Unspecified', inplace=True)
-            
-            # Rename columns for better readability
-            df.rename(columns={
-                'query_id': 'Query ID',
-                'subject': 'Subject',
-                'created_at': 'Created Date',
-                'source': 'Source',
-                'priority': 'Priority',
-                'query_type': 'Query Type',
-                'status': 'Status'
-            }, inplace=True)
-
-            # Reorder columns
-            df = df[[
-                'Query ID',
-                'Subject',
-                'Created Date',
-                'Priority',
-                'Query Type',
-                'Source',
-                'Status'
-            ]]
-
-        # Create unique filename
-        temp_file = f'temp_report_{datetime.combine(start_date.date(), datetime.min.time()).strftime("%Y%m%d")}_{datetime.combine(end_date.date(), datetime.min.time()).strftime("%Y%m%d")}.xlsx'
-        
-        # Write to Excel
-        with pd.ExcelWriter(temp_file, engine='xlsxwriter') as excel_file:
-            workbook = excel_file.book
-            header_format = workbook.add_format({
-                'bold': True,
-                'bg_color': '#0066cc',
-                'font_color': 'white'
-            })
-
-            # Write sheet
-            df.to_excel(excel_file, sheet_name='Unassigned Queries', index=False)
+    def build_open_queries_by_staff(facts):
+        """Builds report showing current workload analysis by staff member"""
+        queries = facts.queries
+        queries = queries[queries['assigned_to_id'].notna() & ~queries['status'].isin(CLOSED_STATUSES)]
+        queries = facts.with_staff(queries)
+        queries = queries.assign(
+            high=queries['priority'] == 'A',
+            medium=queries['priority'] == 'B',
+            low=queries['priority'] == 'C',
+            new=queries['status'] == 'NEW',
+            in_progress=queries['status'] == 'IN_PROGRESS',
+            waiting=queries['status'] == 'WAITING',
+        )
 
-            # Format headers and adjust column widths
-            worksheet = excel_file.sheets['Unassigned Queries']
-            for col_num, value in enumerate(df.columns.values):
-                worksheet.write(0, col_num, value, header_format)
-                if not df.empty:
-                    max_length = max(
-                        df[df.columns[col_num]].astype(str).apply(len).max(),
-                        len(str(value))
-                    )
-                else:
-                    max_length = len(str(value))
-                worksheet.set_column(col_num, col_num, max_length + 2)
+        df = group(queries, STAFF_KEYS).agg(
+            total_open=('query_id', 'size'),
+            high_priority=('high', 'sum'),
+            medium_priority=('medium', 'sum'),
+            low_priority=('low', 'sum'),
+            new_queries=('new', 'sum'),
+            in_progress=('in_progress', 'sum'),
+            waiting_response=('waiting', 'sum'),
+        ).reset_index().sort_values('total_open', ascending=False)
+
+        df = _staff_columns(df)
+        df = df[[
+            'Staff Member',
+            'Email',
+            'total_open',
+            'high_priority',
+            'medium_priority',
+            'low_priority',
+            'new_queries',
+            'in_progress',
+            'waiting_response'
+        ]]
+        df = df.rename(columns={
+            'total_open': 'Total Open Queries',
+            'high_priority': 'High Priority',
+            'medium_priority': 'Medium Priority',
+            'low_priority': 'Low Priority',
+            'new_queries': 'New',
+            'in_progress': 'In Progress',
+            'waiting_response': 'Waiting for Response'
+        })
+        return [('Open Queries by Staff', df)]
 
-        return temp_file
+    @staticmethod
+    def build_unassigned_queries_list(facts):
+        """Builds report showing queries that are pending assignment"""
+        queries = facts.queries
+        queries = queries[queries['assigned_to_id'].isna()].sort_values('created_at', ascending=False)
+
+        df = queries[['query_id', 'subject']].copy()
+        df['created_at'] = naive(queries['created_at'])
+        df['priority'] = labels(queries['priority'], PRIORITY_LABELS)
+        df['query_type'] = labels(queries['query_type'], TYPE_LABELS, 'Unspecified')
+        df['source'] = labels(queries['source'], SOURCE_LABELS)
+        df['status'] = labels(queries['status'], STATUS_LABELS)
+
+        df.rename(columns={
+            'query_id': 'Query ID',
+            'subject': 'Subject',
+            'created_at': 'Created Date',
+            'source': 'Source',
+            'priority': 'Priority',
+            'query_type': 'Query Type',
+            'status': 'Status'
+        }, inplace=True)
+        df = df[[
+            'Query ID',
+            'Subject',
+            'Created Date',
+            'Priority',
+            'Query Type',
+            'Source',
+            'Status'
+        ]]
+        return [('Unassigned Queries', df)]
 
     @staticmethod
-    def generate_staff_performance_metrics(start_date, end_date):
-        """Generates comprehensive staff performance analysis report"""
-        User = get_user_model()
-        
-        # Get base queryset for the date range
-        queries = Query.objects.filter(
-            created_at__range=(start_date, end_date),
-            assigned_to__isnull=False
+    def build_staff_performance_metrics(facts):
+        """Builds comprehensive staff performance analysis report"""
+        queries = facts.queries
+        queries = facts.with_staff(queries[queries['assigned_to_id'].notna()])
+        resolved = queries['status'] == 'RESOLVED'
+        high = queries['priority'] == 'A'
+        queries = queries.assign(
+            resolved=resolved,
+            resolved_response_time=queries['response_time'].where(resolved),
+            high=high,
+            high_resolved=high & resolved,
+            rated=queries['satisfaction_rating'].notna(),
+            converted=queries['conversion_status'].fillna(False).astype(bool),
+            convertible=queries['conversion_status'].notna(),
         )
 
-        # Get detailed performance metrics by staff member
-        staff_metrics = list(queries.values(
-            'assigned_to',
-            'assigned_to__first_name',
-            'assigned_to__last_name',
-            'assigned_to__email'
-        ).annotate(
-            total_queries=Count('query_id'),
-            resolved_queries=Count('query_id', filter=Q(status='RESOLVED')),
-            # Resolution rate
-            resolution_rate=Count('query_id', filter=Q(status='RESOLVED')) * 100.0 / Count('query_id'),
-            # Average response time for resolved queries
-            avg_response_time=models.Avg('response_time', filter=Q(status='RESOLVED')),
-            # High priority handling
-            high_priority_total=Count('query_id', filter=Q(priority='A')),
-            high_priority_resolved=Count('query_id', filter=Q(priority='A', status='RESOLVED')),
-            # Satisfaction metrics
-            avg_satisfaction=models.Avg('satisfaction_rating', filter=Q(satisfaction_rating__isnull=False)),
-            rated_queries=Count('query_id', filter=Q(satisfaction_rating__isnull=False)),
-            # Conversion metrics
-            conversion_count=Count('query_id', filter=Q(conversion_status=True)),
-            convertible_queries=Count('query_id', filter=Q(conversion_status__isnull=False))
-        ).order_by('-total_queries'))
-
-        # Create DataFrame
-        df = pd.DataFrame(staff_metrics)
-        
-        if not df.empty:
-            # Create full name and format columns
-            df['Staff Member'] = df['assigned_to__first_name'] + ' ' + df['assigned_to__last_name']
-            df['Email'] = df['assigned_to__email']
-            
-            # Calculate additional metrics
-            df['Resolution Rate (%)'] = df['resolution_rate'].round(2)
-            df['High Priority Resolution Rate (%)'] = (
-                df['high_priority_resolved'] * 100.0 / df['high_priority_total']
-            ).round(2).fillna(0)
-            df['Conversion Rate (%)'] = (
-                df['conversion_count'] * 100.0 / df['convertible_queries']
-            ).round(2).fillna(0)
-            
-            # Format average response time
-            df['Average Response Time'] = df['avg_response_time'].apply(
-                lambda x: str(x).split('.')[0] if pd.notnull(x) else 'N/A'
-            )
-            
-            # Select and order columns
-            df = df[[
-                'Staff Member',
-                'Email',
-                'total_queries',
-                'resolved_queries',
-                'Resolution Rate (%)',
-                'Average Response Time',
-                'high_priority_total',
-                'high_priority_resolved',
-                'High Priority Resolution Rate (%)',
-                'avg_satisfaction',
-                'rated_queries',
-                'Conversion Rate (%)'
-            ]]
-            
-            # Rename columns for better readability
-            df.rename(columns={
-                'total_queries': 'Total Queries',
-                'resolved_queries': 'Resolved Queries',
-                'high_priority_total': 'High Priority Queries',
-                'high_priority_resolved': 'High Priority Resolved',
-                'avg_satisfaction': 'Average Satisfaction (1-5)',
-                'rated_queries': 'Number of Rated Queries'
-            }, inplace=True)
-
-        # Create unique filename
-        temp_file = f'temp_report_{datetime.combine(start_date.date(), datetime.min.time()).strftime("%Y%m%d")}_{datetime.combine(end_date.date(), datetime.min.time()).strftime("%Y%m%d")}.xlsx'
-        
-        # Write to Excel
-        with pd.ExcelWriter(temp_file, engine='xlsxwriter') as excel_file:
-            workbook = excel_file.book
-            header_format = workbook.add_format({
-                'bold': True,
-                'bg_color': '#0066cc',
-                'font_color': 'white'
-            })
-
-            # Write sheet
-            df.to_excel(excel_file, sheet_name='Staff Performance Metrics', index=False)
-
-            # Format headers and adjust column widths
-            worksheet = excel_file.sheets['Staff Performance Metrics']
-            for col_num, value in enumerate(df.columns.values):
-                worksheet.write(0, col_num, value, header_format)
-                if not df.empty:
-                    max_length = max(
-                        df[df.columns[col_num]].astype(str).apply(len).max(),
-                        len(str(value))
-                    )
-                else:
-                    max_length = len(str(value))
-                worksheet.set_column(col_num, col_num, max_length + 2)
-
-        return temp_file
\ No newline at end of file
+        df = group(queries, STAFF_KEYS).agg(
+            total_queries=('query_id', 'size'),
+            resolved_queries=('resolved', 'sum'),
+            avg_response_time=('resolved_response_time', 'mean'),
+            high_priority_total=('high', 'sum'),
+            high_priority_resolved=('high_resolved', 'sum'),
+            avg_satisfaction=('satisfaction_rating', 'mean'),
+            rated_queries=('rated', 'sum'),
+            conversion_count=('converted', 'sum'),
+            convertible_queries=('convertible', 'sum'),
+        ).reset_index().sort_values('total_queries', ascending=False)
+
+        df = _staff_columns(df)
+        df['Resolution Rate (%)'] = percent(df['resolved_queries'], df['total_queries'])
+        df['High Priority Resolution Rate (%)'] = percent(
+            df['high_priority_resolved'], df['high_priority_total']
+        ).fillna(0)
+        df['Conversion Rate (%)'] = percent(df['conversion_count'], df['convertible_queries']).fillna(0)
+        df['Average Response Time'] = df['avg_response_time']
+
+        df = df[[
+            'Staff Member',
+            'Email',
+            'total_queries',
+            'resolved_queries',
+            'Resolution Rate (%)',
+            'Average Response Time',
+            'high_priority_total',
+            'high_priority_resolved',
+            'High Priority Resolution Rate (%)',
+            'avg_satisfaction',
+            'rated_queries',
+            'Conversion Rate (%)'
+        ]]
+        df = df.rename(columns={
+            'total_queries': 'Total Queries',
+            'resolved_queries': 'Resolved Queries',
+            'high_priority_total': 'High Priority Queries',
+            'high_priority_resolved': 'High Priority Resolved',
+            'avg_satisfaction': 'Average Satisfaction (1-5)',
+            'rated_queries': 'Number of Rated Queries'
+        })
+        return [('Staff Performance Metrics', df)]
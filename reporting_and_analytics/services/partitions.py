@@ -0,0 +1,102 @@
+"""
+Month-partitioned report computation.
+
+Reports registered with a partial/finalize pair can be computed over a long
+period as one partial aggregate per calendar month, in parallel worker
+processes, and merged afterwards. Each worker extracts its own month of
+query facts, so a multi-year report takes roughly as long as its busiest
+month rather than the whole range.
+"""
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from query_management.models import Query
+
+from .engine import QueryFacts
+
+logger = logging.getLogger(__name__)
+
+
+def should_partition(start_date, end_date):
+    return end_date - start_date > timedelta(days=getattr(settings, 'REPORT_PARTITION_MIN_DAYS', 62))
+
+
+def month_partitions(start_date, end_date):
+    """
+    Split [start_date, end_date] at local month boundaries into
+    non-overlapping inclusive (start, end) ranges
+    """
+    tz = timezone.get_current_timezone()
+    partitions = []
+    start = start_date
+    while start <= end_date:
+        local = timezone.localtime(start, tz)
+        next_month = (local.date().replace(day=1) + timedelta(days=32)).replace(day=1)
+        boundary = timezone.make_aware(datetime.combine(next_month, time.min), tz)
+        # created_at__range is inclusive, so stop just short of the next month
+        end = min(boundary - timedelta(microseconds=1), end_date)
+        partitions.append((start, end))
+        start = boundary
+    return partitions
+
+
+def compute_partition(partials, start_date, end_date, now):
+    """Run every partial builder over one partition; entry point for worker processes"""
+    facts = QueryFacts(start_date, end_date, now=now)
+    return {report: partial(facts) for report, partial in partials.items()}
+
+
+def compute_partials(partials, start_date, end_date, now, workers=None, progress=None):
+    """
+    `partials` maps a report to its partial builder. Returns each report's
+    list of partial results, one per month of the period. `progress` is
+    called as months complete; if it raises, months not yet started are dropped.
+    """
+    partitions = month_partitions(start_date, end_date)
+    # Months without queries add nothing to a merge; keep one so results have their columns
+    busy_months = set(Query.objects.filter(
+        created_at__range=(start_date, end_date)
+    ).annotate(month=TruncMonth('created_at')).values_list('month', flat=True).distinct())
+    busy_months = {timezone.localtime(month).date() for month in busy_months}
+    partitions = [
+        (start, end) for start, end in partitions
+        if timezone.localtime(start).date().replace(day=1) in busy_months
+    ] or partitions[:1]
+    workers = workers or getattr(settings, 'REPORT_PARTITION_WORKERS', 4)
+    if workers > 1 and multiprocessing.current_process().daemon:
+        # Celery prefork children are daemonic and may not start processes of their own
+        logger.info("Computing partitions in-process: running in a daemonic worker process")
+        workers = 1
+    jobs = [(partials, start, end, now) for start, end in partitions]
+
+    results = [None] * len(jobs)
+    if workers > 1 and len(jobs) > 1:
+        # Children must open their own database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=context) as pool:
+            futures = {pool.submit(compute_partition, *job): index for index, job in enumerate(jobs)}
+            try:
+                for done, future in enumerate(as_completed(futures), start=1):
+                    results[futures[future]] = future.result()
+                    if progress:
+                        progress(done / len(jobs), f"Computing {len(jobs)} monthly partitions")
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+    else:
+        for index, job in enumerate(jobs):
+            results[index] = compute_partition(*job)
+            if progress:
+                progress((index + 1) / len(jobs), f"Computing {len(jobs)} monthly partitions")
+
+    logger.info(f"Computed {len(partials)} reports over {len(jobs)} partitions with {workers} workers")
+    return {report: [result[report] for result in results] for report in partials}
@@ -0,0 +1,61 @@
+"""
+Progress reporting and cooperative cancellation for report exports.
+
+Report code takes an optional `progress(fraction, stage)` callback and calls
+it between chunks of work. For an export the callback is an ExportProgress,
+which records the percentage and stage on the ReportExport row and raises
+ReportCancelled once the export has been cancelled, unwinding the job.
+"""
+import logging
+import time
+
+from django.conf import settings
+
+from ..models import ReportExport
+
+logger = logging.getLogger(__name__)
+
+
+class ReportCancelled(Exception):
+    """Raised inside a report job whose export was cancelled"""
+
+
+class ExportProgress:
+    """
+    Progress callback for one ReportExport. Rows are written at most every
+    REPORT_PROGRESS_INTERVAL seconds unless the stage changes, and each write
+    doubles as the cancellation check: it only matches an export that has not
+    been cancelled.
+    """
+
+    def __init__(self, export_id, interval=None):
+        self.export_id = export_id
+        self.interval = settings.REPORT_PROGRESS_INTERVAL if interval is None else interval
+        self.stage = None
+        self.last_write = None
+
+    def __call__(self, fraction, stage=None):
+        stage = stage or self.stage
+        now = time.monotonic()
+        if stage == self.stage and self.last_write is not None and now - self.last_write < self.interval:
+            return
+        self.stage = stage
+        self.last_write = now
+
+        percent = max(0, min(100, int(fraction * 100)))
+        updated = ReportExport.objects.filter(id=self.export_id, cancel_requested=False).update(
+            progress=percent, stage=(stage or '')[:100]
+        )
+        if not updated:
+            raise ReportCancelled(f"Export {self.export_id} was cancelled")
+
+
+def scaled(progress, start, end):
+    """Map a sub-task's 0-1 progress onto the [start, end] slice of `progress`"""
+    if progress is None:
+        return None
+
+    def report(fraction, stage=None):
+        progress(start + (end - start) * fraction, stage)
+
+    return report
@@ -1,19 +1,12 @@
 # Standard library imports
-from datetime import datetime
-import pytz
-
-# Third-party imports
-import pandas as pd
-
-# Django imports
-from django.contrib.auth import get_user_model
-from django.db import models
-from django.db.models import Count, Q
-from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
-from django.utils import timezone
+import logging
+import os
 
 # Local application imports
-from query_management.models import Query
+from .engine import QueryFacts, temp_report_path
+from .formats import DEFAULT_FORMAT, extension, write_report
+from .partitions import compute_partials, should_partition
+from .progress import ReportCancelled, scaled
 from .generators.query_volume_report_generator import QueryVolumeReportGenerator
 from .generators.staff_report_generator import StaffReportGenerator
 from .generators.performance_report_generator import PerformanceReportGenerator
@@ -22,84 +15,216 @@ from .generators.resolution_report_generator import ResolutionReportGenerator
 from .generators.status_report_generator import StatusReportGenerator
 from .generators.priority_report_generator import PriorityReportGenerator
 from .generators.tag_report_generator import TagReportGenerator
+from .generators.clinic_report_generator import ClinicReportGenerator
+
+logger = logging.getLogger(__name__)
+
 
 class ReportGeneratorFactory:
-    """Factory class to get appropriate report generator based on report type"""
-    
-    @staticmethod
-    def get_generator(report_category, report_name):
-        if report_category == "Query Volume Reports":
-            if report_name == "Daily/Weekly/Monthly Query Count":
-                return QueryVolumeReportGenerator.generate_temporal_query_count
-            elif report_name == "Queries by Source":
-                return QueryVolumeReportGenerator.generate_source_distribution
-            elif report_name == "Queries by Type":
-                return QueryVolumeReportGenerator.generate_type_distribution
-            elif report_name == "Anonymous vs Registered User Queries":
-                return QueryVolumeReportGenerator.generate_user_type_distribution
-        elif report_category == "Staff/Assignment Reports":
-            if report_name == "Queries per Staff Member":
-                return StaffReportGenerator.generate_queries_per_staff
-            elif report_name == "Open Queries by Assigned Staff":
-                return StaffReportGenerator.generate_open_queries_by_staff
-            elif report_name == "Unassigned Queries List":
-                return StaffReportGenerator.generate_unassigned_queries_list
-            elif report_name == "Staff Performance Metrics":
-                return StaffReportGenerator.generate_staff_performance_metrics
-        elif report_category == "Performance Reports":
-            if report_name == "Average Response Time by Priority":
-                return PerformanceReportGenerator.generate_response_time_by_priority
-            elif report_name == "Resolution Time Analysis":
-                return PerformanceReportGenerator.generate_resolution_time_analysis
-            elif report_name == "Overdue Queries Report":
-                return PerformanceReportGenerator.generate_overdue_queries_report
-            elif report_name == "Pending Follow-ups List":
-                return PerformanceReportGenerator.generate_pending_followups_list
-            elif report_name == "User Satisfaction Ratings Summary":
-                return PerformanceReportGenerator.generate_satisfaction_ratings_summary
-        elif report_category == "Conversion Reports":
-            if report_name == "Conversion Rate by Query Type":
-                return ConversionReportGenerator.generate_conversion_by_type
-            elif report_name == "Patient Conversion Tracking":
-                return ConversionReportGenerator.generate_patient_conversion_tracking
-            elif report_name == "Source-wise Conversion Analysis":
-                return ConversionReportGenerator.generate_source_conversion_analysis
-            elif report_name == "Follow-up to Conversion Timeline":
-                return ConversionReportGenerator.generate_followup_conversion_timeline
-        elif report_category == "Resolution Reports":
-            if report_name == "Resolution Summary Analysis":
-                return ResolutionReportGenerator.generate_resolution_summary
-            elif report_name == "Common Resolution Patterns":
-                return ResolutionReportGenerator.generate_resolution_patterns
-            elif report_name == "Time to Resolution by Query Type":
-                return ResolutionReportGenerator.generate_time_to_resolution_by_type
-            elif report_name == "Resolution Satisfaction Correlation":
-                return ResolutionReportGenerator.generate_resolution_satisfaction_correlation
-        elif report_category == "Status Based Reports":
-            if report_name == "Open Queries Summary":
-                return StatusReportGenerator.generate_open_queries_summary
-            elif report_name == "Stalled Queries Analysis":
-                return StatusReportGenerator.generate_stalled_queries_analysis
-            elif report_name == "Resolution Rate Report":
-                return StatusReportGenerator.generate_resolution_rate_report
-            elif report_name == "Status Transition Analysis":
-                return StatusReportGenerator.generate_status_transition_analysis
-        elif report_category == "Priority Based Reports":
-            if report_name == "High Priority Queries Status":
-                return PriorityReportGenerator.generate_high_priority_status
-            elif report_name == "Priority Distribution Analysis":
-                return PriorityReportGenerator.generate_priority_distribution
-            elif report_name == "SLA Compliance Report":
-                return PriorityReportGenerator.generate_sla_compliance_report
-            elif report_name == "Priority Escalation Tracking":
-                return PriorityReportGenerator.generate_priority_escalation_tracking
-        elif report_category == "Tag Analysis Reports":
-            if report_name == "Common Issues/Tags Report":
-                return TagReportGenerator.generate_common_issues_report
-            elif report_name == "Tag Correlation Analysis":
-                return TagReportGenerator.generate_tag_correlation_analysis
-            elif report_name == "Trending Tags Over Time":
-                return TagReportGenerator.generate_trending_tags_report
-            elif report_name == "Tag Distribution by Source":
-                return TagReportGenerator.generate_tag_source_distribution
-        return None
+    """
+    Registry of report builders keyed by (report category, report name).
+
+    A builder takes a QueryFacts and returns a list of (sheet name, DataFrame).
+    Reports requested together share one extraction of the query facts.
+    """
+
+    _builders = {}
+    _time_sensitive = set()
+    _snapshot = set()
+    _partitioned = {}
+
+    @classmethod
+    def register(cls, report_category, report_name, builder, time_sensitive=False, snapshot=False):
+        """
+        Register a builder. Reports whose figures depend on the current time
+        (ages, overdue counts) are flagged `time_sensitive` so cached results
+        for them expire even when the data is unchanged. Reports reading the
+        analytics snapshot rather than query facts are flagged `snapshot`.
+        """
+        cls._builders[(report_category, report_name)] = builder
+        for flagged, flag in ((cls._time_sensitive, time_sensitive), (cls._snapshot, snapshot)):
+            if flag:
+                flagged.add((report_category, report_name))
+            else:
+                flagged.discard((report_category, report_name))
+
+    @classmethod
+    def register_partitioned(cls, report_category, report_name, partial, finalize):
+        """
+        Let a report be computed month by month over long periods: `partial`
+        takes a QueryFacts for one month and returns a mergeable result,
+        `finalize` turns the list of monthly results into the report's sheets.
+        """
+        cls._partitioned[(report_category, report_name)] = (partial, finalize)
+
+    @classmethod
+    def is_time_sensitive(cls, report_category, report_name):
+        return (report_category, report_name) in cls._time_sensitive
+
+    @classmethod
+    def uses_snapshot(cls, report_category, report_name):
+        return (report_category, report_name) in cls._snapshot
+
+    @classmethod
+    def get_builder(cls, report_category, report_name):
+        return cls._builders.get((report_category, report_name))
+
+    @classmethod
+    def registered_reports(cls):
+        return list(cls._builders)
+
+    @classmethod
+    def get_generator(cls, report_category, report_name):
+        """
+        Callable taking (start_date, end_date, directory=None, progress=None,
+        export_format='XLSX') and returning the path of a temp file in that
+        format, created inside `directory` when given
+        """
+        if cls.get_builder(report_category, report_name) is None:
+            return None
+
+        def generate(start_date, end_date, directory=None, progress=None, export_format=DEFAULT_FORMAT):
+            paths = cls.run_reports(
+                [(report_category, report_name)], start_date, end_date,
+                directory=directory, progress=progress, export_format=export_format
+            )
+            return paths[(report_category, report_name)]
+
+        return generate
+
+    @classmethod
+    def run_reports(cls, reports, start_date, end_date, facts=None, directory=None, progress=None,
+                    export_format=DEFAULT_FORMAT):
+        """
+        Render several reports over a single extraction of the query facts.
+        `reports` is a list of (category, name); returns {(category, name): temp file path}.
+        Files are written in `export_format` (see formats.EXPORT_FORMATS)
+        inside `directory` (the system temp dir by default).
+        `progress(fraction, stage)` is called between chunks of work and may
+        raise ReportCancelled to stop the run.
+        """
+        facts = facts or QueryFacts(start_date, end_date)
+        paths = {}
+        try:
+            partitioned = {}
+            if should_partition(start_date, end_date):
+                partitioned = {
+                    report: cls._partitioned[report][0] for report in reports if report in cls._partitioned
+                }
+            # Monthly partitions take the first half of the run when there are any
+            offset = 0.5 if partitioned else 0
+            partials = compute_partials(
+                partitioned, start_date, end_date, facts.now, progress=scaled(progress, 0, offset)
+            ) if partitioned else {}
+
+            share = (1 - offset) / len(reports)
+            for index, (report_category, report_name) in enumerate(reports):
+                builder = cls.get_builder(report_category, report_name)
+                if builder is None:
+                    raise ValueError(f"No generator found for {report_category} / {report_name}")
+                start = offset + index * share
+                if progress:
+                    progress(start, f"Building {report_name}")
+                path = temp_report_path(start_date, end_date, directory, suffix=extension(export_format))
+                paths[(report_category, report_name)] = path
+                if (report_category, report_name) in partials:
+                    finalize = cls._partitioned[(report_category, report_name)][1]
+                    sheets = finalize(partials[(report_category, report_name)])
+                else:
+                    sheets = builder(facts)
+                write_report(
+                    sheets, path, export_format, progress=scaled(progress, start + share / 2, start + share)
+                )
+        except Exception as e:
+            if isinstance(e, ReportCancelled):
+                logger.info(f"Report generation for {start_date} - {end_date} cancelled")
+            else:
+                logger.error(f"Error generating reports for {start_date} - {end_date}: {str(e)}")
+            for path in paths.values():
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        return paths
+
+
+REPORT_BUILDERS = [
+    ("Query Volume Reports", "Daily/Weekly/Monthly Query Count", QueryVolumeReportGenerator.build_temporal_query_count),
+    ("Query Volume Reports", "Queries by Source", QueryVolumeReportGenerator.build_source_distribution),
+    ("Query Volume Reports", "Queries by Type", QueryVolumeReportGenerator.build_type_distribution),
+    ("Query Volume Reports", "Anonymous vs Registered User Queries", QueryVolumeReportGenerator.build_user_type_distribution),
+
+    ("Staff/Assignment Reports", "Queries per Staff Member", StaffReportGenerator.build_queries_per_staff),
+    ("Staff/Assignment Reports", "Open Queries by Assigned Staff", StaffReportGenerator.build_open_queries_by_staff),
+    ("Staff/Assignment Reports", "Unassigned Queries List", StaffReportGenerator.build_unassigned_queries_list),
+    ("Staff/Assignment Reports", "Staff Performance Metrics", StaffReportGenerator.build_staff_performance_metrics),
+
+    ("Performance Reports", "Average Response Time by Priority", PerformanceReportGenerator.build_response_time_by_priority),
+    ("Performance Reports", "Resolution Time Analysis", PerformanceReportGenerator.build_resolution_time_analysis),
+    ("Performance Reports", "Overdue Queries Report", PerformanceReportGenerator.build_overdue_queries_report),
+    ("Performance Reports", "Pending Follow-ups List", PerformanceReportGenerator.build_pending_followups_list),
+    ("Performance Reports", "User Satisfaction Ratings Summary", PerformanceReportGenerator.build_satisfaction_ratings_summary),
+
+    ("Conversion Reports", "Conversion Rate by Query Type", ConversionReportGenerator.build_conversion_by_type),
+    ("Conversion Reports", "Patient Conversion Tracking", ConversionReportGenerator.build_patient_conversion_tracking),
+    ("Conversion Reports", "Source-wise Conversion Analysis", ConversionReportGenerator.build_source_conversion_analysis),
+    ("Conversion Reports", "Follow-up to Conversion Timeline", ConversionReportGenerator.build_followup_conversion_timeline),
+
+    ("Resolution Reports", "Resolution Summary Analysis", ResolutionReportGenerator.build_resolution_summary),
+    ("Resolution Reports", "Common Resolution Patterns", ResolutionReportGenerator.build_resolution_patterns),
+    ("Resolution Reports", "Time to Resolution by Query Type", ResolutionReportGenerator.build_time_to_resolution_by_type),
+    ("Resolution Reports", "Resolution Satisfaction Correlation", ResolutionReportGenerator.build_resolution_satisfaction_correlation),
+
+    ("Status Based Reports", "Open Queries Summary", StatusReportGenerator.build_open_queries_summary),
+    ("Status Based Reports", "Stalled Queries Analysis", StatusReportGenerator.build_stalled_queries_analysis),
+    ("Status Based Reports", "Resolution Rate Report", StatusReportGenerator.build_resolution_rate_report),
+    ("Status Based Reports", "Status Transition Analysis", StatusReportGenerator.build_status_transition_analysis),
+
+    ("Priority Based Reports", "High Priority Queries Status", PriorityReportGenerator.build_high_priority_status),
+    ("Priority Based Reports", "Priority Distribution Analysis", PriorityReportGenerator.build_priority_distribution),
+    ("Priority Based Reports", "SLA Compliance Report", PriorityReportGenerator.build_sla_compliance_report),
+    ("Priority Based Reports", "Priority Escalation Tracking", PriorityReportGenerator.build_priority_escalation_tracking),
+
+    ("Tag Analysis Reports", "Common Issues/Tags Report", TagReportGenerator.build_common_issues_report),
+    ("Tag Analysis Reports", "Tag Correlation Analysis", TagReportGenerator.build_tag_correlation_analysis),
+    ("Tag Analysis Reports", "Trending Tags Over Time", TagReportGenerator.build_trending_tags_report),
+    ("Tag Analysis Reports", "Tag Distribution by Source", TagReportGenerator.build_tag_source_distribution),
+]
+
+# Reports measured against the current time rather than only the stored data
+TIME_SENSITIVE_REPORTS = {
+    ("Performance Reports", "Overdue Queries Report"),
+    ("Performance Reports", "Pending Follow-ups List"),
+    ("Status Based Reports", "Open Queries Summary"),
+    ("Status Based Reports", "Stalled Queries Analysis"),
+    ("Priority Based Reports", "High Priority Queries Status"),
+    ("Priority Based Reports", "Priority Distribution Analysis"),
+    ("Priority Based Reports", "SLA Compliance Report"),
+}
+
+for category, name, builder in REPORT_BUILDERS:
+    ReportGeneratorFactory.register(
+        category, name, builder, time_sensitive=(category, name) in TIME_SENSITIVE_REPORTS
+    )
+
+# Cross-module clinic reports, read from the analytics snapshot rather than the production tables
+SNAPSHOT_REPORT_BUILDERS = [
+    ("Clinic Analytics Reports", "Phototherapy Plan Revenue Analysis", ClinicReportGenerator.build_plan_revenue_analysis),
+    ("Clinic Analytics Reports", "Appointment No-show Analysis", ClinicReportGenerator.build_no_show_analysis),
+    ("Clinic Analytics Reports", "Monthly Clinic Activity", ClinicReportGenerator.build_monthly_clinic_activity),
+]
+
+for category, name, builder in SNAPSHOT_REPORT_BUILDERS:
+    ReportGeneratorFactory.register(category, name, builder, snapshot=True)
+
+# Reports that can be computed month by month and merged over long periods
+PARTITIONED_REPORTS = [
+    ("Performance Reports", "Resolution Time Analysis", PerformanceReportGenerator.partial_resolution_time_analysis, PerformanceReportGenerator.finalize_resolution_time_analysis),
+    ("Conversion Reports", "Conversion Rate by Query Type", ConversionReportGenerator.partial_conversion_by_type, ConversionReportGenerator.finalize_conversion_by_type),
+    ("Conversion Reports", "Patient Conversion Tracking", ConversionReportGenerator.partial_patient_conversion_tracking, ConversionReportGenerator.finalize_patient_conversion_tracking),
+    ("Conversion Reports", "Source-wise Conversion Analysis", ConversionReportGenerator.partial_source_conversion_analysis, ConversionReportGenerator.finalize_source_conversion_analysis),
+    ("Conversion Reports", "Follow-up to Conversion Timeline", ConversionReportGenerator.partial_followup_conversion_timeline, ConversionReportGenerator.finalize_followup_conversion_timeline),
+    ("Tag Analysis Reports", "Tag Correlation Analysis", TagReportGenerator.partial_tag_correlation_analysis, TagReportGenerator.finalize_tag_correlation_analysis),
+]
+
+for category, name, partial, finalize in PARTITIONED_REPORTS:
+    ReportGeneratorFactory.register_partitioned(category, name, partial, finalize)
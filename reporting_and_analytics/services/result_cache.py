@@ -0,0 +1,141 @@
+"""
+Result cache for rendered reports.
+
+Entries are content-addressed: the key hashes the report, the date range, the
+output format and the data watermark of the period (the snapshot version for
+reports read from the analytics snapshot), so a cached file is reused only
+while the rows behind it are unchanged. Reports that depend on the current time also
+mix in a time bucket of REPORT_CACHE_TIME_BUCKET seconds. Total size on disk
+is bounded by REPORT_CACHE_MAX_BYTES, evicting least recently used first.
+"""
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from ..models import ReportResult
+from .engine import data_watermark
+from .formats import DEFAULT_FORMAT, extension
+from .report_generators import ReportGeneratorFactory
+from .snapshot import version as snapshot_version
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(report, start_date, end_date, watermark, export_format=DEFAULT_FORMAT):
+    parts = [str(report.id), start_date.isoformat(), end_date.isoformat(), watermark, export_format]
+    if ReportGeneratorFactory.is_time_sensitive(report.category.name, report.name):
+        parts.append(str(int(time.time() // settings.REPORT_CACHE_TIME_BUCKET)))
+    return hashlib.sha256('|'.join(parts).encode()).hexdigest()
+
+
+def lookup(report, start_date, end_date, export_format=DEFAULT_FORMAT):
+    """
+    Returns (key, watermark, entry). `entry` is the matching ReportResult,
+    or None on a miss; pass key and watermark on to store() after generating.
+    """
+    if ReportGeneratorFactory.uses_snapshot(report.category.name, report.name):
+        # Snapshot reports change only when the snapshot is refreshed
+        watermark = f'snapshot:{snapshot_version()}'
+    else:
+        watermark = data_watermark(start_date, end_date)
+    key = cache_key(report, start_date, end_date, watermark, export_format)
+    entry = ReportResult.objects.filter(cache_key=key).first()
+    if entry is None:
+        return key, watermark, None
+
+    if not entry.result_file or not entry.result_file.storage.exists(entry.result_file.name):
+        logger.warning(f"Cached result {entry.id} lost its file, discarding")
+        _delete(entry)
+        return key, watermark, None
+
+    ReportResult.objects.filter(id=entry.id).update(
+        hit_count=F('hit_count') + 1, last_used_at=timezone.now()
+    )
+    return key, watermark, entry
+
+
+def store(report, start_date, end_date, key, watermark, path, export_format=DEFAULT_FORMAT):
+    """Cache the report rendered at `path`, replacing older results for the same range and format"""
+    existing = ReportResult.objects.filter(cache_key=key).first()
+    if existing is not None:
+        # Another worker rendered the same result meanwhile
+        return existing
+
+    entry = ReportResult(
+        cache_key=key,
+        report=report,
+        start_date=start_date,
+        end_date=end_date,
+        watermark=watermark,
+        export_format=export_format,
+    )
+    with open(path, 'rb') as f:
+        entry.result_file.save(f'{key}{extension(export_format)}', File(f), save=False)
+    entry.size = entry.result_file.size
+    try:
+        with transaction.atomic():
+            entry.save()
+    except IntegrityError:
+        # Another worker stored the same key between the check above and this insert
+        logger.info(f"Report result {key} was stored concurrently, keeping the existing entry")
+        try:
+            entry.result_file.delete(save=False)
+        except Exception as e:
+            logger.error(f"Error deleting cached report file {entry.result_file.name}: {str(e)}")
+        return ReportResult.objects.get(cache_key=key)
+
+    superseded = ReportResult.objects.filter(
+        report=report, start_date=start_date, end_date=end_date, export_format=export_format
+    ).exclude(id=entry.id)
+    for old in superseded:
+        _delete(old)
+
+    evict(keep=entry.id)
+    return entry
+
+
+def attach(entry, export):
+    """Copy a cached result into `export` and mark it completed"""
+    with entry.result_file.open('rb') as f:
+        export.export_file.save(f'report_{export.id}{extension(export.export_format)}', File(f), save=False)
+    export.status = 'COMPLETED'
+    export.error_message = None
+    export.progress = 100
+    export.stage = 'Completed'
+    export.save(update_fields=['export_file', 'status', 'error_message', 'progress', 'stage'])
+
+
+def evict(max_bytes=None, keep=None):
+    """
+    Drop least recently used results until the cache fits in `max_bytes`.
+    The entry with id `keep`, typically the one just stored, is never dropped.
+    """
+    max_bytes = settings.REPORT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    total = ReportResult.objects.aggregate(total=Sum('size'))['total'] or 0
+    if total <= max_bytes:
+        return 0
+
+    evicted = 0
+    for entry in ReportResult.objects.exclude(id=keep).order_by('last_used_at').iterator():
+        if total <= max_bytes:
+            break
+        total -= entry.size
+        _delete(entry)
+        evicted += 1
+    logger.info(f"Evicted {evicted} cached report results")
+    return evicted
+
+
+def _delete(entry):
+    try:
+        if entry.result_file:
+            entry.result_file.delete(save=False)
+    except Exception as e:
+        logger.error(f"Error deleting cached report file {entry.result_file.name}: {str(e)}")
+    entry.delete()
@@ -1,18 +1,45 @@
-from celery import shared_task
-from django.core.files import File
-from .models import ReportExport
+from celery import chain, shared_task
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from .models import ReportExport, ReportSubscription
 from .services.report_generators import ReportGeneratorFactory
-import os
+from .services import formats, result_cache, snapshot
+from .services.progress import ExportProgress, ReportCancelled
+import logging
+import tempfile
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
 
 @shared_task
 def generate_report(export_id):
+    export = None
     try:
         # Get the export instance
         export = ReportExport.objects.get(id=export_id)
-        
-        # Update status to in progress
+        if export.cancel_requested:
+            logger.info(f"Export {export.id} was cancelled before it started")
+            ReportExport.objects.filter(id=export.id).update(status='CANCELLED', stage='Cancelled')
+            return
+
+        # Update status to in progress; only the status, so a concurrent
+        # cancellation request is not overwritten
         export.status = 'IN_PROGRESS'
-        export.save()
+        export.save(update_fields=['status'])
+        progress = ExportProgress(export.id)
+        progress(0, "Checking for a cached result")
+
+        # Reuse the cached file when the data behind the report is unchanged
+        key, watermark, cached = result_cache.lookup(
+            export.report, export.start_date, export.end_date, export.export_format
+        )
+        if cached:
+            logger.info(f"Serving export {export.id} from cached result {cached.id}")
+            result_cache.attach(cached, export)
+            return
 
         # Get appropriate generator
         generator = ReportGeneratorFactory.get_generator(
@@ -21,29 +48,161 @@ def generate_report(export_id):
         )
 
         if generator:
-            # Generate the report
-            temp_file_path = generator(export.start_date, export.end_date)
-            
-            # Save the generated file to export
-            with open(temp_file_path, 'rb') as f:
-                export.export_file.save(
-                    f'report_{export.id}.xlsx',
-                    File(f),
-                    save=True
+            # Each export renders in its own temp directory, which also holds
+            # xlsxwriter's row buffers, so concurrent exports never collide
+            with tempfile.TemporaryDirectory(prefix=f'report_export_{export.id}_') as directory:
+                temp_file_path = generator(
+                    export.start_date, export.end_date, directory=directory, progress=progress,
+                    export_format=export.export_format
                 )
-            
-            # Update status to completed
-            export.status = 'COMPLETED'
-            export.save()
 
-            # Clean up temp file
-            os.remove(temp_file_path)
+                # Cache the generated file and save it to the export
+                progress(1, "Saving report")
+                entry = result_cache.store(
+                    export.report, export.start_date, export.end_date,
+                    key, watermark, temp_file_path, export.export_format
+                )
+                result_cache.attach(entry, export)
         else:
             raise ValueError("No generator found for this report type")
 
+    except ReportCancelled:
+        # The temp directory is already gone; just record the outcome and free the worker
+        logger.info(f"Export {export_id} cancelled while in progress")
+        ReportExport.objects.filter(id=export_id).update(status='CANCELLED', stage='Cancelled')
+
     except Exception as e:
         if export:
             export.status = 'FAILED'
             export.error_message = str(e)
-            export.save()
+            export.save(update_fields=['status', 'error_message'])
+        raise
+
+
+@shared_task
+def dispatch_report_subscriptions():
+    """
+    Start every due subscription. Subscriptions due for the same report and
+    period share a single ReportExport, and each distinct export is started
+    REPORT_SUBSCRIPTION_STAGGER_SECONDS after the previous one so a busy
+    schedule does not occupy every worker at once.
+    """
+    now = timezone.now()
+    stagger = getattr(settings, 'REPORT_SUBSCRIPTION_STAGGER_SECONDS', 60)
+
+    with transaction.atomic():
+        due = ReportSubscription.objects.select_for_update(skip_locked=True).filter(
+            is_active=True, next_run_at__lte=now
+        ).order_by('next_run_at')
+
+        by_period = {}
+        for subscription in due:
+            start_date, end_date = subscription.period(subscription.next_run_at)
+            by_period.setdefault((subscription.report_id, start_date, end_date), []).append(subscription)
+
+        jobs = []
+        for (report_id, start_date, end_date), subscriptions in by_period.items():
+            # SCHEDULED, not PENDING, so the post_save signal leaves queueing to us
+            export = ReportExport.objects.create(
+                report_id=report_id,
+                start_date=start_date,
+                end_date=end_date,
+                status='SCHEDULED',
+                created_by=subscriptions[0].created_by
+            )
+            for subscription in subscriptions:
+                subscription.last_run_at = now
+                subscription.next_run_at = subscription.compute_next_run(now)
+                subscription.last_export = export
+            ReportSubscription.objects.bulk_update(subscriptions, ['last_run_at', 'next_run_at', 'last_export'])
+            jobs.append((export, [subscription.id for subscription in subscriptions]))
+
+    slot = 0
+    for export, subscription_ids in jobs:
+        # A result rendered earlier (e.g. for a previous dispatch) is delivered
+        # as is, but only while its watermark still matches the data
+        key, watermark, cached = result_cache.lookup(
+            export.report, export.start_date, export.end_date, export.export_format
+        )
+        if cached:
+            result_cache.attach(cached, export)
+            deliver_report_subscriptions.delay(export.id, subscription_ids)
+            continue
+        chain(
+            generate_report.si(export.id),
+            deliver_report_subscriptions.si(export.id, subscription_ids)
+        ).apply_async(countdown=slot * stagger)
+        slot += 1
+
+    logger.info(f"Dispatched {sum(len(ids) for _, ids in jobs)} report subscriptions as {len(jobs)} exports")
+    return len(jobs)
+
+
+@shared_task
+def deliver_report_subscriptions(export_id, subscription_ids):
+    """Email a completed export to the recipients of the given subscriptions, once per address"""
+    export = ReportExport.objects.select_related('report').get(id=export_id)
+    if export.status == 'CANCELLED':
+        logger.info(f"Export {export_id} was cancelled, nothing to deliver")
+        return 0
+    if export.status != 'COMPLETED' or not export.export_file:
+        logger.error(f"Export {export_id} is not ready for delivery (status {export.status})")
+        return 0
+
+    recipients, seen = [], set()
+    for subscription in ReportSubscription.objects.filter(id__in=subscription_ids, is_active=True):
+        for email in subscription.recipient_list():
+            if email.lower() not in seen:
+                seen.add(email.lower())
+                recipients.append(email)
+    if not recipients:
+        return 0
+
+    start_date = timezone.localtime(export.start_date)
+    # Subscription periods end at midnight; name the last day they include
+    end_date = timezone.localtime(export.end_date - timedelta(microseconds=1))
+    subject = f"{export.report.name}: {start_date:%d %b %Y} - {end_date:%d %b %Y}"
+    body = (
+        f"Please find attached the {export.report.name} report for "
+        f"{start_date:%d %b %Y} to {end_date:%d %b %Y}."
+    )
+    filename = (
+        f"{slugify(export.report.name)}_{start_date:%Y%m%d}_{end_date:%Y%m%d}"
+        f"{formats.extension(export.export_format)}"
+    )
+    with export.export_file.open('rb') as f:
+        content = f.read()
+
+    try:
+        connection = get_connection(fail_silently=False)
+        messages = []
+        for email in recipients:
+            message = EmailMessage(
+                subject=subject,
+                body=body,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[email],
+                connection=connection
+            )
+            message.attach(filename, content, formats.content_type(export.export_format))
+            messages.append(message)
+        sent = connection.send_messages(messages)
+    except Exception as e:
+        logger.error(f"Error delivering export {export_id} to subscribers: {str(e)}")
+        raise
+
+    logger.info(f"Delivered export {export_id} to {sent} recipients")
+    return sent
+
+
+@shared_task
+def refresh_analytics_snapshot(full=False):
+    """
+    Load the changes of the clinic modules since the last run into the
+    analytics snapshot; scheduled nightly, outside clinic hours
+    """
+    try:
+        return snapshot.refresh(full=full)
+    except Exception as e:
+        logger.error(f"Error refreshing analytics snapshot: {str(e)}")
         raise
@@ -1,3 +1,98 @@
-from django.test import TestCase
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from access_control.models import Module
+from .forms import ReportGenerationForm
+from . import tasks
+from .models import Report, ReportCategory, ReportExport, ReportResult, ReportSubscription
+from .services import result_cache
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ReportResultCacheTests(TestCase):
+    """Reports requested from the report form are served from the result cache"""
+
+    def setUp(self):
+        module = Module.objects.create(
+            name='reporting_and_analytics', display_name='Reports', url_name='reports_analytics_management'
+        )
+        category = ReportCategory.objects.create(name='Query Reports', description='', module=module)
+        self.report = Report.objects.create(category=category, name='Cache Test Report', description='')
+
+    def submit(self, now):
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            form = ReportGenerationForm({'preset_range': '7d', 'export_format': 'XLSX'})
+            self.assertTrue(form.is_valid(), form.errors)
+        data = form.cleaned_data
+        return data['start_date'], data['end_date'], data['export_format']
+
+    def test_identical_submissions_share_a_cached_result(self):
+        now = timezone.localtime().replace(minute=10)
+        start_date, end_date, export_format = self.submit(now)
+        key, watermark, cached = result_cache.lookup(self.report, start_date, end_date, export_format)
+        self.assertIsNone(cached)
+        with tempfile.NamedTemporaryFile(suffix='.xlsx') as rendered:
+            rendered.write(b'report')
+            rendered.flush()
+            stored = result_cache.store(
+                self.report, start_date, end_date, key, watermark, rendered.name, export_format
+            )
+
+        start_date, end_date, export_format = self.submit(now + timedelta(minutes=20))
+        key, watermark, cached = result_cache.lookup(self.report, start_date, end_date, export_format)
+        self.assertEqual(cached, stored)
+        self.assertEqual(ReportResult.objects.get().hit_count, 1)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ReportSubscriptionDispatchTests(TestCase):
+    """Due subscriptions reuse a cached result only while its watermark matches the data"""
+
+    def setUp(self):
+        module = Module.objects.create(
+            name='reporting_and_analytics', display_name='Reports', url_name='reports_analytics_management'
+        )
+        category = ReportCategory.objects.create(name='Query Reports', description='', module=module)
+        self.report = Report.objects.create(category=category, name='Cache Test Report', description='')
+        self.run_at = timezone.now() - timedelta(minutes=1)
+        self.subscription = ReportSubscription.objects.create(
+            report=self.report, recipients='staff@example.com', frequency='DAILY', next_run_at=self.run_at
+        )
+
+    def store_result(self):
+        start_date, end_date = self.subscription.period(self.run_at)
+        key, watermark, cached = result_cache.lookup(self.report, start_date, end_date, 'XLSX')
+        with tempfile.NamedTemporaryFile(suffix='.xlsx') as rendered:
+            rendered.write(b'report')
+            rendered.flush()
+            result_cache.store(self.report, start_date, end_date, key, watermark, rendered.name, 'XLSX')
+
+    def dispatch(self, watermark):
+        ReportSubscription.objects.filter(id=self.subscription.id).update(next_run_at=self.run_at)
+        with mock.patch.object(result_cache, 'data_watermark', return_value=watermark), \
+                mock.patch.object(tasks, 'chain') as chain:
+            tasks.dispatch_report_subscriptions()
+        return chain
+
+    def test_current_result_is_delivered_without_rendering(self):
+        with mock.patch.object(result_cache, 'data_watermark', return_value='v1'):
+            self.store_result()
+        chain = self.dispatch('v1')
+        chain.assert_not_called()
+        self.assertEqual(ReportExport.objects.get().status, 'COMPLETED')
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_changed_data_schedules_a_new_export(self):
+        with mock.patch.object(result_cache, 'data_watermark', return_value='v1'):
+            self.store_result()
+        self.dispatch('v1')
+        chain = self.dispatch('v2')
+        chain.assert_called_once()
+        self.assertEqual(
+            list(ReportExport.objects.order_by('id').values_list('status', flat=True)), ['COMPLETED', 'SCHEDULED']
+        )
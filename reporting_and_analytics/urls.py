@@ -15,4 +15,10 @@ urlpatterns = [
     path('report/<int:report_id>/exports/', 
          report_views.ReportExportsView.as_view(), 
          name='report_exports'),
+    path('export/<int:export_id>/status/',
+         report_views.ReportExportStatusView.as_view(),
+         name='export_status'),
+    path('export/<int:export_id>/cancel/',
+         report_views.ReportExportCancelView.as_view(),
+         name='export_cancel'),
 ]
\ No newline at end of file
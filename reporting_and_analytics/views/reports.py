@@ -9,7 +9,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.views import View
 from django.utils import timezone
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db.models import Count
@@ -17,10 +17,12 @@ from django.db import transaction
 
 # Local application imports
 from access_control.models import Role
+from access_control.identity import get_role_template_folder
 from access_control.permissions import PermissionManager
 from error_handling.views import handler403, handler404, handler500
 from ..models import Report, ReportCategory, ReportExport
 from ..forms import ReportGenerationForm
+from ..services import result_cache
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -34,8 +36,7 @@ def get_template_path(base_template, role, module='reporting_and_analytics'):
         role_folder = role.template_folder
     else:
         # Fallback for any legacy code
-        role = Role.objects.get(name=role)
-        role_folder = role.template_folder
+        role_folder = get_role_template_folder(role)
     
     if module:
         return f'{role_folder}/{module}/{base_template}'
@@ -121,14 +122,35 @@ class CategoryReportsView(LoginRequiredMixin, View):
             form = ReportGenerationForm(request.POST)
 
             if form.is_valid():
+                start_date = form.cleaned_data['start_date']
+                end_date = form.cleaned_data['end_date']
+                export_format = form.cleaned_data['export_format']
+
+                # Serve an unchanged report straight from the result cache
+                _, _, cached = result_cache.lookup(report, start_date, end_date, export_format)
+                if cached:
+                    # Not PENDING, so the post_save signal does not queue generation
+                    report_export = ReportExport.objects.create(
+                        report=report,
+                        created_by=request.user,
+                        status='IN_PROGRESS',
+                        export_format=export_format,
+                        start_date=start_date,
+                        end_date=end_date
+                    )
+                    result_cache.attach(cached, report_export)
+                    messages.success(request, "Report is ready.")
+                    return redirect('reporting_and_analytics:report_exports', report_id=report.id)
+
                 # Create report export but don't save yet
                 report_export = ReportExport(
                     report=report,
                     created_by=request.user,
                     status='PENDING',
+                    export_format=export_format,
                     # Get the cleaned dates from form
-                    start_date=form.cleaned_data['start_date'],
-                    end_date=form.cleaned_data['end_date']
+                    start_date=start_date,
+                    end_date=end_date
                 )
                 report_export.save()
 
@@ -181,4 +203,55 @@ class ReportExportsView(LoginRequiredMixin, View):
         except Exception as e:
             logger.error(f"Error in ReportExportsView: {str(e)}")
             messages.error(request, "An error occurred while fetching report exports.")
-            return redirect('reporting_and_analytics:reports_analytics_management')
\ No newline at end of file
+            return redirect('reporting_and_analytics:reports_analytics_management')
+
+class ReportExportStatusView(LoginRequiredMixin, View):
+    """Lightweight JSON status of one export, polled while it is being generated"""
+
+    def dispatch(self, request, *args, **kwargs):
+        if not PermissionManager.check_module_access(request.user, 'reporting_and_analytics'):
+            return JsonResponse({'error': 'Access denied'}, status=403)
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request, export_id):
+        try:
+            export = ReportExport.objects.filter(id=export_id).values(
+                'id', 'status', 'progress', 'stage', 'error_message', 'export_file'
+            ).first()
+            if export is None:
+                return JsonResponse({'error': 'Export not found'}, status=404)
+
+            export_file = export.pop('export_file')
+            export['file_url'] = None
+            if export['status'] == 'COMPLETED' and export_file:
+                export['file_url'] = ReportExport._meta.get_field('export_file').storage.url(export_file)
+            export['is_active'] = export['status'] in ReportExport.ACTIVE_STATUSES
+            return JsonResponse(export)
+
+        except Exception as e:
+            logger.error(f"Error fetching status of export {export_id}: {str(e)}")
+            return JsonResponse({'error': 'An error occurred while fetching the export status.'}, status=500)
+
+
+class ReportExportCancelView(LoginRequiredMixin, View):
+    def dispatch(self, request, *args, **kwargs):
+        if not PermissionManager.check_module_access(request.user, 'reporting_and_analytics'):
+            messages.error(request, "You don't have permission to access Reports & Analytics")
+            return handler403(request, exception="Access Denied")
+        return super().dispatch(request, *args, **kwargs)
+
+    def post(self, request, export_id):
+        export = get_object_or_404(ReportExport, id=export_id)
+        try:
+            if export.request_cancel():
+                if export.status == 'CANCELLED':
+                    messages.success(request, "Report export has been cancelled.")
+                else:
+                    messages.success(request, "Report export will stop shortly.")
+            else:
+                messages.warning(request, "This report export has already finished.")
+
+        except Exception as e:
+            logger.error(f"Error cancelling export {export_id}: {str(e)}")
+            messages.error(request, "An error occurred while cancelling the report export.")
+        return redirect('reporting_and_analytics:report_exports', report_id=export.report_id)
@@ -10,6 +10,7 @@ from settings.models import (
 )
 
 from access_control.models import Role
+from access_control.identity import get_role_template_folder
 
 def get_template_path(base_template, role, module='settings'):
     """
@@ -18,8 +19,7 @@ def get_template_path(base_template, role, module='settings'):
     if isinstance(role, Role):
         role_folder = role.template_folder
     else:
-        role = Role.objects.get(name=role)
-        role_folder = role.template_folder
+        role_folder = get_role_template_folder(role)
     
     return f'{role_folder}/{module}/{base_template}'
 
@@ -27,6 +27,6 @@ class EmailOrPhoneAuthBackend(ModelBackend):
 
     def get_user(self, user_id):
         try:
-            return UserModel.objects.get(pk=user_id)
+            return UserModel.objects.select_related('role').get(pk=user_id)
         except UserModel.DoesNotExist:
             return None
\ No newline at end of file
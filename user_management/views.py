@@ -27,6 +27,7 @@ import csv
 # Local application imports
 from django.core.cache import cache
 from access_control.models import Role
+from access_control.identity import get_role_template_folder
 from access_control.permissions import PermissionManager
 from appointment_management.models import Appointment
 from consultation_management.models import Consultation
@@ -60,8 +61,7 @@ def get_template_path(base_template, role, module=''):
         role_folder = role.template_folder
     else:
         # Fallback for any legacy code
-        role = Role.objects.get(name=role)
-        role_folder = role.template_folder
+        role_folder = get_role_template_folder(role)
     
     if module:
         return f'{role_folder}/{module}/{base_template}'
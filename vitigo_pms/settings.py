@@ -13,6 +13,7 @@ import os
 from dotenv import load_dotenv
 from pathlib import Path
 from cryptography.fernet import Fernet
+from celery.schedules import crontab
 import logging
 from logging.handlers import TimedRotatingFileHandler
 load_dotenv()
@@ -88,14 +89,17 @@ INSTALLED_APPS = [
     'clinic_management',
     'asset_management',
     'compliance_management',
+    'performance_monitoring',
 ]
 
 MIDDLEWARE = [
+    'performance_monitoring.middleware.PerformanceMonitoringMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'access_control.middleware.RequestIdentityMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -332,6 +336,21 @@ LOGGING = {
     },
 }
 
+# Error logging pipeline (error_handling.pipeline)
+ERROR_LOG_ASYNC = True  # Queue entries and bulk-insert them off the request path
+ERROR_LOG_BATCH_SIZE = 50
+ERROR_LOG_FLUSH_INTERVAL = 2  # seconds
+ERROR_LOG_QUEUE_SIZE = 10000  # Entries beyond this are dropped, never blocking
+ERROR_LOG_SAMPLE_RATES = {403: 0.1, 404: 0.1}  # Fraction of noisy errors to keep
+ERROR_LOG_HEADER_WHITELIST = [
+    'User-Agent', 'Referer', 'Accept', 'Accept-Language',
+    'Content-Type', 'Content-Length', 'X-Forwarded-For', 'X-Request-Id',
+]
+ERROR_LOG_MAX_FIELD_SIZE = 4096  # Characters kept per message/header
+ERROR_GROUP_SAMPLE_SIZE = 20  # Raw occurrences kept per error fingerprint
+ERROR_LOG_RETENTION_DAYS = 30  # Raw occurrences older than this are pruned
+ERROR_GROUP_RETENTION_DAYS = 180  # Groups not seen for this long are pruned
+
 # Email settings for Gmail - Change this section
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'  
 EMAIL_HOST = 'smtp.gmail.com'
@@ -344,6 +363,9 @@ DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 # Add email templates directory
 TEMPLATES[0]['DIRS'].append(os.path.join(BASE_DIR, 'templates', 'emails'))
 
+# Compile every role template in each gunicorn worker at boot (see gunicorn.conf.py)
+TEMPLATE_WARMUP = os.getenv('TEMPLATE_WARMUP', 'False') == 'True'
+
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
         'Bearer': {
@@ -393,7 +415,7 @@ REDIS_DB = int(os.getenv('REDIS_DB', 0))
 # Cache Configuration
 CACHES = {
     'default': {
-        'BACKEND': 'django_redis.cache.RedisCache',
+        'BACKEND': 'performance_monitoring.cache.InstrumentedRedisCache',
         'LOCATION': f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}",
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
@@ -405,9 +427,91 @@ CACHES = {
 # Cache timeout in seconds (30 minutes)
 CACHE_TIMEOUT = 1800
 
+# Dashboard metrics snapshot: served fresh for DASHBOARD_CACHE_TIMEOUT seconds,
+# then served stale for up to DASHBOARD_CACHE_STALE_TIMEOUT while it refreshes in the background
+DASHBOARD_CACHE_TIMEOUT = 60
+DASHBOARD_CACHE_STALE_TIMEOUT = 600
+
+# Rendered report cache (ReportResult): least recently used files are evicted past this total size.
+# Reports measured against the current time are recomputed at most once per REPORT_CACHE_TIME_BUCKET seconds
+REPORT_CACHE_MAX_BYTES = 500 * 1024 * 1024
+REPORT_CACHE_TIME_BUCKET = 3600
+
+# Running report exports record their progress at most once per REPORT_PROGRESS_INTERVAL seconds
+# (and on every stage change); each write also checks whether the export was cancelled
+REPORT_PROGRESS_INTERVAL = 2
+
+# Report subscriptions: due subscriptions are dispatched every 5 minutes by celery beat, and
+# distinct exports from one dispatch start this many seconds apart
+REPORT_SUBSCRIPTION_STAGGER_SECONDS = 60
+
+# Reports over periods longer than REPORT_PARTITION_MIN_DAYS are computed one month per
+# worker process (reports registered as partitioned only). Celery prefork workers are daemonic
+# processes, which cannot start children, so exports run by Celery compute the months one after
+# another in the worker; the process pool is only used from web requests and management commands.
+REPORT_PARTITION_MIN_DAYS = 62
+REPORT_PARTITION_WORKERS = int(os.getenv('REPORT_PARTITION_WORKERS', 4))
+
+# Daily query rollups (QueryDailyRollup) are rebuilt nightly for the last QUERY_ROLLUP_RECONCILE_DAYS days.
+# None rebuilds the full history
+QUERY_ROLLUP_RECONCILE_DAYS = None
+
+# Query notification emails are queued (QueryNotification) and sent by a Celery worker.
+# Events within QUERY_NOTIFICATION_BATCH_DELAY seconds share one run, which sends up to
+# QUERY_NOTIFICATION_BATCH_SIZE emails per SMTP connection. Failed emails are retried after
+# QUERY_NOTIFICATION_RETRY_DELAY seconds, doubling each time, up to QUERY_NOTIFICATION_MAX_ATTEMPTS.
+QUERY_NOTIFICATION_BATCH_DELAY = 5
+QUERY_NOTIFICATION_BATCH_SIZE = 50
+QUERY_NOTIFICATION_RETRY_DELAY = 60
+QUERY_NOTIFICATION_MAX_ATTEMPTS = 5
+
+# Mailbox read by check_query_emails. Only messages added since the last check are fetched,
+# QUERY_EMAIL_FETCH_BATCH at a time. Query emails that fail to import are fetched again on the
+# next checks, up to QUERY_EMAIL_MAX_ATTEMPTS times.
+QUERY_EMAIL_IMAP_HOST = os.getenv('QUERY_EMAIL_IMAP_HOST', 'imap.gmail.com')
+QUERY_EMAIL_IMAP_PORT = int(os.getenv('QUERY_EMAIL_IMAP_PORT', 993))
+QUERY_EMAIL_IMAP_SSL = os.getenv('QUERY_EMAIL_IMAP_SSL', 'True') == 'True'
+QUERY_EMAIL_FOLDER = 'INBOX'
+QUERY_EMAIL_FETCH_BATCH = 200
+QUERY_EMAIL_MAX_ATTEMPTS = 5
+
+# Query search uses the full-text index (SQLite FTS5 or PostgreSQL tsvector). The search-as-you-type
+# endpoint returns at most QUERY_SEARCH_MAX_RESULTS matches. QUERY_SEARCH_CONFIG is the PostgreSQL
+# text search configuration; run rebuild_query_search after changing it.
+QUERY_SEARCH_MAX_RESULTS = 50
+QUERY_SEARCH_CONFIG = 'english'
+
+# Star-schema snapshot of the appointment, consultation, phototherapy and financial tables, read by
+# the clinic analytics reports and refreshed nightly by celery beat
+ANALYTICS_SNAPSHOT_PATH = os.getenv('ANALYTICS_SNAPSHOT_PATH', os.path.join(BASE_DIR, 'analytics', 'snapshot.sqlite3'))
+
 # Set DEBUG to False for production
 DEBUG = True
 
+# Per-view performance monitoring (performance_monitoring app)
+PERFORMANCE_MONITORING_ENABLED = True
+PERFORMANCE_METRICS_FLUSH_INTERVAL = 10  # seconds between pushes of worker counters to Redis
+PERFORMANCE_METRICS_TOKEN = os.getenv('PERFORMANCE_METRICS_TOKEN')  # Bearer token for /metrics scrapes
+PERFORMANCE_DEFAULT_QUERY_BUDGET = 100  # Log a warning when a request runs more queries than this
+PERFORMANCE_QUERY_BUDGETS = {
+    # 'dashboard': 30,
+}
+
+# Performance regression suite: PERFORMANCE_BENCHMARKS=True python manage.py test performance_monitoring
+# Set PERFORMANCE_BENCHMARK_UPDATE_BASELINES=True to re-record performance_monitoring/benchmark_baselines.json
+PERFORMANCE_BENCHMARKS_ENABLED = os.getenv('PERFORMANCE_BENCHMARKS', 'False') == 'True'
+PERFORMANCE_BENCHMARK_UPDATE_BASELINES = os.getenv('PERFORMANCE_BENCHMARK_UPDATE_BASELINES', 'False') == 'True'
+PERFORMANCE_BENCHMARK_SCALE = int(os.getenv('PERFORMANCE_BENCHMARK_SCALE', 1))  # generate_load_dataset --scale
+PERFORMANCE_BENCHMARK_SEED = 42
+PERFORMANCE_BENCHMARK_REPEAT = 5  # timed requests per view after one warm-up request
+PERFORMANCE_BENCHMARK_TIME_TOLERANCE = 1.5  # allowed ratio over the baseline median
+PERFORMANCE_BENCHMARK_TIME_SLACK_MS = 50  # plus this much absolute noise
+PERFORMANCE_BENCHMARK_REPORT = os.getenv(
+    'PERFORMANCE_BENCHMARK_REPORT', os.path.join(BASE_DIR, 'benchmark_report.json')
+)
+# Report generator benchmark: python manage.py benchmark_reports [--rows N ...] [--baseline previous.json]
+# Regressions against --baseline use the same time tolerance and slack as the view suite
+
 # Celery Configuration
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}')
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}')
@@ -417,4 +521,33 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
 # Celery Beat Settings (optional - for scheduled tasks)
-CELERY_BEAT_SCHEDULE = {}
+CELERY_BEAT_SCHEDULE = {
+    'rollup-error-logs': {
+        'task': 'error_handling.tasks.rollup_error_logs',
+        'schedule': crontab(hour=2, minute=0),
+    },
+    'prune-error-logs': {
+        'task': 'error_handling.tasks.prune_error_logs',
+        'schedule': crontab(hour=2, minute=30),
+    },
+    'reconcile-query-rollups': {
+        'task': 'query_management.tasks.reconcile_query_rollups',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'reconcile-staff-workload': {
+        'task': 'query_management.tasks.reconcile_staff_workload',
+        'schedule': crontab(hour=3, minute=15),
+    },
+    'refresh-analytics-snapshot': {
+        'task': 'reporting_and_analytics.tasks.refresh_analytics_snapshot',
+        'schedule': crontab(hour=1, minute=30),
+    },
+    'send-query-notifications': {
+        'task': 'query_management.tasks.send_query_notifications',
+        'schedule': crontab(minute='*'),
+    },
+    'dispatch-report-subscriptions': {
+        'task': 'reporting_and_analytics.tasks.dispatch_report_subscriptions',
+        'schedule': crontab(minute='*/5'),
+    },
+}
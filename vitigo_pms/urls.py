@@ -21,6 +21,7 @@ from django.conf.urls.static import static
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
+from performance_monitoring.views import metrics
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -37,6 +38,8 @@ schema_view = get_schema_view(
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='prometheus_metrics'),
+    path('performance/', include('performance_monitoring.urls')),
     path('asset/', include('asset_management.urls')),
     path('access-control/', include('access_control.urls')),
     path('webhooks/', include('webhooks.urls')),